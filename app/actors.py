@@ -0,0 +1,453 @@
+# badam_satti_app/actors.py
+"""
+One owner per active game for every change to it.
+
+With ``GAME_ACTORS`` on, a game that is being changed gets an actor on a
+dedicated event-loop thread. Callers hand it a function with ``mutate()``
+(``amutate()`` from async code). The actor applies queued functions one at a
+time to its in-memory ``Game``, writes the columns they changed with one
+UPDATE per batch, and only then answers the callers, so a reply never reports
+a move that is not on disk. Nothing else writes the row, so moves, passes,
+pings, disconnects and timeout removals cannot interleave or lose each other's
+updates.
+
+Each actor's queue is bounded (``GAME_ACTOR_QUEUE_SIZE``). A caller that
+cannot get a slot within ``GAME_ACTOR_SUBMIT_TIMEOUT`` seconds gets
+``ActorBusy``. ``snapshot()`` hands out a copy taken after the last batch, so
+readers need neither the queue nor the database. With ``GAME_SNAPSHOT_PATH``
+set, those copies are also written to disk so a restart picks the games up
+where they were (snapshots.py).
+
+The in-memory copy is only authoritative while this process is the game's
+sole writer: run one server process, or pin tables to processes with
+sharding.py (actors are dropped whenever the shard ring changes). Sharding
+keeps that guarantee only through its heartbeat lease: a node stops serving
+its tables once its own heartbeat lapses, and peers take them over only
+after that. A node that keeps writing while its heartbeats fail -- a stuck
+heartbeat thread, say -- breaks it.
+
+With ``GAME_WRITE_BEHIND`` also on, that write goes into a group commit
+shared by all actors instead (write_behind.py), and a caller passing
+``durable=False`` is answered without waiting for it. A change the group
+commit gives up on is undone by reloading the game from the database.
+
+With ``GAME_ACTORS`` off (the default, safe with any number of processes) the
+same calls load, apply and save inline, writing only the columns that
+changed. The save is a compare-and-swap on ``last_updated``: if anyone wrote
+the row since it was loaded, nothing is written and the function is applied
+again to a fresh copy, up to ``INLINE_ATTEMPTS`` times.
+
+Functions passed to ``mutate()`` run on the actor thread: they must not block
+or call ``mutate()`` themselves, and should call the model methods with
+``commit=False``.
+"""
+import asyncio
+import copy
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import clock, write_behind
+from .db_writer import run_write
+from .log import log_game
+from .metrics import COUNT_BUCKETS, registry, sampled_work
+from .sharding import ownership_changed
+
+logger = logging.getLogger(__name__)
+
+APPLY, DELETE, STOP, RELOAD = 'apply', 'delete', 'stop', 'reload'
+
+_TURN_FIELDS = ('current_player', 'move_count', 'is_game_started', 'round_number')
+
+INLINE_ATTEMPTS = 10
+
+
+class ActorBusy(Exception):
+    """The game's command queue stayed full for longer than the submit timeout."""
+
+
+class WriteConflict(Exception):
+    """An inline change lost INLINE_ATTEMPTS races in a row with other writers of the game."""
+
+
+def enabled():
+    return getattr(settings, 'GAME_ACTORS', False)
+
+
+def _key(game_id):
+    return game_id if isinstance(game_id, uuid.UUID) else uuid.UUID(str(game_id))
+
+
+_tracked_fields = None
+
+
+def _field_values(game):
+    global _tracked_fields
+    if _tracked_fields is None:
+        _tracked_fields = [field.attname for field in game._meta.concrete_fields
+                           if not field.primary_key and field.attname != 'last_updated']
+    return {name: getattr(game, name) for name in _tracked_fields}
+
+
+def _changed_fields(before, game):
+    changed = [name for name, value in before.items() if getattr(game, name) != value]
+    # A move, a new deal or a new player to act restarts the turn clock the ops dashboard reads.
+    if 'turn_started_at' not in changed and any(name in changed for name in _TURN_FIELDS):
+        game.turn_started_at = clock.now()
+        changed.append('turn_started_at')
+    return changed
+
+
+def _restore(game, values):
+    for name, value in values.items():
+        setattr(game, name, value)
+
+
+# --- database I/O (runs on the io pool, never on the actor loop) ---
+
+def _load(game_id):
+    from .models import Game
+    if write_behind.enabled():
+        unwritten = write_behind.committer.latest(game_id)
+        if unwritten is not None:
+            return copy.copy(unwritten)
+    try:
+        return Game.objects.get(game_id=game_id)
+    finally:
+        close_old_connections()
+
+
+def _save(game, fields):
+    try:
+        with sampled_work('game_actor'):
+            game.save(update_fields=fields + ['last_updated'])
+    finally:
+        close_old_connections()
+
+
+def _delete(game_id):
+    from .models import Game
+    if write_behind.enabled():
+        write_behind.committer.discard(game_id)
+    try:
+        return run_write(Game.objects.filter(game_id=game_id).delete)
+    finally:
+        close_old_connections()
+
+
+class _Command:
+    __slots__ = ('kind', 'fn', 'future', 'durable')
+
+    def __init__(self, kind, fn, future, durable=True):
+        self.kind = kind
+        self.fn = fn
+        self.future = future
+        self.durable = durable
+
+
+class _Actor:
+    def __init__(self, system, game_id, game=None):
+        self.system = system
+        self.game_id = game_id
+        self.queue = asyncio.Queue(system.queue_size)
+        self.snapshot = copy.copy(game) if game is not None else None
+        self.stopping = False
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            if self.snapshot is not None:
+                game = copy.copy(self.snapshot)
+            else:
+                game = await loop.run_in_executor(self.system.io, _load, self.game_id)
+                self.snapshot = copy.copy(game)
+            while not (self.stopping and self.queue.empty()):
+                try:
+                    first = await asyncio.wait_for(self.queue.get(), self.system.idle_seconds)
+                except asyncio.TimeoutError:
+                    break
+                pending = [first]
+                while not self.queue.empty():
+                    pending.append(self.queue.get_nowait())
+
+                batch = []
+                for index, command in enumerate(pending):
+                    if command.kind == APPLY:
+                        batch.append(command)
+                        continue
+                    if batch:
+                        game = await self._apply(loop, game, batch)
+                        batch = []
+                    if command.kind == RELOAD:
+                        game = await self._reload(loop)
+                        command.future.set_result(None)
+                    elif command.kind == STOP:
+                        self.stopping = True
+                        if write_behind.enabled():
+                            # Whoever serves the game next reads it from the database.
+                            await loop.run_in_executor(self.system.io, write_behind.committer.flush)
+                        command.future.set_result(None)
+                    elif command.kind == DELETE:
+                        await self._delete(loop, command, pending[index + 1:])
+                        return
+                if batch:
+                    game = await self._apply(loop, game, batch)
+        except Exception as exc:
+            # Could not load (or reload) the game: nobody queued here can be served.
+            self._fail_queued(exc)
+        finally:
+            self.system.forget(self)
+
+    async def _apply(self, loop, game, batch):
+        started = time.perf_counter()
+        before = _field_values(game)
+        outcomes = []
+        with sampled_work('game_actor'):
+            for command in batch:
+                checkpoint = _field_values(game)
+                try:
+                    outcomes.append((command, command.fn(game), None))
+                except Exception as exc:
+                    # Undo whatever the failed function changed before raising.
+                    _restore(game, checkpoint)
+                    outcomes.append((command, None, exc))
+
+        changed = _changed_fields(before, game)
+        if changed and write_behind.enabled():
+            game.last_updated = timezone.now()
+            moves = game._take_pending_moves() or ()
+            written = write_behind.committer.mark(copy.copy(game), changed, moves,
+                                                  durable=any(command.durable for command in batch))
+            try:
+                await asyncio.wrap_future(written)
+            except Exception as exc:
+                # The group commit gave up on the change, so the in-memory game must drop it too.
+                log_game(logger, logging.ERROR, "Game group commit failed; reloading.", game=game)
+                for command, _, _ in outcomes:
+                    command.future.set_exception(exc)
+                return await self._reload(loop)
+        elif changed:
+            try:
+                await loop.run_in_executor(self.system.io, _save, game, changed)
+            except Exception as exc:
+                log_game(logger, logging.ERROR, "Game actor write failed; reloading.", game=game, exc_info=True)
+                for command, _, _ in outcomes:
+                    command.future.set_exception(exc)
+                return await self._reload(loop)
+
+        self.snapshot = copy.copy(game)
+        for command, result, error in outcomes:
+            if error is not None:
+                command.future.set_exception(error)
+            else:
+                command.future.set_result(result)
+        ACTOR_BATCH.observe(len(batch))
+        ACTOR_APPLY_SECONDS.observe(time.perf_counter() - started)
+        return game
+
+    async def _reload(self, loop):
+        game = await loop.run_in_executor(self.system.io, _load, self.game_id)
+        self.snapshot = copy.copy(game)
+        return game
+
+    async def _delete(self, loop, command, rest):
+        from .models import Game
+        try:
+            command.future.set_result(await loop.run_in_executor(self.system.io, _delete, self.game_id))
+        except Exception as exc:
+            command.future.set_exception(exc)
+        for later in rest:
+            later.future.set_exception(Game.DoesNotExist())
+        self._fail_queued(Game.DoesNotExist())
+
+    def _fail_queued(self, exc):
+        while not self.queue.empty():
+            command = self.queue.get_nowait()
+            if not command.future.done():
+                command.future.set_exception(exc)
+
+
+class ActorSystem:
+    def __init__(self, queue_size=64, submit_timeout=2.0, idle_seconds=300):
+        self.queue_size = queue_size
+        self.submit_timeout = submit_timeout
+        self.idle_seconds = idle_seconds
+        self.actors = {}
+        self.loop = None
+        self.io = ThreadPoolExecutor(max_workers=4, thread_name_prefix='game-actor-io')
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self.loop is None:
+            with self._start_lock:
+                if self.loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name='game-actors', daemon=True).start()
+                    self.loop = loop
+
+    def submit(self, game_id, kind, fn=None, durable=True):
+        """Queue a command; returns a concurrent.futures.Future for its result."""
+        self._ensure_started()
+        future = Future()
+        asyncio.run_coroutine_threadsafe(self._enqueue(_key(game_id), _Command(kind, fn, future, durable)), self.loop)
+        return future
+
+    async def _enqueue(self, game_id, command):
+        actor = self.actors.get(game_id)
+        if actor is None and command.kind in (STOP, RELOAD):
+            command.future.set_result(None)
+            return
+        if actor is None:
+            actor = self.actors[game_id] = _Actor(self, game_id)
+            asyncio.ensure_future(actor.run())
+        try:
+            await asyncio.wait_for(actor.queue.put(command), self.submit_timeout)
+        except asyncio.TimeoutError:
+            ACTOR_BUSY.inc()
+            command.future.set_exception(ActorBusy(f"Game {game_id} has {self.queue_size} commands queued."))
+
+    def forget(self, actor):
+        if self.actors.get(actor.game_id) is actor:
+            del self.actors[actor.game_id]
+
+    def snapshot(self, game_id):
+        actor = self.actors.get(_key(game_id))
+        return actor.snapshot if actor is not None else None
+
+    def snapshots(self):
+        """The latest copy of every live game, taken on the actor loop."""
+        if self.loop is None:
+            return []
+
+        async def collect():
+            return [actor.snapshot for actor in self.actors.values() if actor.snapshot is not None]
+
+        return asyncio.run_coroutine_threadsafe(collect(), self.loop).result()
+
+    def preload(self, game):
+        """Start an actor on an already loaded game (see snapshots.py) instead of reading its row."""
+        self._ensure_started()
+
+        async def start():
+            if game.game_id not in self.actors:
+                actor = self.actors[game.game_id] = _Actor(self, game.game_id, game)
+                asyncio.ensure_future(actor.run())
+
+        asyncio.run_coroutine_threadsafe(start(), self.loop).result()
+
+    def stop_all(self):
+        # Actors finish what is queued, then exit; the next command reloads from the database.
+        for game_id in list(self.actors):
+            self.submit(game_id, STOP)
+
+
+_system = None
+_system_lock = threading.Lock()
+
+
+def system():
+    global _system
+    if _system is None:
+        with _system_lock:
+            if _system is None:
+                _system = ActorSystem(
+                    queue_size=getattr(settings, 'GAME_ACTOR_QUEUE_SIZE', 64),
+                    submit_timeout=getattr(settings, 'GAME_ACTOR_SUBMIT_TIMEOUT', 2.0),
+                    idle_seconds=getattr(settings, 'GAME_ACTOR_IDLE_SECONDS', 300),
+                )
+    return _system
+
+
+def _compare_and_save(game, fields, loaded_at):
+    """Write ``fields`` (and the queued moves) only if the row still has ``loaded_at``; False if not."""
+    from .models import Game, GameMove
+    game.last_updated = timezone.now()
+    values = {name: getattr(game, name) for name in fields + ['last_updated']}
+    with transaction.atomic():
+        if not Game.objects.filter(game_id=game.game_id, last_updated=loaded_at).update(**values):
+            return False
+        moves = game._take_pending_moves()
+        if moves:
+            GameMove.objects.bulk_create(moves)
+    return True
+
+
+def _mutate_inline(game_id, fn):
+    from .models import Game
+    for _ in range(INLINE_ATTEMPTS):
+        game = Game.objects.get(game_id=game_id)
+        loaded_at = game.last_updated
+        before = _field_values(game)
+        result = fn(game)
+        changed = _changed_fields(before, game)
+        if not changed or run_write(_compare_and_save, game, changed, loaded_at):
+            return result
+        INLINE_CONFLICTS.inc()
+    raise WriteConflict(f"Game {game_id} kept changing under {INLINE_ATTEMPTS} attempts.")
+
+
+def mutate(game_id, fn, durable=True):
+    """
+    Apply ``fn(game)`` to the game in order with every other change and return
+    its result. With group commit on, ``durable=False`` returns before the
+    change is on disk (see write_behind.py).
+    """
+    if not enabled():
+        return _mutate_inline(game_id, fn)
+    return system().submit(game_id, APPLY, fn, durable).result()
+
+
+async def amutate(game_id, fn, durable=True):
+    if not enabled():
+        return await sync_to_async(_mutate_inline)(game_id, fn)
+    return await asyncio.wrap_future(system().submit(game_id, APPLY, fn, durable))
+
+
+def snapshot(game_id):
+    """A copy of the game as of its last applied change. Changing it changes nothing."""
+    if enabled():
+        current = system().snapshot(game_id)
+        if current is not None:
+            return copy.copy(current)
+    from .models import Game
+    return Game.objects.get(game_id=game_id)
+
+
+def delete_game(game_id):
+    if not enabled():
+        from .models import Game
+        return run_write(Game.objects.filter(game_id=game_id).delete)
+    return system().submit(game_id, DELETE).result()
+
+
+def _on_ownership_changed(sender, **kwargs):
+    if _system is not None:
+        _system.stop_all()
+
+
+ownership_changed.connect(_on_ownership_changed)
+
+
+def _on_write_failed(sender, game_id, **kwargs):
+    # A lazy change nobody waited for was dropped; the actor still holds it.
+    if _system is not None:
+        _system.submit(game_id, RELOAD)
+
+
+write_behind.write_failed.connect(_on_write_failed)
+
+ACTIVE_ACTORS = registry.gauge('badam_game_actors', 'Game actors alive in this process.',
+                               lambda: len(_system.actors) if _system is not None else 0)
+INLINE_CONFLICTS = registry.counter('badam_game_inline_conflicts_total',
+                                    'Inline changes applied again because the row changed after it was loaded.')
+ACTOR_BUSY = registry.counter('badam_game_actor_busy_total', 'Commands rejected because a game queue was full.')
+ACTOR_BATCH = registry.histogram('badam_game_actor_batch_size', 'Commands applied per game write.', COUNT_BUCKETS)
+ACTOR_APPLY_SECONDS = registry.histogram('badam_game_actor_apply_seconds',
+                                         'Time to apply and persist one batch of game commands.')
@@ -0,0 +1,138 @@
+# badam_satti_app/assets.py
+"""
+Static assets: hashed names, precompressed copies, far-future caching.
+
+``collectstatic`` with ``CompressedManifestStorage`` copies every file under
+a content-hashed name (``game.3f2a1c9e.js``) and writes a ``.gz`` -- and a
+``.br`` when the optional ``brotli`` package is installed -- next to each
+text file. ``static_file()`` serves STATIC_ROOT: it sends the smallest
+variant the browser accepts straight from disk, and marks hashed names
+immutable for a year, since a changed file gets a new name.
+
+Before ``collectstatic`` has run (development, tests) ``{% static %}`` falls
+back to the plain names, which the view finds in the apps' static
+directories and lets browsers keep for ``UNHASHED_MAX_AGE`` seconds only.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {'.css', '.js', '.html', '.json', '.svg', '.txt'}
+MIN_COMPRESS_SIZE = 256
+HASHED_MAX_AGE = 365 * 24 * 3600
+UNHASHED_MAX_AGE = 300
+
+
+def compress(data):
+    """{content_coding: bytes} for every coding that makes ``data`` smaller."""
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {coding: body for coding, body in variants.items() if len(body) < len(data)}
+
+
+def accepted_encoding(request, available):
+    """The smallest of ``available`` ({coding: size}) the request accepts, or None for identity."""
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.partition(';')
+        name, _, quality = params.strip().partition('=')
+        try:
+            if name.strip() == 'q' and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    usable = [(size, coding) for coding, size in available.items() if coding in accepted]
+    return min(usable)[1] if usable else None
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected yet: link the plain file, which static_file() finds in the app.
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed_names = []
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if isinstance(hashed_name, str):
+                processed_names.append(hashed_name)
+            yield name, hashed_name, processed
+        if not dry_run:
+            for hashed_name in processed_names:
+                self._write_compressed(hashed_name)
+
+    def _write_compressed(self, name):
+        if os.path.splitext(name)[1] not in COMPRESSIBLE:
+            return
+        with self.open(name) as fh:
+            data = fh.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for coding, body in compress(data).items():
+            with open(self.path(name) + self.SUFFIXES[coding], 'wb') as out:
+                out.write(body)
+
+
+_immutable_names = None
+
+
+def _is_hashed(path):
+    global _immutable_names
+    if _immutable_names is None:
+        _immutable_names = frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+    return path in _immutable_names
+
+
+def _locate(path):
+    try:
+        collected = safe_join(settings.STATIC_ROOT, path) if settings.STATIC_ROOT else None
+    except SuspiciousFileOperation:
+        return None
+    if collected and os.path.isfile(collected):
+        return collected
+    return finders.find(path)
+
+
+@require_safe
+def static_file(request, path):
+    full_path = _locate(path)
+    if not full_path:
+        raise Http404("No such static file.")
+
+    variants = {}
+    for coding, suffix in CompressedManifestStorage.SUFFIXES.items():
+        if os.path.isfile(full_path + suffix):
+            variants[coding] = os.path.getsize(full_path + suffix)
+    coding = accepted_encoding(request, variants)
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    suffix = CompressedManifestStorage.SUFFIXES[coding] if coding else ''
+    response = FileResponse(open(full_path + suffix, 'rb'), content_type=content_type)
+    if coding:
+        response['Content-Encoding'] = coding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if _is_hashed(path):
+        response['Cache-Control'] = f'public, max-age={HASHED_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={UNHASHED_MAX_AGE}'
+    return response
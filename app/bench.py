@@ -0,0 +1,83 @@
+# badam_satti_app/bench.py
+"""
+Small helpers shared by the ``bench_*`` and ``loadtest`` management commands.
+"""
+import json
+import math
+import time
+from contextlib import contextmanager
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, math.ceil(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples):
+    """Summarise a list of durations (seconds) in microseconds."""
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        'count': count,
+        'mean_us': (sum(ordered) / count * 1e6) if count else 0.0,
+        'p50_us': percentile(ordered, 0.50) * 1e6,
+        'p95_us': percentile(ordered, 0.95) * 1e6,
+        'p99_us': percentile(ordered, 0.99) * 1e6,
+        'max_us': (ordered[-1] * 1e6) if count else 0.0,
+    }
+
+
+def time_calls(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """Run the block against a throwaway test database instead of db.sqlite3."""
+    from django.test.utils import setup_databases, teardown_databases
+
+    old_config = setup_databases(verbosity=verbosity, interactive=False, aliases={'default'})
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+
+
+def write_results(path, results):
+    with open(path, 'w') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+
+
+def best_of(fn, inner, rounds):
+    """Per-call time (seconds) for each of ``rounds`` batches of ``inner`` calls."""
+    per_call = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(inner):
+            fn()
+        per_call.append((time.perf_counter() - started) / inner)
+    return per_call
+
+
+def find_regressions(results, baseline, threshold, key='min_us'):
+    """
+    Names that got slower than ``baseline`` by more than ``threshold`` (a
+    fraction). The best round is compared by default; it is far less
+    sensitive to a noisy neighbour than the median.
+    """
+    regressions = []
+    for name, row in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get(key):
+            continue
+        change = row[key] / previous[key] - 1
+        if change > threshold:
+            regressions.append((name, previous[key], row[key], change))
+    return regressions
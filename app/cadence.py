@@ -0,0 +1,99 @@
+# badam_satti_app/cadence.py
+"""
+How soon a game page should poll and ping again.
+
+``get_game_state`` and ``player_ping`` answers carry ``next_poll_ms`` and
+``next_ping_ms``; the page schedules its next call with them instead of fixed
+timers. The seat next in line polls fastest, so it sees its turn as soon as
+it comes; the player whose turn it is already knows and only polls for
+disconnects; the rest back off with their distance from the turn. Halted and
+finished games slow everyone down.
+
+Every interval is then multiplied by a load factor: the rate of polls and
+pings this process is answering over ``CADENCE_TARGET_RPS`` (never below 1,
+at most ``CADENCE_MAX_BACKOFF``), times ``CADENCE_LOAD_FACTOR`` for shedding
+load by hand. Pings never stretch past ``MAX_PING_MS`` so load shedding does
+not get anyone removed by the 20 s ping timeout.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .metrics import registry
+
+NEXT_TURN_POLL_MS = 750
+YOUR_TURN_POLL_MS = 1500
+IDLE_POLL_MS = 2000
+PER_SEAT_POLL_MS = 500
+MAX_IDLE_POLL_MS = 4000
+HALTED_POLL_MS = 4000
+GAME_OVER_POLL_MS = 10000
+
+ACTIVE_PING_MS = 1000
+IDLE_PING_MS = 2000
+MAX_PING_MS = 5000
+
+
+class RateMeter:
+    """Calls per second over the last whole ``window`` seconds."""
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._count = 0
+        self._rate = 0.0
+
+    def hit(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            elapsed = now - self._started
+            if elapsed >= self.window:
+                # A gap longer than one window means nothing arrived in between.
+                self._rate = self._count / elapsed if elapsed < 2 * self.window else 0.0
+                self._started, self._count = now, 0
+            self._count += 1
+
+    def rate(self):
+        return self._rate
+
+
+meter = RateMeter()
+
+
+def load_factor():
+    target = getattr(settings, 'CADENCE_TARGET_RPS', 500)
+    measured = meter.rate() / target if target else 1.0
+    factor = min(max(1.0, measured), getattr(settings, 'CADENCE_MAX_BACKOFF', 4.0))
+    return factor * getattr(settings, 'CADENCE_LOAD_FACTOR', 1.0)
+
+
+def _base_intervals(game, player_num):
+    if game.game_over:
+        return GAME_OVER_POLL_MS, GAME_OVER_POLL_MS
+    if game.is_halted:
+        return HALTED_POLL_MS, IDLE_PING_MS
+    if not game.is_game_started or not player_num:
+        return IDLE_POLL_MS, IDLE_PING_MS
+    seats_away = (player_num - game.current_player) % game.num_players
+    if seats_away == 0:
+        return YOUR_TURN_POLL_MS, ACTIVE_PING_MS
+    if seats_away == 1:
+        return NEXT_TURN_POLL_MS, IDLE_PING_MS
+    return min(MAX_IDLE_POLL_MS, IDLE_POLL_MS + (seats_away - 2) * PER_SEAT_POLL_MS), IDLE_PING_MS
+
+
+def next_intervals(game, player_num):
+    """{'next_poll_ms': ..., 'next_ping_ms': ...} for ``player_num`` at ``game``; counts as one call for the load."""
+    meter.hit()
+    poll_ms, ping_ms = _base_intervals(game, player_num)
+    factor = load_factor()
+    return {
+        'next_poll_ms': int(poll_ms * factor),
+        'next_ping_ms': int(min(MAX_PING_MS, ping_ms * factor)),
+    }
+
+
+LOAD_FACTOR = registry.gauge('badam_cadence_load_factor', 'Multiplier applied to recommended poll and ping intervals.',
+                             load_factor)
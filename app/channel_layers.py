@@ -0,0 +1,375 @@
+# badam_satti_app/channel_layers.py
+"""
+Channel layers for GameConsumer.
+
+``BatchingInMemoryChannelLayer`` is the single-process default.
+``RespChannelLayer`` speaks the Redis protocol (RESP) so that several server
+processes share groups; point ``CHANNEL_LAYER_URL`` at Redis, or at
+``python manage.py resp_standin`` when working locally.
+
+Both layers fan ``group_send`` out in one pass. The in-memory layer puts the
+message straight onto every member's queue instead of spawning a task per
+member, and the RESP layer pushes to every member in a single pipelined round
+trip instead of one round trip per member. Group messages are copied/encoded
+once and shared by all members, so receivers must not mutate them (the
+consumer handlers only read).
+"""
+import asyncio
+import json
+import random
+import string
+import time
+import urllib.parse
+import uuid
+import weakref
+from copy import deepcopy
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer, InMemoryChannelLayer
+
+
+class BatchingInMemoryChannelLayer(InMemoryChannelLayer):
+    def __init__(self, clean_interval=1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.clean_interval = clean_interval
+        self._cleaned_at = 0.0
+
+    def _clean_expired(self):
+        # The stock layer walks every channel and group on every send/receive;
+        # that is O(sockets in the process) per message.
+        now = time.monotonic()
+        if now - self._cleaned_at >= self.clean_interval:
+            self._cleaned_at = now
+            super()._clean_expired()
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        self._clean_expired()
+
+        members = self.groups.get(group)
+        if not members:
+            return
+        entry = (time.time() + self.expiry, deepcopy(message))
+        for channel in list(members):
+            queue = self.channels.get(channel)
+            if queue is None:
+                queue = self.channels[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+            try:
+                queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                pass
+
+
+# --- RESP ---
+
+class RespError(Exception):
+    pass
+
+
+# send(): the capacity check and the push happen in one step on the server,
+# so concurrent senders cannot take a channel past its capacity.
+SEND_SCRIPT = """
+if redis.call('LLEN', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+def encode_command(args):
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+async def read_reply(reader):
+    """Read one reply. Error replies are returned as RespError, not raised, so
+    that a pipeline can still consume the replies after them."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("RESP server closed the connection")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode()
+    if kind == b'-':
+        return RespError(rest.decode())
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b'*':
+        count = int(rest)
+        if count < 0:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise RespError(f"Unexpected reply {line!r}")
+
+
+class RespConnection:
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._lock = asyncio.Lock()
+        self.broken = False
+
+    @classmethod
+    async def open(cls, host, port, db=0, password=None):
+        reader, writer = await asyncio.open_connection(host, port)
+        connection = cls(reader, writer)
+        if password:
+            await connection.execute('AUTH', password)
+        if db:
+            await connection.execute('SELECT', db)
+        return connection
+
+    async def execute(self, *args):
+        return (await self.pipeline([args]))[0]
+
+    async def pipeline(self, commands):
+        async with self._lock:
+            try:
+                self._writer.write(b''.join(encode_command(command) for command in commands))
+                await self._writer.drain()
+                replies = [await read_reply(self._reader) for _ in commands]
+            except BaseException:
+                # Cancelled or failed half way: unread replies would be handed
+                # to the next caller, so this connection is done.
+                self.close()
+                raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def close(self):
+        self.broken = True
+        self._writer.close()
+
+
+class _LoopState:
+    """Connections and process-local queues for one event loop."""
+
+    def __init__(self):
+        self.client_prefix = uuid.uuid4().hex[:12]
+        self.commands = None
+        self.open_lock = asyncio.Lock()
+        self.receiver = None
+        self.queues = {}
+        self.receiving = {}
+        self.touched = {}
+
+    def queue(self, channel):
+        queue = self.queues.get(channel)
+        if queue is None:
+            queue = self.queues[channel] = asyncio.Queue()
+        self.touched[channel] = time.monotonic()
+        return queue
+
+    def sweep(self, expiry):
+        # Drop queues nobody has received from lately (their consumer is gone).
+        cutoff = time.monotonic() - expiry
+        for channel, touched in list(self.touched.items()):
+            if touched < cutoff and not self.receiving.get(channel):
+                self.queues.pop(channel, None)
+                self.touched.pop(channel, None)
+
+
+class RespChannelLayer(BaseChannelLayer):
+    """
+    Channel layer on any server speaking RESP (Redis, or the local stand-in).
+
+    Channels from ``new_channel()`` are process-local: all of them share one
+    list per event loop, drained by a single BLPOP loop that hands messages to
+    per-channel queues, so a thousand sockets cost one blocking connection,
+    not a thousand. Groups are sorted sets scored by join time, which lets
+    members that never left (a crashed process) age out after
+    ``group_expiry``.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, url='redis://127.0.0.1:6379/0', prefix='asgi', expiry=60, group_expiry=86400,
+                 capacity=100, channel_capacity=None, receive_timeout=1, receive_batch=100, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.password = parsed.password
+        self.prefix = prefix
+        self.group_expiry = group_expiry
+        self.receive_timeout = receive_timeout
+        self.receive_batch = receive_batch
+        self._states = weakref.WeakKeyDictionary()
+
+    # --- plumbing ---
+    def _open(self):
+        return RespConnection.open(self.host, self.port, self.db, self.password)
+
+    async def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState()
+        if state.commands is None or state.commands.broken:
+            async with state.open_lock:
+                if state.commands is None or state.commands.broken:
+                    state.commands = await self._open()
+        return state
+
+    async def _pipeline(self, commands):
+        state = await self._state()
+        return await state.commands.pipeline(commands)
+
+    def _channel_key(self, channel):
+        if '!' in channel:
+            channel = channel[:channel.index('!') + 1]
+        return f'{self.prefix}:{channel}'
+
+    def _group_key(self, group):
+        return f'{self.prefix}:group:{group}'
+
+    @staticmethod
+    def _encode_body(message):
+        return json.dumps(message, separators=(',', ':')).encode()
+
+    @staticmethod
+    def _decode(frame):
+        channel, _, body = frame.partition(b'\n')
+        return channel.decode(), json.loads(body)
+
+    # --- channel layer API ---
+    async def new_channel(self, prefix='specific.'):
+        state = await self._state()
+        suffix = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        return f'{prefix}{state.client_prefix}!{suffix}'
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        key = self._channel_key(channel)
+        frame = channel.encode() + b'\n' + self._encode_body(message)
+        (pushed,) = await self._pipeline([
+            ('EVAL', SEND_SCRIPT, 1, key, frame, self.get_capacity(channel), self.expiry),
+        ])
+        if not pushed:
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if '!' not in channel:
+            return await self._receive_shared(channel)
+
+        state = await self._state()
+        if state.receiver is None or state.receiver.done():
+            state.receiver = asyncio.ensure_future(self._receive_loop(state))
+        queue = state.queue(channel)
+        state.receiving[channel] = state.receiving.get(channel, 0) + 1
+        try:
+            return await queue.get()
+        finally:
+            state.receiving[channel] -= 1
+            if not state.receiving[channel]:
+                del state.receiving[channel]
+            state.touched[channel] = time.monotonic()
+
+    async def _receive_shared(self, channel):
+        key = self._channel_key(channel)
+        connection = await self._open()
+        try:
+            while True:
+                reply = await connection.execute('BLPOP', key, self.receive_timeout)
+                if reply is not None:
+                    return self._decode(reply[1])[1]
+        finally:
+            connection.close()
+
+    async def _receive_loop(self, state):
+        key = self._channel_key(f'specific.{state.client_prefix}!')
+        connection = await self._open()
+        try:
+            while True:
+                reply = await connection.execute('BLPOP', key, self.receive_timeout)
+                if reply is None:
+                    state.sweep(self.expiry)
+                    continue
+                self._deliver(state, [reply[1]])
+                while True:
+                    # Drain whatever queued up behind it. Only this loop pops
+                    # this key, so LRANGE + LTRIM is safe: RPUSHes in between
+                    # land after the range we read.
+                    frames, _ = await connection.pipeline([
+                        ('LRANGE', key, 0, self.receive_batch - 1),
+                        ('LTRIM', key, self.receive_batch, -1),
+                    ])
+                    self._deliver(state, frames)
+                    if len(frames) < self.receive_batch:
+                        break
+        finally:
+            connection.close()
+
+    def _deliver(self, state, frames):
+        for frame in frames:
+            channel, message = self._decode(frame)
+            state.queue(channel).put_nowait(message)
+
+    # --- groups ---
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        key = self._group_key(group)
+        await self._pipeline([('ZADD', key, time.time(), channel), ('EXPIRE', key, self.group_expiry)])
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._pipeline([('ZREM', self._group_key(group), channel)])
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        key = self._group_key(group)
+        _, members = await self._pipeline([
+            ('ZREMRANGEBYSCORE', key, 0, time.time() - self.group_expiry),
+            ('ZRANGE', key, 0, -1),
+        ])
+        if not members:
+            return
+
+        body = self._encode_body(message)
+        frames = {}
+        for member in members:
+            channel = member.decode()
+            frames.setdefault(self._channel_key(channel), []).append(member + b'\n' + body)
+        commands = []
+        for channel_key, batch in frames.items():
+            commands.append(('RPUSH', channel_key, *batch))
+            commands.append(('EXPIRE', channel_key, self.expiry))
+        await self._pipeline(commands)
+
+    # --- flush / close ---
+    async def flush(self):
+        keys = (await self._pipeline([('KEYS', f'{self.prefix}:*')]))[0]
+        if keys:
+            await self._pipeline([('DEL', *keys)])
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        state = self._states.pop(loop, None)
+        if state is None:
+            return
+        if state.receiver is not None:
+            state.receiver.cancel()
+        if state.commands is not None:
+            state.commands.close()
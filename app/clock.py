@@ -0,0 +1,69 @@
+# badam_satti_app/clock.py
+"""
+The time game lifecycle decisions are made against.
+
+The lobby's 5-minute room lifetime, the 20 s ping timeout and the 120 s
+reconnect window all compare timestamps with ``clock.now()`` rather than
+``timezone.now()``. Normally that is the wall clock; ``use(VirtualClock())``
+swaps in a clock that only moves when told to, so tests and the timeout
+simulator (app/simulator.py) can cross those windows without sleeping.
+
+The swap is process-wide rather than per context, because actors apply
+changes on their own threads. Infrastructure timing -- shard heartbeats,
+request throttling, poll cadence -- stays on real time.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.utils import timezone
+
+
+class WallClock:
+    def now(self):
+        return timezone.now()
+
+
+class VirtualClock:
+    """A clock that starts at ``start`` (default: the current time) and moves only on advance() or set()."""
+
+    def __init__(self, start=None):
+        self._now = start or timezone.now()
+        self._lock = threading.Lock()
+
+    def now(self):
+        return self._now
+
+    def advance(self, seconds):
+        with self._lock:
+            self._now += timedelta(seconds=seconds)
+            return self._now
+
+    def set(self, moment):
+        with self._lock:
+            if moment < self._now:
+                raise ValueError("A virtual clock cannot move backwards.")
+            self._now = moment
+            return self._now
+
+
+_clock = WallClock()
+
+
+def now():
+    return _clock.now()
+
+
+def current():
+    return _clock
+
+
+@contextmanager
+def use(clock):
+    """Make ``clock`` the source of now() for the duration of the block."""
+    global _clock
+    previous, _clock = _clock, clock
+    try:
+        yield clock
+    finally:
+        _clock = previous
@@ -1,22 +1,167 @@
 # your_app_name/consumers.py
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.utils import timezone
 import asyncio
+from urllib.parse import parse_qs
 from asgiref.sync import sync_to_async
-from datetime import timedelta
-import datetime # Import datetime for timedelta
+from channels.db import database_sync_to_async
 
+from . import actors, lobby, player_tokens
+from .ops import table_rates
+from .log import log_game
+from .metrics import CONNECTED_SOCKETS, instrument_handler, json_loads
+from .profiling import profile_handler
 from .models import Game # Assuming your Game model is in .models
+from .sharding import shard_map
+
+logger = logging.getLogger(__name__)
+
+# One reconnect-timer task per room in this process, however many sockets it has.
+_reconnect_watchers = {}
+
+
+def game_state_payload(game):
+    # To avoid sending other players' hand data, send hand size
+    players_info = [
+        {'player_num': p_data['player_num'], 'name': p_data['name'], 'hand_size': len(p_data['hand'])}
+        for p_data in json_loads(game.players_data)
+    ]
+    return {
+        'game_id': str(game.game_id),
+        'room_code': game.room_code,
+        'num_players': game.num_players,
+        'players': players_info,
+        'current_player_turn': game.current_player,
+        'desk_cards': json_loads(game.desk_cards),
+        'is_game_started': game.is_game_started,
+        'game_over': game.game_over,
+        'winner_player_num': game.winner_player_num,
+        'disconnected_player': game.disconnected_player,
+        'reconnect_timer_start': str(game.reconnect_timer_start) if game.reconnect_timer_start else None,
+        'is_halted': game.is_halted,
+        'reconnect_time_left': game.reconnect_time_left() if game.is_halted else 0,
+        'auto_passed': json_loads(game.auto_passed),
+        'move_count': game.move_count,
+        'round_number': game.round_number,
+    }
+
+
+async def broadcast_game_state(channel_layer, group_name, game_data):
+    await channel_layer.group_send(group_name, {'type': 'game_state_update', 'game_data': game_data})
+
+
+def ensure_reconnect_watcher(channel_layer, group_name, game_id):
+    task = _reconnect_watchers.get(group_name)
+    if task is None or task.done():
+        _reconnect_watchers[group_name] = asyncio.create_task(
+            watch_reconnect_timer(channel_layer, group_name, game_id))
+
+
+def _reconnect_tick(game):
+    if not game.is_halted:
+        # Resumed (reconnect), or over by winning or a previous termination.
+        return 'resumed', None, None
+    changed, message = game.check_for_game_termination(commit=False)
+    if changed:
+        return 'ended', message, game_state_payload(game)
+    return 'waiting', game.disconnected_player, game.reconnect_time_left()
+
+
+async def watch_reconnect_timer(channel_layer, group_name, game_id):
+    try:
+        while True:
+            outcome, detail, extra = await actors.amutate(game_id, _reconnect_tick)
+            if outcome == 'resumed':
+                break
+
+            if outcome == 'ended':
+                log_game(logger, logging.INFO, "Reconnect timer expired: %s", detail, game_id=game_id)
+                await channel_layer.group_send(group_name, {
+                    'type': 'game_message',
+                    'message': 'game_terminated' if extra['game_over'] else 'player_removed',
+                    'status_message': detail,
+                    'game_over': extra['game_over'],
+                })
+                await broadcast_game_state(channel_layer, group_name, extra)
+                break
+
+            disconnected_player, time_left = detail, extra
+            await channel_layer.group_send(group_name, {
+                'type': 'game_message',
+                'message': 'reconnect_timer_update',
+                'player_num': disconnected_player,
+                'time_remaining': time_left,
+                'status_message': f"Player {disconnected_player} is disconnected. Game halted. Time remaining: {time_left} seconds.",
+            })
+            await asyncio.sleep(5) # Check every 5 seconds
+    except asyncio.CancelledError:
+        log_game(logger, logging.DEBUG, "Reconnect watcher cancelled.", game_id=game_id)
+    except Game.DoesNotExist:
+        log_game(logger, logging.DEBUG, "Game not found during reconnect watch, stopping.", game_id=game_id)
+    except Exception:
+        log_game(logger, logging.ERROR, "Error in reconnect watcher.", game_id=game_id, exc_info=True)
+    finally:
+        if _reconnect_watchers.get(group_name) is asyncio.current_task():
+            del _reconnect_watchers[group_name]
+
 
 class GameConsumer(AsyncWebsocketConsumer):
+    """
+    Every change goes through actors.amutate(): one load (none when the game's
+    actor is live), the change in memory, at most one write. The state
+    broadcast is built inside the same step instead of fetching the row again.
+    """
+
+    @instrument_handler('connect')
+    @profile_handler('connect')
     async def connect(self):
         self.room_code = self.scope['url_route']['kwargs']['room_code']
         self.room_group_name = f'game_{self.room_code}'
-        self.player_num = self.scope['session'].get('player_num') # Assuming you store player_num in session
-        self.game_id = self.scope['session'].get('game_id') # Get game_id from session
+        # The seat is looked up each time from the name: removing a player renumbers the seats.
+        self.player_num = None
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        if 'token' in query:
+            # The game page signs in with its player token: after a shard redirect the
+            # socket is on another host, which never sees this one's session cookie.
+            self.game_id = query.get('game_id', [''])[0]
+            self.player_name = player_tokens.player_name_for(query['token'][0], self.game_id)
+        else:
+            session = self.scope['session']
+            self.player_name = await session.aget('player_name')
+            self.game_id = await session.aget('game_id')
+
+        # Sockets cannot be proxied like HTTP requests; point the client at the owner instead
+        # (game.js reconnects to base_url on close code 4307).
+        shards = shard_map()
+        if shards is not None:
+            owner, base_url = await sync_to_async(shards.owner_url)(self.room_code)
+            if owner is not None and owner != shards.node_id:
+                await self.accept()
+                await self.send(text_data=json.dumps({'type': 'shard_redirect', 'owner': owner, 'base_url': base_url}))
+                await self.close(code=4307)
+                return
+
+        if not self.player_name or not self.game_id:
+            await self.close()
+            return
+
+        player_name = self.player_name
 
-        if not self.player_num or not self.game_id:
+        def reconnect(game):
+            player_num = player_tokens.seat_of(game, player_name)
+            if player_num and game.disconnected_player == player_num and game.is_halted:
+                reconnected, message = game.handle_player_reconnect(player_num, commit=False)
+                if reconnected:
+                    return player_num, 'reconnected', message, game_state_payload(game)
+            return player_num, ('halted' if game.is_halted else None), None, None
+
+        try:
+            self.player_num, outcome, message, game_data = await actors.amutate(self.game_id, reconnect)
+        except Game.DoesNotExist:
+            await self.close()
+            return
+        if not self.player_num:
             await self.close()
             return
 
@@ -24,62 +169,73 @@ class GameConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        self.joined_group = True
         await self.accept()
+        self.counted_socket = True
+        CONNECTED_SOCKETS.inc()
 
-        game = await sync_to_async(Game.objects.get)(game_id=self.game_id)
-        
         # Handle reconnection
-        if game.disconnected_player == self.player_num and game.is_halted:
-            reconnected, message = await sync_to_async(game.handle_player_reconnect)(self.player_num)
-            if reconnected:
-                # Notify all players in the group that the player reconnected
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'game_message',
-                        'message': 'player_reconnected',
-                        'player_num': self.player_num,
-                        'status_message': message
-                    }
-                )
-                await self.send_game_state_to_group() # Send updated state to all
-        
-        # Start the periodic termination check task for this game, only if not already started
-        # In a production environment, a more robust solution like a Celery Beat task
-        # or a shared timer per game instance would be better. This is for demonstration.
-        if not hasattr(self, 'termination_check_task') or self.termination_check_task.done():
-            self.termination_check_task = asyncio.create_task(self.periodic_termination_check())
-
-
-    async def disconnect(self, close_code):
-        print(f"Player {self.player_num} disconnected from {self.room_code} (game: {self.game_id})")
-        
-        # Cancel the periodic check task if it exists
-        if hasattr(self, 'termination_check_task') and not self.termination_check_task.done():
-            self.termination_check_task.cancel()
-
-        try:
-            game = await sync_to_async(Game.objects.get)(game_id=self.game_id)
-            await sync_to_async(game.handle_player_disconnect)(self.player_num)
-            
-            # Notify all players in the group that a player disconnected
+        if outcome == 'reconnected':
+            # Notify all players in the group that the player reconnected
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'game_message',
-                    'message': 'player_disconnected',
+                    'message': 'player_reconnected',
                     'player_num': self.player_num,
-                    'reconnect_timer_start': str(game.reconnect_timer_start) if game.reconnect_timer_start else None, # Send as string
-                    'status_message': f"Player {self.player_num} disconnected. Game halted. Reconnect timer started (2 minutes)."
+                    'status_message': message
                 }
             )
-            # Ensure game state is broadcast after disconnect
-            await self.send_game_state_to_group()
+            await self.send_game_state_to_group(game_data) # Send updated state to all
+        elif outcome == 'halted':
+            # Someone else is away; make sure this process is counting down for the room.
+            ensure_reconnect_watcher(self.channel_layer, self.room_group_name, self.game_id)
+
+
+    @instrument_handler('disconnect')
+    @profile_handler('disconnect')
+    async def disconnect(self, close_code):
+        if getattr(self, 'counted_socket', False):
+            self.counted_socket = False
+            CONNECTED_SOCKETS.dec()
+        if not getattr(self, 'joined_group', False):
+            return
+        log_game(logger, logging.DEBUG, "Player %s disconnected from socket.", self.player_num,
+                 game_id=self.game_id, room_code=self.room_code, player_num=self.player_num)
+
+        player_name = self.player_name
+
+        def disconnect(game):
+            player_num = player_tokens.seat_of(game, player_name)
+            if (player_num and game.is_game_started and not game.game_over
+                    and game.handle_player_disconnect(player_num, commit=False)):
+                return player_num, str(game.reconnect_timer_start), game_state_payload(game)
+            return player_num, None, None
+
+        try:
+            self.player_num, reconnect_timer_start, game_data = await actors.amutate(self.game_id, disconnect)
+            if game_data is not None:
+                # Notify all players in the group that a player disconnected
+                await self.channel_layer.group_send(
+                    self.room_group_name,
+                    {
+                        'type': 'game_message',
+                        'message': 'player_disconnected',
+                        'player_num': self.player_num,
+                        'reconnect_timer_start': reconnect_timer_start, # Send as string
+                        'status_message': f"Player {self.player_num} disconnected. Game halted. Reconnect timer started (2 minutes)."
+                    }
+                )
+                # Ensure game state is broadcast after disconnect
+                await self.send_game_state_to_group(game_data)
+                ensure_reconnect_watcher(self.channel_layer, self.room_group_name, self.game_id)
 
         except Game.DoesNotExist:
-            print(f"Game {self.game_id} not found on disconnect.")
-        except Exception as e:
-            print(f"Error handling disconnect for game {self.game_id}: {e}")
+            log_game(logger, logging.WARNING, "Game not found on disconnect.", game_id=self.game_id,
+                     room_code=self.room_code, player_num=self.player_num)
+        except Exception:
+            log_game(logger, logging.ERROR, "Error handling disconnect.", game_id=self.game_id,
+                     room_code=self.room_code, player_num=self.player_num, exc_info=True)
 
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -87,163 +243,83 @@ class GameConsumer(AsyncWebsocketConsumer):
         )
 
 
+    @instrument_handler('receive')
+    @profile_handler('receive')
     async def receive(self, text_data):
+        table_rates.hit(self.room_code)
         data = json.loads(text_data)
         message_type = data.get('type')
+        if message_type not in ('play_card', 'pass_turn'):
+            return
+
+        player_name = self.player_name
+        card_num = data.get('card_num')
 
-        game = await sync_to_async(Game.objects.get)(game_id=self.game_id)
+        # Same checks as the play_card / pass_turn views.
+        def apply(game):
+            player_num = player_tokens.seat_of(game, player_name)
+            if game.is_halted:
+                return 'Game is currently halted due to a disconnected player. No moves can be made.', None
+            if game.game_over or not game.is_game_started:
+                return 'The game is not in progress.', None
+            if game.current_player != player_num:
+                return 'It is not your turn.', None
+            if message_type == 'play_card':
+                if card_num not in game.get_valid_moves_for_player(player_num):
+                    return 'Invalid move.', None
+                game.update_game_state_after_move(card_num, player_num, commit=False)
+            else:
+                game.pass_turn(player_num, commit=False)
+            return None, game_state_payload(game)
 
-        # Before processing any game-related action, check if the game is halted
-        if game.is_halted and message_type not in ['player_reconnect_attempt']: # Allow reconnect attempts
+        error, game_data = await actors.amutate(self.game_id, apply)
+        if error:
             await self.send(text_data=json.dumps({
                 'type': 'error',
-                'message': 'Game is currently halted due to a disconnected player. No moves can be made.'
+                'message': error
             }))
             return
-
-        if message_type == 'play_card':
-            card_num = data.get('card_num')
-            # Check player turn and if game is halted within the model method
-            success, msg = await sync_to_async(game.update_game_state_after_move)(card_num, self.player_num)
-            if success:
-                await self.send_game_state_to_group()
-            else:
-                await self.send(text_data=json.dumps({
-                    'type': 'error',
-                    'message': msg
-                }))
-        elif message_type == 'pass_turn':
-            # Check player turn and if game is halted within the model method
-            success, msg = await sync_to_async(game.pass_turn)(self.player_num)
-            if success:
-                await self.send_game_state_to_group()
-            else:
-                await self.send(text_data=json.dumps({
-                    'type': 'error',
-                    'message': msg
-                }))
+        await self.send_game_state_to_group(game_data)
 
 
     async def game_message(self, event):
         # This function receives messages from the channel layer group and sends them to the WebSocket
-        message_type = event['type']
-        if message_type == 'game_message':
-            await self.send(text_data=json.dumps({
-                'type': event['message'], # e.g., 'player_disconnected', 'player_reconnected', 'game_terminated'
-                'player_num': event.get('player_num'),
-                'reconnect_timer_start': event.get('reconnect_timer_start'),
-                'status_message': event.get('status_message'),
-                'time_remaining': event.get('time_remaining'), # For timer updates
-                'game_over': event.get('game_over', False), # For game terminated
-            }))
-        elif message_type == 'game_state_update':
-            await self.send(text_data=json.dumps({
-                'type': 'game_state_update',
-                'game_data': event['game_data']
-            }))
-            
-    async def send_game_state_to_group(self):
+        await self.send(text_data=json.dumps({
+            'type': event['message'], # e.g., 'player_disconnected', 'player_reconnected', 'game_terminated'
+            'player_num': event.get('player_num'),
+            'reconnect_timer_start': event.get('reconnect_timer_start'),
+            'status_message': event.get('status_message'),
+            'time_remaining': event.get('time_remaining'), # For timer updates
+            'game_over': event.get('game_over', False), # For game terminated
+        }))
+
+    async def game_state_update(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'game_state_update',
+            'game_data': event['game_data']
+        }))
+
+    @instrument_handler('send_game_state_to_group')
+    @profile_handler('send_game_state_to_group')
+    async def send_game_state_to_group(self, game_data):
         try:
-            game = await sync_to_async(Game.objects.get)(game_id=self.game_id)
-            players_data_list = json.loads(game.players_data)
-            
-            # To avoid sending other players' hand data, send hand size
-            players_info = []
-            for p_data in players_data_list:
-                players_info.append({
-                    'player_num': p_data['player_num'],
-                    'name': p_data['name'],
-                    'hand_size': len(p_data['hand'])
-                })
+            await broadcast_game_state(self.channel_layer, self.room_group_name, game_data)
+        except Exception:
+            log_game(logger, logging.ERROR, "Error sending game state update.", game_id=self.game_id,
+                     room_code=self.room_code, exc_info=True)
 
-            game_data = {
-                'game_id': str(game.game_id),
-                'room_code': game.room_code,
-                'num_players': game.num_players,
-                'players': players_info,
-                'current_player_turn': game.current_player,
-                'desk_cards': json.loads(game.desk_cards),
-                'is_game_started': game.is_game_started,
-                'game_over': game.game_over,
-                'winner_player_num': game.winner_player_num,
-                'disconnected_player': game.disconnected_player,
-                'reconnect_timer_start': str(game.reconnect_timer_start) if game.reconnect_timer_start else None,
-                'is_halted': game.is_halted,
-            }
-
-            # Calculate time remaining for reconnection for the frontend
-            if game.is_halted and game.disconnected_player and game.reconnect_timer_start and not game.game_over:
-                time_limit = timedelta(minutes=2)
-                elapsed_time = timezone.now() - game.reconnect_timer_start
-                time_left_seconds = (time_limit - elapsed_time).total_seconds()
-                game_data['reconnect_time_left'] = max(0, int(time_left_seconds))
-            else:
-                game_data['reconnect_time_left'] = 0
 
+class LobbyConsumer(AsyncWebsocketConsumer):
+    """Sends the open public rooms once, then one delta per room change (see lobby.py)."""
 
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'game_state_update',
-                    'game_data': game_data
-                }
-            )
-        except Game.DoesNotExist:
-            print(f"Game {self.game_id} not found during state update.")
-        except Exception as e:
-            print(f"Error sending game state update for game {self.game_id}: {e}")
+    async def connect(self):
+        await self.channel_layer.group_add(lobby.LOBBY_GROUP, self.channel_name)
+        await self.accept()
+        rooms = await database_sync_to_async(lobby.open_rooms)()
+        await self.send(text_data=json.dumps({'type': 'lobby', 'rooms': rooms}))
 
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(lobby.LOBBY_GROUP, self.channel_name)
 
-    async def periodic_termination_check(self):
-        try:
-            while True:
-                game = await sync_to_async(Game.objects.get)(game_id=self.game_id)
-                
-                # Only run termination check if a player is disconnected and game is halted
-                if game.disconnected_player and game.is_halted and not game.game_over:
-                    terminated, message = await sync_to_async(game.check_for_game_termination)()
-                    
-                    if terminated:
-                        print(f"Game {self.game_id} terminated: {message}")
-                        await self.channel_layer.group_send(
-                            self.room_group_name,
-                            {
-                                'type': 'game_message',
-                                'message': 'game_terminated',
-                                'status_message': message,
-                                'game_over': True,
-                                'player_num': game.disconnected_player # Inform which player caused termination
-                            }
-                        )
-                        await self.send_game_state_to_group() # Send final terminated state
-                        break # Stop this loop as the game is terminated
-                    else:
-                        # If not terminated, but still halted, send updated timer info
-                        time_limit = timedelta(minutes=2)
-                        elapsed_time = timezone.now() - game.reconnect_timer_start
-                        time_left_seconds = (time_limit - elapsed_time).total_seconds()
-                        
-                        await self.channel_layer.group_send(
-                            self.room_group_name,
-                            {
-                                'type': 'game_message',
-                                'message': 'reconnect_timer_update',
-                                'player_num': game.disconnected_player,
-                                'time_remaining': max(0, round(time_left_seconds)),
-                                'status_message': f"Player {game.disconnected_player} is disconnected. Game halted. Time remaining: {max(0, round(time_left_seconds))} seconds."
-                            }
-                        )
-                elif game.game_over:
-                    # If game is already over (by winning or previous termination), stop the check
-                    break
-                elif not game.is_halted and not game.disconnected_player:
-                    # If game is resumed and no one is disconnected, no need for this periodic check
-                    break
-
-                await asyncio.sleep(5) # Check every 5 seconds
-        except asyncio.CancelledError:
-            print(f"Periodic termination check task for game {self.game_id} cancelled.")
-        except Game.DoesNotExist:
-            print(f"Game {self.game_id} not found during periodic check, terminating task.")
-        except Exception as e:
-            print(f"Error in periodic termination check for game {self.game_id}: {e}")
\ No newline at end of file
+    async def lobby_update(self, event):
+        await self.send(text_data=json.dumps({'type': 'lobby_update', 'room': event['room']}))
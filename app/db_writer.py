@@ -0,0 +1,89 @@
+# badam_satti_app/db_writer.py
+"""
+A single writer thread for game writes.
+
+SQLite allows one writer at a time. When several request threads save games
+concurrently they queue up inside SQLite's busy handler, and past the busy
+timeout someone gets "database is locked". With ``SQLITE_SERIALIZED_WRITES``
+on, ``Game.save()``/``Game.delete()`` are handed to one thread with its own
+persistent connection, so writes from this process are applied one after the
+other and never contend with each other for the lock.
+
+``arun_write`` is the same for async callers (GameConsumer). It awaits the
+writer thread directly instead of first hopping onto the thread-sensitive
+sync_to_async executor, which every ORM call in the process shares.
+"""
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .metrics import sampled_work
+
+
+def enabled():
+    return getattr(settings, 'SQLITE_SERIALIZED_WRITES', False)
+
+
+class SingleWriter:
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    thread = threading.Thread(target=self._run, name='game-db-writer', daemon=True)
+                    thread.start()
+                    self._thread = thread
+
+    def _run(self):
+        while True:
+            fn, args, kwargs, future = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with sampled_work('db_writer'):
+                    result = fn(*args, **kwargs)
+                future.set_result(result)
+            except BaseException as exc:
+                future.set_exception(exc)
+            finally:
+                if self._queue.empty():
+                    # Same bookkeeping Django does at the end of a request.
+                    close_old_connections()
+
+    def submit(self, fn, *args, **kwargs):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        """Run ``fn`` on the writer thread and wait for its result."""
+        if threading.current_thread() is self._thread:
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+
+writer = SingleWriter()
+
+
+def run_write(fn, *args, **kwargs):
+    # A write inside the caller's transaction must stay on the caller's
+    # connection, otherwise it would commit separately (or deadlock on it).
+    if not enabled() or transaction.get_connection(kwargs.get('using')).in_atomic_block:
+        return fn(*args, **kwargs)
+    return writer.run(fn, *args, **kwargs)
+
+
+async def arun_write(fn, *args, **kwargs):
+    if not enabled():
+        return await sync_to_async(fn)(*args, **kwargs)
+    return await asyncio.wrap_future(writer.submit(fn, *args, **kwargs))
@@ -0,0 +1,69 @@
+# badam_satti_app/dealing.py
+"""
+Shuffling and dealing.
+
+A deal is a function of its seed alone: ``deal(num_players, seed)`` shuffles
+a fresh deck with ``random.Random(seed)`` and hands it out by slicing, so
+seat ``i`` gets ``deck[i - 1::num_players]`` -- exactly the cards it would get
+if they went round the table one at a time. The seat that ends up with the
+7 of Hearts opens, and is worked out from where that card lands in the deck
+rather than by searching the hands afterwards.
+
+``start_game`` stores the seed on ``Game.deal_seed``; a game created with a
+seed already set is dealt from that seed, so a deal from a bug report, a
+replay or a benchmark can be reproduced exactly. A rematch names the seat that
+should open, and that seat swaps hands with whoever was dealt the 7 of Hearts.
+"""
+import random
+from collections import namedtuple
+
+from .models import CARDS_MAP
+
+SEVEN_OF_HEARTS = 7
+SEED_BITS = 62  # fits a signed 64-bit column on every backend
+
+DECK = tuple(CARDS_MAP.items())
+
+Deal = namedtuple('Deal', ['hands', 'first_player', 'seed'])
+
+
+def new_seed():
+    return random.SystemRandom().getrandbits(SEED_BITS)
+
+
+def _deal(rng, num_players, seed, first_player=None):
+    deck = list(DECK)
+    rng.shuffle(deck)
+    hands = {seat: deck[seat - 1::num_players] for seat in range(1, num_players + 1)}
+    holder = deck.index((SEVEN_OF_HEARTS, CARDS_MAP[SEVEN_OF_HEARTS])) % num_players + 1
+    if first_player is None:
+        return Deal(hands, holder, seed)
+    hands[first_player], hands[holder] = hands[holder], hands[first_player]
+    return Deal(hands, first_player, seed)
+
+
+def deal(num_players, seed=None, first_player=None):
+    """
+    Shuffle and deal one game. ``hands`` maps seat number to a list of
+    (num, name) cards. With ``first_player``, that seat gets the hand holding
+    the 7 of Hearts and opens.
+    """
+    if seed is None:
+        seed = new_seed()
+    return _deal(random.Random(seed), num_players, seed, first_player)
+
+
+def deal_many(num_players, count=None, seeds=None):
+    """
+    Deal ``count`` games, or one per seed in ``seeds``, for simulations and
+    load tests. One generator is re-seeded per deal instead of building a new
+    one each time; every deal is identical to ``deal(num_players, seed)``.
+    """
+    if seeds is None:
+        seeds = [new_seed() for _ in range(count)]
+    rng = random.Random()
+    deals = []
+    for seed in seeds:
+        rng.seed(seed)
+        deals.append(_deal(rng, num_players, seed))
+    return deals
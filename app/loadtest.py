@@ -0,0 +1,638 @@
+# badam_satti_app/loadtest.py
+"""
+Simulated tables for load testing.
+
+Every simulated player behaves like ``BadamSatti.html``: it pings and fetches
+the game state at the intervals the last answers recommended (every second
+and every 2.5 seconds until it has one) and, when the state says it is its
+turn, plays a valid move (or passes) and immediately re-fetches. A 429 from
+the per-player throttle postpones the call by its Retry-After. Players talk
+either to a running server over HTTP or, for CI, to the Django test client in
+the current process.
+
+With ``websocket=True`` each player also opens ``/ws/game/<room_code>/`` like
+the game page does and sends its moves over it, timing each one until the
+table's state broadcast comes back. A shard_redirect (close code 4307) is
+followed to the owner's base_url. Pings and state fetches stay on HTTP, as
+they do on the page.
+"""
+import asyncio
+import base64
+import hashlib
+import heapq
+import http.cookiejar
+import json
+import os
+import random
+import re
+import select
+import socket
+import ssl
+import struct
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from .bench import summarize
+
+PING_INTERVAL = 1.0
+POLL_INTERVAL = 2.5
+PLAYER_TOKEN_RE = re.compile(r"const playerToken = '([^']*)'")
+THROTTLED = object()
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'BEGIN', 'COMMIT', 'SAVEPOINT', 'RELEASE')
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+SHARD_REDIRECT_CODE = 4307
+
+
+class Response:
+    def __init__(self, status, content_type, location, body, retry_after=None):
+        self.status = status
+        self.location = location
+        self.retry_after = float(retry_after) if retry_after else 0.0
+        self.body = body
+        self.data = None
+        if content_type and content_type.startswith('application/json') and body:
+            self.data = json.loads(body)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # create_room/join_room answer with a redirect whose Location carries the room code.
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(_NoRedirect, urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def _csrf_token(self):
+        return next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=self.timeout) as resp:
+                return Response(resp.status, resp.headers.get('Content-Type'), resp.headers.get('Location'), resp.read())
+        except urllib.error.HTTPError as exc:
+            return Response(exc.code, exc.headers.get('Content-Type'), exc.headers.get('Location'), exc.read(),
+                            exc.headers.get('Retry-After'))
+
+    def get(self, path, headers=None):
+        return self._open(urllib.request.Request(self.base_url + path, headers=dict(headers or {})))
+
+    def post(self, path, form=None, payload=None, headers=None):
+        token = self._csrf_token()
+        headers = dict(headers or {}, **{'X-CSRFToken': token})
+        if payload is not None:
+            body = json.dumps(payload).encode()
+            headers['Content-Type'] = 'application/json'
+        else:
+            body = urllib.parse.urlencode(dict(form or {}, csrfmiddlewaretoken=token)).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        return self._open(urllib.request.Request(self.base_url + path, data=body, headers=headers, method='POST'))
+
+    def websocket(self, path, base_url=None):
+        # http -> ws, https -> wss; the Origin stays the page's host, as in a browser.
+        base_url = (base_url or self.base_url).rstrip('/')
+        return WebSocketConnection('ws' + base_url[len('http'):] + path, self.base_url, self.timeout)
+
+
+class SocketClosed(Exception):
+    def __init__(self, code=None):
+        super().__init__(code)
+        self.code = code
+
+
+class WebSocketConnection:
+    """
+    Just enough of RFC 6455 to play over ``/ws/game/``: unfragmented text
+    frames out, text and control frames in. The server may only be reachable
+    through the standard library here, so no client package is assumed.
+    """
+
+    def __init__(self, url, origin, timeout=10):
+        parts = urllib.parse.urlsplit(url)
+        secure = parts.scheme == 'wss'
+        sock = socket.create_connection((parts.hostname, parts.port or (443 if secure else 80)), timeout=timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+        self.sock = sock
+        self._buffer = b''
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        sock.sendall(
+            f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+            f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\nOrigin: {origin}\r\n\r\n'.encode()
+        )
+        while b'\r\n\r\n' not in self._buffer:
+            self._fill()
+        head, self._buffer = self._buffer.split(b'\r\n\r\n', 1)
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest())
+        if head.split(b' ', 2)[1:2] != [b'101'] or accept not in head:
+            sock.close()
+            raise SocketClosed()
+
+    def _fill(self):
+        data = self.sock.recv(65536)
+        if not data:
+            raise SocketClosed(1006)
+        self._buffer += data
+
+    def _read(self, size):
+        while len(self._buffer) < size:
+            self._fill()
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _send_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+        mask = os.urandom(4)
+        self.sock.sendall(header + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload)))
+
+    def _read_frame(self):
+        first, second = self._read(2)
+        length = second & 0x7F
+        if length == 126:
+            length, = struct.unpack('!H', self._read(2))
+        elif length == 127:
+            length, = struct.unpack('!Q', self._read(8))
+        mask = self._read(4) if second & 0x80 else None
+        payload = self._read(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return first & 0x80, first & 0x0F, payload
+
+    def send_json(self, data):
+        self._send_frame(0x1, json.dumps(data).encode())
+
+    def receive_json(self):
+        message = b''
+        while True:
+            fin, opcode, payload = self._read_frame()
+            if opcode == 0x8:
+                code = struct.unpack('!H', payload[:2])[0] if len(payload) >= 2 else 1005
+                self.close()
+                raise SocketClosed(code)
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+            elif opcode in (0x0, 0x1):
+                message += payload
+                if fin:
+                    return json.loads(message)
+
+    def poll_json(self):
+        """The next message if one has already arrived, else None."""
+        pending = getattr(self.sock, 'pending', lambda: 0)()
+        if not self._buffer and not pending and not select.select([self.sock], [], [], 0)[0]:
+            return None
+        return self.receive_json()
+
+    def close(self):
+        try:
+            self._send_frame(0x8, struct.pack('!H', 1000))
+        except OSError:
+            pass
+        self.sock.close()
+
+
+_socket_loop = None
+_socket_loop_lock = threading.Lock()
+
+
+def _on_socket_loop(coro):
+    # Every in-process socket, and so the channel layer's queues, lives on one event loop thread.
+    global _socket_loop
+    with _socket_loop_lock:
+        if _socket_loop is None:
+            _socket_loop = asyncio.new_event_loop()
+            threading.Thread(target=_socket_loop.run_forever, daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _socket_loop).result()
+
+
+class InProcessSocket:
+    def __init__(self, path, timeout=10):
+        from channels.testing import WebsocketCommunicator
+        from project.asgi import application
+        self.timeout = timeout
+        self.communicator = WebsocketCommunicator(application, path, headers=[(b'origin', b'http://testserver')])
+        connected, code = _on_socket_loop(self.communicator.connect(timeout))
+        if not connected:
+            raise SocketClosed(code)
+
+    async def _receive(self, wait):
+        # receive_output() cancels the consumer when it times out; look before waiting.
+        if not wait and await self.communicator.receive_nothing(0):
+            return None
+        output = await self.communicator.receive_output(self.timeout)
+        if output['type'] == 'websocket.close':
+            raise SocketClosed(output.get('code', 1000))
+        return json.loads(output['text'])
+
+    def send_json(self, data):
+        _on_socket_loop(self.communicator.send_json_to(data))
+
+    def receive_json(self):
+        return _on_socket_loop(self._receive(True))
+
+    def poll_json(self):
+        return _on_socket_loop(self._receive(False))
+
+    def close(self):
+        _on_socket_loop(self.communicator.disconnect())
+
+
+class InProcessClient:
+    def __init__(self):
+        from django.test import Client
+        self.client = Client(raise_request_exception=False)
+
+    @staticmethod
+    def _wrap(response):
+        return Response(response.status_code, response.get('Content-Type'), response.get('Location'), response.content,
+                        response.get('Retry-After'))
+
+    def get(self, path, headers=None):
+        return self._wrap(self.client.get(path, headers=headers))
+
+    def post(self, path, form=None, payload=None, headers=None):
+        if payload is not None:
+            return self._wrap(self.client.post(path, data=json.dumps(payload), content_type='application/json',
+                                               headers=headers))
+        return self._wrap(self.client.post(path, data=form or {}, headers=headers))
+
+    def websocket(self, path, base_url=None):
+        # One process has no other shard to be sent to.
+        return InProcessSocket(path)
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.db_writes = []
+        self.db_lock_errors = 0
+        self.games_finished = 0
+
+    def record(self, endpoint, status, seconds):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def db_probe(self, execute, sql, params, many, context):
+        # SQLite's busy handler blocks inside the statement that wants the
+        # lock, so the time spent in write statements bounds the lock waits.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as exc:
+            if 'locked' in str(exc):
+                with self._lock:
+                    self.db_lock_errors += 1
+            raise
+        finally:
+            if sql.lstrip().upper().startswith(WRITE_PREFIXES):
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.db_writes.append(elapsed)
+
+    def report(self):
+        endpoints = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            statuses = self.statuses[endpoint]
+            errors = sum(count for status, count in statuses.items() if status >= 400)
+            row = summarize(samples)
+            row['errors'] = errors
+            row['error_rate'] = errors / row['count'] if row['count'] else 0.0
+            row['statuses'] = {str(status): count for status, count in sorted(statuses.items())}
+            endpoints[endpoint] = row
+        return {
+            'games_finished': self.games_finished,
+            'endpoints': endpoints,
+            'db': {'write_statements': summarize(self.db_writes), 'lock_errors': self.db_lock_errors},
+        }
+
+
+class SimPlayer:
+    def __init__(self, table, name, client):
+        self.table = table
+        self.name = name
+        self.client = client
+        self.lock = threading.Lock()
+        self.done = False
+        self.headers = {}
+        self.retry_after = 0.0
+        self.poll_interval = POLL_INTERVAL
+        self.ping_interval = PING_INTERVAL
+        self.socket = None
+        self.redirect_to = None
+
+    def call(self, method, endpoint, path, **kwargs):
+        started = time.perf_counter()
+        response = getattr(self.client, method)(path, headers=self.headers, **kwargs)
+        self.table.runner.stats.record(endpoint, response.status, time.perf_counter() - started)
+        return response
+
+    def load_page(self):
+        response = self.call('get', 'play_game', f'/play_game/{self.table.game_id}/')
+        match = PLAYER_TOKEN_RE.search(response.body.decode(errors='replace')) if response.status == 200 else None
+        if match:
+            self.headers = {'X-Player-Token': match.group(1)}
+
+    def open_socket(self, base_url=None):
+        # game.js signs the socket in with the page's token: a redirected socket has no session cookie.
+        query = urllib.parse.urlencode({'game_id': self.table.game_id, 'token': self.headers.get('X-Player-Token', '')})
+        self.redirect_to = None
+        started = time.perf_counter()
+        try:
+            self.socket = self.client.websocket(f'/ws/game/{self.table.room_code}/?{query}', base_url)
+        except (SocketClosed, OSError) as exc:
+            self.socket = None
+            self.table.runner.stats.record('ws_connect', getattr(exc, 'code', None) or 1006, time.perf_counter() - started)
+            return
+        self.table.runner.stats.record('ws_connect', 101, time.perf_counter() - started)
+
+    def close_socket(self):
+        conn, self.socket = self.socket, None
+        if conn is not None:
+            try:
+                conn.close()
+            except (SocketClosed, OSError):
+                pass
+
+    def _socket_closed(self, endpoint, code, started):
+        self.socket = None
+        if code == SHARD_REDIRECT_CODE and self.redirect_to:
+            self.open_socket(self.redirect_to)
+            return True
+        self.table.runner.stats.record(endpoint, code or 1006, time.perf_counter() - started)
+        return False
+
+    def drain_socket(self):
+        # Other seats' moves; the page only takes them as a cue to re-fetch.
+        started = time.perf_counter()
+        while self.socket is not None:
+            try:
+                message = self.socket.poll_json()
+            except (SocketClosed, OSError) as exc:
+                self._socket_closed('ws_receive', getattr(exc, 'code', None), started)
+                continue
+            if message is None:
+                return
+            if message['type'] == 'shard_redirect':
+                self.redirect_to = message['base_url']
+
+    def socket_move(self, endpoint, payload, move_count):
+        """Send a move over the game socket and wait for its broadcast; False when the socket is gone."""
+        for _ in range(2):
+            # A socket that landed on the wrong shard only says so once it has been read.
+            self.drain_socket()
+            if self.socket is None:
+                return False
+            started = time.perf_counter()
+            try:
+                self.socket.send_json(payload)
+                while True:
+                    message = self.socket.receive_json()
+                    if message['type'] == 'shard_redirect':
+                        self.redirect_to = message['base_url']
+                    elif message['type'] == 'error':
+                        status = 400
+                        break
+                    elif message['type'] == 'game_state_update' and message['game_data']['move_count'] > move_count:
+                        status = 200
+                        break
+            except (SocketClosed, OSError) as exc:
+                if self._socket_closed(endpoint, getattr(exc, 'code', None), started):
+                    continue
+                return False
+            self.table.runner.stats.record(endpoint, status, time.perf_counter() - started)
+            return True
+        return False
+
+    def ping(self):
+        if self.done:
+            return
+        response = self.call('post', 'player_ping', f'/player_ping/{self.table.game_id}/', payload={})
+        if response.status == 403:
+            self.finish()
+            return
+        if response.data and 'next_ping_ms' in response.data:
+            self.ping_interval = response.data['next_ping_ms'] / 1000
+        self.table.runner.schedule(max(self.ping_interval, response.retry_after), self, self.ping)
+
+    def poll(self):
+        if self.done:
+            return
+        state = self.fetch_state()
+        if state is THROTTLED:
+            self.table.runner.schedule(max(self.poll_interval, self.retry_after), self, self.poll)
+            return
+        if state is None or state.get('game_over'):
+            self.finish()
+            return
+        self.drain_socket()
+        if state['your_player_num'] == state['current_player_turn'] and state['disconnected_player'] is None:
+            if state['valid_moves']:
+                card_num = self.table.rng.choice(state['valid_moves'])
+                if not self.socket_move('ws_play_card', {'type': 'play_card', 'card_num': card_num}, state['move_count']):
+                    self.call('post', 'play_card', f'/play_card/{self.table.game_id}/', payload={'card_num': card_num})
+            elif not self.socket_move('ws_pass_turn', {'type': 'pass_turn'}, state['move_count']):
+                self.call('post', 'pass_turn', f'/pass_turn/{self.table.game_id}/')
+            # The page re-fetches right after acting.
+            state = self.fetch_state()
+            if state is not THROTTLED and (state is None or state.get('game_over')):
+                self.finish()
+                return
+        self.table.runner.schedule(self.poll_interval, self, self.poll)
+
+    def fetch_state(self):
+        response = self.call('get', 'get_game_state', f'/get_game_state/{self.table.game_id}/')
+        if response.status == 429:
+            self.retry_after = response.retry_after
+            return THROTTLED
+        if response.status != 200:
+            return None
+        self.poll_interval = response.data.get('next_poll_ms', POLL_INTERVAL * 1000) / 1000
+        return response.data
+
+    def finish(self):
+        if not self.done:
+            self.done = True
+            self.close_socket()
+            self.table.player_finished()
+
+
+class SimTable:
+    def __init__(self, runner, index, num_players, client_factory):
+        self.runner = runner
+        self.index = index
+        self.num_players = num_players
+        self.rng = random.Random(runner.seed * 1000003 + index)
+        self.players = [SimPlayer(self, f'T{index}P{seat}', client_factory()) for seat in range(1, num_players + 1)]
+        self.game_id = None
+        self.room_code = None
+        self.finished_players = 0
+        self._lock = threading.Lock()
+
+    def setup(self):
+        host = self.players[0]
+        with host.lock:
+            for player in self.players:
+                player.call('get', 'index', '/')
+            form = {'player_name': host.name, 'num_players': self.num_players}
+            if self.runner.auto_pass:
+                form['auto_pass'] = 'on'
+            response = host.call('post', 'create_room', '/create_room/', form=form)
+            if response.status != 302 or not response.location:
+                return
+            room_code = self.room_code = response.location.rstrip('/').rsplit('/', 1)[-1]
+            for player in self.players[1:]:
+                player.call('post', 'join_room', '/join_room/', form={'room_code': room_code, 'player_name': player.name})
+                player.call('get', 'check_room_status', f'/check_room_status/{room_code}/')
+            status = host.call('get', 'check_room_status', f'/check_room_status/{room_code}/')
+            if not status.data or 'game_id' not in status.data:
+                return
+            self.game_id = status.data['game_id']
+            started = host.call('post', 'start_game', f'/start_game/{self.game_id}/')
+            if started.status != 200:
+                return
+        for player in self.players:
+            player.load_page()
+            if self.runner.websocket:
+                player.open_socket()
+            self.runner.schedule(0, player, player.poll)
+            self.runner.schedule(PING_INTERVAL, player, player.ping)
+
+    def player_finished(self):
+        with self._lock:
+            self.finished_players += 1
+            if self.finished_players == self.num_players:
+                self.runner.stats.games_finished += 1
+
+
+class LoadTest:
+    """
+    Drive ``tables`` simulated games to completion.
+
+    ``time_scale`` stretches the client cadence: 1.0 is real time, 0 runs the
+    same event order as fast as the server answers (used in CI). ``websocket``
+    sends the moves over the game socket instead of play_card / pass_turn.
+    """
+
+    def __init__(self, client_factory, tables, players, time_scale=1.0, concurrency=1, seed=0, max_seconds=None,
+                 auto_pass=False, websocket=False):
+        self.client_factory = client_factory
+        self.num_tables = tables
+        self.num_players = players
+        self.time_scale = time_scale
+        self.concurrency = max(1, concurrency)
+        self.seed = seed
+        self.max_seconds = max_seconds
+        self.auto_pass = auto_pass
+        self.websocket = websocket
+        self.stats = Stats()
+        self._heap = []
+        self._seq = 0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._clock = 0.0
+        self._stopped = False
+
+    def schedule(self, delay, player, action):
+        with self._cond:
+            if self._stopped:
+                return
+            self._seq += 1
+            heapq.heappush(self._heap, (self._clock + delay, self._seq, player, action))
+            self._cond.notify()
+
+    def _next_event(self):
+        with self._cond:
+            while not self._heap:
+                if self._in_flight == 0 or self._stopped:
+                    self._cond.notify_all()
+                    return None
+                self._cond.wait()
+            event = heapq.heappop(self._heap)
+            self._in_flight += 1
+            return event
+
+    def _worker(self, started):
+        with connection.execute_wrapper(self.stats.db_probe):
+            while True:
+                event = self._next_event()
+                if event is None:
+                    return
+                due, _, player, action = event
+                try:
+                    delay = started + due * self.time_scale - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    if self.max_seconds and time.perf_counter() - started > self.max_seconds:
+                        with self._cond:
+                            self._stopped = True
+                            self._heap.clear()
+                        continue
+                    with self._cond:
+                        self._clock = max(self._clock, due)
+                    if player is None:
+                        action()
+                    else:
+                        with player.lock:
+                            action()
+                finally:
+                    with self._cond:
+                        self._in_flight -= 1
+                        self._cond.notify_all()
+
+    def run(self):
+        tables = [SimTable(self, index, self.num_players, self.client_factory) for index in range(self.num_tables)]
+        for table in tables:
+            self.schedule(0, None, table.setup)
+        # The throttle and the cadence load factor count wall-clock seconds;
+        # in-process runs at another time scale would trip them with a rate
+        # no real client has.
+        compressed = self.client_factory is InProcessClient and self.time_scale != 1
+        started = time.perf_counter()
+        overrides = override_settings(REQUEST_THROTTLE=False, CADENCE_MAX_BACKOFF=1.0)
+        with overrides if compressed else nullcontext():
+            if self.concurrency == 1:
+                # Stay on the caller's thread (and database connection); the
+                # in-process mode and the test suite depend on it.
+                self._worker(started)
+            else:
+                workers = [threading.Thread(target=self._worker, args=(started,), daemon=True)
+                           for _ in range(self.concurrency)]
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+        # Left open when max_seconds stopped the run early.
+        for table in tables:
+            for player in table.players:
+                player.close_socket()
+        report = self.stats.report()
+        report.update({
+            'tables': self.num_tables,
+            'players_per_table': self.num_players,
+            'time_scale': self.time_scale,
+            'wall_seconds': time.perf_counter() - started,
+            'simulated_seconds': self._clock,
+        })
+        return report
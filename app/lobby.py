@@ -0,0 +1,69 @@
+# badam_satti_app/lobby.py
+"""
+Public room discovery.
+
+Rooms created as public carry ``is_public`` and a ``seats_taken`` count that
+join and remove keep up to date, so listing open tables is one range scan of
+a partial index over unstarted public rooms in age order; ``players_data`` is
+never read. Each change to a public room is pushed to the ``lobby`` channel
+group as a one-room delta, so a page watching ``ws/lobby/`` applies deltas
+instead of polling. ``GET /lobby/`` carries an ETag and answers a poller that
+already has the current list with an empty 304.
+"""
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db.models import F
+
+from . import clock
+from .log import log_game
+from .models import ROOM_TTL_SECONDS, Game
+
+logger = logging.getLogger(__name__)
+
+LOBBY_GROUP = 'lobby'
+MAX_ROOMS = 50
+
+
+def is_open(game):
+    return (game.is_public and not game.is_game_started and game.seats_taken < game.num_players
+            and not game.room_expired())
+
+
+def entry(game):
+    """The lobby row for ``game``, or None for a private room (nothing to publish)."""
+    if not game.is_public:
+        return None
+    return {
+        'room_code': game.room_code,
+        'num_players': game.num_players,
+        'seats_taken': game.seats_taken,
+        'created_at': game.created_at.isoformat(),
+        'open': is_open(game),
+    }
+
+
+def open_rooms(num_players=None, min_free_seats=1, limit=MAX_ROOMS):
+    """Open public rooms, oldest first. Served by the game_open_public index."""
+    rooms = Game.objects.filter(
+        is_public=True, is_game_started=False,
+        created_at__gte=clock.now() - timedelta(seconds=ROOM_TTL_SECONDS),
+        seats_taken__lte=F('num_players') - min_free_seats,
+    )
+    if num_players:
+        rooms = rooms.filter(num_players=num_players)
+    rows = rooms.order_by('created_at').values('room_code', 'num_players', 'seats_taken', 'created_at')[:limit]
+    return [dict(row, created_at=row['created_at'].isoformat(), open=True) for row in rows]
+
+
+def publish(room):
+    """Push one room's lobby row to everyone watching. Best effort; the list endpoint is the source of truth."""
+    if room is None:
+        return
+    try:
+        async_to_sync(get_channel_layer().group_send)(LOBBY_GROUP, {'type': 'lobby_update', 'room': room})
+    except Exception:
+        log_game(logger, logging.WARNING, "Could not publish lobby update.", room_code=room['room_code'],
+                 exc_info=True)
@@ -0,0 +1,89 @@
+# badam_satti_app/log.py
+"""
+Structured, non-blocking logging for the game code.
+
+Records carry ``game_id``, ``room_code`` and ``player_num`` fields and are
+handed to a queue; a background listener thread does the formatting and the
+write, so request threads and the ASGI event loop never block on stderr.
+``log_game`` checks the level before building anything, so a disabled debug
+line costs one method call.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+GAME_FIELDS = ('game_id', 'room_code', 'player_num')
+
+
+def log_game(logger, level, msg, *args, game=None, game_id=None, room_code=None, player_num=None, exc_info=False):
+    if not logger.isEnabledFor(level):
+        return
+    if game is not None:
+        game_id = game_id or game.game_id
+        room_code = room_code or game.room_code
+    extra = {
+        'game_id': str(game_id) if game_id else None,
+        'room_code': room_code,
+        'player_num': player_num,
+    }
+    logger.log(level, msg, *args, extra=extra, exc_info=exc_info, stacklevel=2)
+
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in GAME_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueueWriterHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records for a background writer thread.
+
+    The stock QueueHandler formats the message in the calling thread; here
+    only tracebacks are rendered eagerly (frames do not survive the hop) and
+    ``msg % args`` is left to the writer.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        target = logging.StreamHandler(stream or sys.stderr)
+        target.setFormatter(StructuredFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=True)
+        self.listener.start()
+        self._listening = True
+        atexit.register(self._stop_listener)
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = StructuredFormatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def _stop_listener(self):
+        # Drains whatever is still queued before returning.
+        if self._listening:
+            self._listening = False
+            self.listener.stop()
+
+    def close(self):
+        self._stop_listener()
+        super().close()
@@ -0,0 +1,137 @@
+import json
+import platform
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app import dealing
+from app.bench import best_of, find_regressions, write_results
+from app.models import Game
+
+
+def build_mid_game(num_players, seed):
+    """
+    An unsaved Game part-way through play: dealt from a seeded deck and
+    advanced by always playing the lowest valid card until about half the
+    deck is on the desk.
+    """
+    dealt = dealing.deal(num_players, seed)
+    hands = dealt.hands
+    now = timezone.now().isoformat()
+    players = [{'player_num': n, 'name': f'P{n}', 'hand': hands[n], 'last_ping_time': now}
+               for n in range(1, num_players + 1)]
+    game = Game(num_players=num_players, players_data=json.dumps(players), current_player=dealt.first_player,
+                is_game_started=True, desk_cards=json.dumps({'H': [], 'D': [], 'C': [], 'S': []}))
+    # Rules-engine numbers only; database cost is what loadtest measures. With
+    # the move log on, every timed move would queue another GameMove and the
+    # cost would grow with the number of iterations run.
+    game.save = lambda *args, **kwargs: None
+    game.records_moves = False
+
+    played = 0
+    while played < len(dealing.DECK) // 2:
+        moves = game.get_valid_moves_for_player(game.current_player)
+        if moves:
+            game.update_game_state_after_move(min(moves), game.current_player)
+            played += 1
+        else:
+            game.pass_turn(game.current_player)
+    return game
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmarks for the per-request rules engine and players_data serialisation, "
+        "on seeded mid-game states for 2-8 players."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, nargs='+', default=list(range(2, 9)))
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--rounds', type=int, default=7)
+        parser.add_argument('--inner', type=int, default=2000)
+        parser.add_argument('--output', help="Write the results as JSON to this path.")
+        parser.add_argument('--compare', help="A previous --output file to compare against.")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Fail when a best round (min_us) is slower than the baseline by more than this fraction.")
+
+    def handle(self, *args, **options):
+        results = {}
+        for num_players in options['players']:
+            game = build_mid_game(num_players, options['seed'] + num_players)
+            for name, fn in self._cases(game, num_players, options['seed']):
+                samples = best_of(fn, options['inner'], options['rounds'])
+                results[f'{name}[{num_players}p]'] = {
+                    'median_us': statistics.median(samples) * 1e6,
+                    'min_us': min(samples) * 1e6,
+                    'rounds': options['rounds'],
+                    'inner': options['inner'],
+                }
+
+        for name, row in results.items():
+            self.stdout.write(f"{name:<36}{row['median_us']:>10.2f}us  (min {row['min_us']:.2f}us)")
+
+        if options['output']:
+            write_results(options['output'], {
+                'benchmark': 'engine',
+                'python': platform.python_version(),
+                'seed': options['seed'],
+                'results': results,
+            })
+
+        if options['compare']:
+            with open(options['compare']) as fh:
+                baseline = json.load(fh)['results']
+            regressions = find_regressions(results, baseline, options['threshold'])
+            for name, before, after, change in regressions:
+                self.stderr.write(f"REGRESSION {name}: {before:.2f}us -> {after:.2f}us (+{change:.0%})")
+            if regressions:
+                raise CommandError(f"{len(regressions)} benchmark(s) slower than the baseline by more than "
+                                   f"{options['threshold']:.0%}.")
+
+    def _cases(self, game, num_players, seed):
+        players_json = game.players_data
+        desk_json = game.desk_cards
+        current = game.current_player
+        players = json.loads(players_json)
+        hand = next(p['hand'] for p in players if p['player_num'] == current)
+        desk = json.loads(desk_json)
+
+        moves = game._get_valid_moves(hand, desk)
+        # Someone always has a move in Sevens; benchmark the first seat that does.
+        mover = current
+        while not moves:
+            mover = mover % num_players + 1
+            hand = next(p['hand'] for p in players if p['player_num'] == mover)
+            moves = game._get_valid_moves(hand, desk)
+        card = moves[0]
+
+        def play_move():
+            game.players_data = players_json
+            game.desk_cards = desk_json
+            game.current_player = mover
+            game.game_over = False
+            game.update_game_state_after_move(card, mover)
+
+        def inactivity_check():
+            game.disconnected_player = None
+            game.check_for_player_inactivity(ping_timeout_seconds=20)
+
+        fresh = [dict(p, last_ping_time=timezone.now().isoformat()) for p in players]
+        fresh_json = json.dumps(fresh)
+
+        def prepare_inactivity():
+            game.players_data = fresh_json
+            game.game_over = False
+            return inactivity_check
+
+        return [
+            ('valid_moves', lambda: game._get_valid_moves(hand, desk)),
+            ('update_game_state_after_move', play_move),
+            ('check_for_player_inactivity', prepare_inactivity()),
+            ('deal', lambda: dealing.deal(num_players, seed)),
+            ('deal_many_x100', lambda: dealing.deal_many(num_players, seeds=range(seed, seed + 100))),
+            ('players_data_loads', lambda: json.loads(players_json)),
+            ('players_data_dumps', lambda: json.dumps(players)),
+        ]
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand, CommandError
+
+from app.bench import summarize, write_results
+from app.channel_layers import BatchingInMemoryChannelLayer, RespChannelLayer
+from app.models import CARDS_MAP
+from app.resp_standin import start_in_thread
+
+GROUP = 'game_BENCH1'
+
+
+class UnbatchedRespChannelLayer(RespChannelLayer):
+    """One send() per member, the shape of a naive group fan-out. Baseline only."""
+
+    async def group_send(self, group, message):
+        _, members = await self._pipeline([
+            ('ZREMRANGEBYSCORE', self._group_key(group), 0, time.time() - self.group_expiry),
+            ('ZRANGE', self._group_key(group), 0, -1),
+        ])
+        for member in members:
+            await self.send(member.decode(), message)
+
+
+BACKENDS = {
+    'memory-stock': lambda url, capacity: InMemoryChannelLayer(capacity=capacity),
+    'memory': lambda url, capacity: BatchingInMemoryChannelLayer(capacity=capacity),
+    'resp-unbatched': lambda url, capacity: UnbatchedRespChannelLayer(url=url, capacity=capacity),
+    'resp': lambda url, capacity: RespChannelLayer(url=url, capacity=capacity),
+}
+
+
+def game_state_payload(seats):
+    # Roughly what send_game_state_to_group broadcasts mid-game.
+    cards = list(CARDS_MAP.items())
+    desk = {suit: [[num, name] for num, name in cards if name[-1] == suit][3:10] for suit in 'HDCS'}
+    return {
+        'game_id': '00000000-0000-0000-0000-000000000000',
+        'room_code': 'BENCH1',
+        'num_players': seats,
+        'players': [{'player_num': n, 'name': f'Player {n}', 'hand_size': 5} for n in range(1, seats + 1)],
+        'current_player_turn': 1,
+        'desk_cards': desk,
+        'is_game_started': True,
+        'game_over': False,
+        'winner_player_num': None,
+        'disconnected_player': None,
+        'reconnect_timer_start': None,
+        'is_halted': False,
+        'reconnect_time_left': 0,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure channel-layer group fan-out (deliveries/s and delivery latency) for 2-8 seat tables "
+        "plus spectators. RESP backends run against an in-process stand-in unless --url is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+        parser.add_argument('--seats', type=int, nargs='+', default=[2, 4, 6, 8])
+        parser.add_argument('--spectators', type=int, nargs='+', default=[0, 16])
+        parser.add_argument('--messages', type=int, default=300, help="group_send calls per case.")
+        parser.add_argument('--url', help="RESP server to use instead of a local stand-in, e.g. redis://127.0.0.1:6379/0")
+        parser.add_argument('--output', help="Write the results as JSON to this path.")
+
+    def handle(self, *args, **options):
+        url, stop = options['url'], None
+        if url is None and any(name.startswith('resp') for name in options['backends']):
+            port, stop = start_in_thread()
+            url = f'redis://127.0.0.1:{port}/0'
+
+        results = []
+        try:
+            for backend in options['backends']:
+                for seats in options['seats']:
+                    for spectators in options['spectators']:
+                        row = asyncio.run(self._run_case(backend, url, seats, spectators, options['messages']))
+                        results.append(row)
+                        self.stdout.write(
+                            f"{backend:>15} seats={seats} spectators={spectators:<3} "
+                            f"{row['deliveries_per_second']:9.0f} deliveries/s  {row['sends_per_second']:7.0f} sends/s  "
+                            f"latency p50={row['latency']['p50_us'] / 1000:6.2f}ms p99={row['latency']['p99_us'] / 1000:6.2f}ms"
+                        )
+        finally:
+            if stop is not None:
+                stop()
+
+        if options['output']:
+            write_results(options['output'], {'benchmark': 'group_fanout', 'messages': options['messages'],
+                                              'results': results})
+
+    async def _run_case(self, backend, url, seats, spectators, messages):
+        members = seats + spectators
+        layer = BACKENDS[backend](url, messages + 1)
+        if hasattr(layer, 'flush'):
+            await layer.flush()
+        channels = [await layer.new_channel() for _ in range(members)]
+        for channel in channels:
+            await layer.group_add(GROUP, channel)
+
+        latencies = []
+
+        async def receive_all(channel):
+            for _ in range(messages):
+                message = await layer.receive(channel)
+                latencies.append(time.perf_counter() - message['sent'])
+
+        receivers = [asyncio.ensure_future(receive_all(channel)) for channel in channels]
+        payload = game_state_payload(seats)
+        started = time.perf_counter()
+        for _ in range(messages):
+            await layer.group_send(GROUP, {'type': 'game_state_update', 'game_data': payload,
+                                           'sent': time.perf_counter()})
+            await asyncio.sleep(0)
+        sent = time.perf_counter() - started
+        try:
+            await asyncio.wait_for(asyncio.gather(*receivers), timeout=60)
+        except asyncio.TimeoutError:
+            raise CommandError(f"{backend}: only {len(latencies)} of {members * messages} messages arrived")
+        elapsed = time.perf_counter() - started
+
+        await layer.flush()
+        await layer.close()
+        return {
+            'backend': backend,
+            'seats': seats,
+            'spectators': spectators,
+            'messages': messages,
+            'deliveries_per_second': members * messages / elapsed,
+            'sends_per_second': messages / sent,
+            'latency': summarize(latencies),
+        }
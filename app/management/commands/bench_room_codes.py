@@ -0,0 +1,60 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from app.bench import scratch_database, summarize, write_results
+from app.models import Game
+from app.room_codes import RoomCodeAllocator
+
+
+def legacy_create(**fields):
+    # The old create_room loop: probe for a free code, then insert.
+    while True:
+        room_code = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=6))
+        if not Game.objects.filter(room_code=room_code).exists():
+            break
+    return Game.objects.create(room_code=room_code, **fields)
+
+
+class Command(BaseCommand):
+    help = "Compare room creation cost of the old probe loop and the room-code allocator at several table sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fill', type=int, nargs='+', default=[0, 10000, 100000],
+                            help="Number of existing games to pre-load before each measurement.")
+        parser.add_argument('--rooms', type=int, default=500, help="Rooms created per strategy and fill level.")
+        parser.add_argument('--output', help="Write the results as JSON to this path.")
+
+    def handle(self, *args, **options):
+        results = []
+        with scratch_database():
+            for fill in sorted(options['fill']):
+                self._prefill(fill)
+                for name, create in (('legacy_probe', legacy_create), ('allocator', RoomCodeAllocator().create_game)):
+                    samples = []
+                    with CaptureQueriesContext(connection) as queries:
+                        for _ in range(options['rooms']):
+                            started = time.perf_counter()
+                            create(num_players=4)
+                            samples.append(time.perf_counter() - started)
+                    row = {'strategy': name, 'fill': fill, 'queries_per_room': len(queries) / options['rooms']}
+                    row.update(summarize(samples))
+                    results.append(row)
+                    self.stdout.write(
+                        f"{name:>13} fill={fill:<7} p50={row['p50_us']:8.1f}us p99={row['p99_us']:8.1f}us "
+                        f"queries/room={row['queries_per_room']:.2f}"
+                    )
+
+        if options['output']:
+            write_results(options['output'], {'benchmark': 'room_codes', 'results': results})
+
+    def _prefill(self, target):
+        missing = target - Game.objects.count()
+        if missing <= 0:
+            return
+        allocator = RoomCodeAllocator()
+        batch = [Game(room_code=code, num_players=4) for code in allocator.next_codes(missing)]
+        Game.objects.bulk_create(batch, batch_size=2000, ignore_conflicts=True)
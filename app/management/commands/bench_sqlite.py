@@ -0,0 +1,132 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from app.bench import summarize, write_results
+from app.models import Game
+
+PROFILES = {
+    'default': {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'serialized_writes': False},
+    'production': {
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ('PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL;'
+                             'PRAGMA mmap_size=268435456;PRAGMA temp_store=MEMORY;'),
+        },
+        'CONN_MAX_AGE': 600,
+        'serialized_writes': True,
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure game-request throughput on a scratch SQLite file with the default and the "
+        "production database profile (WAL, busy timeout, persistent connections, single writer)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent request threads.")
+        parser.add_argument('--seconds', type=float, default=5.0, help="Duration of each run.")
+        parser.add_argument('--games', type=int, default=50)
+        parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+        parser.add_argument('--output', help="Write the results as JSON to this path.")
+
+    def handle(self, *args, **options):
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in options['profiles']:
+                alias = f'bench_{name}'
+                self._add_database(alias, os.path.join(tmp, f'{name}.sqlite3'), PROFILES[name])
+                call_command('migrate', database=alias, verbosity=0)
+                game_ids = self._seed(alias, options['games'])
+                with override_settings(SQLITE_SERIALIZED_WRITES=PROFILES[name]['serialized_writes']):
+                    results[name] = self._run(alias, game_ids, options['threads'], options['seconds'])
+                connections[alias].close()
+                row = results[name]
+                self.stdout.write(
+                    f"{name:>10}: {row['ops_per_second']:8.0f} ops/s  writes p99={row['writes']['p99_us'] / 1000:7.2f}ms  "
+                    f"reads p99={row['reads']['p99_us'] / 1000:7.2f}ms  lock errors={row['lock_errors']}"
+                )
+
+        if options['output']:
+            write_results(options['output'], {'benchmark': 'sqlite_profiles', 'threads': options['threads'],
+                                              'results': results})
+
+    def _add_database(self, alias, path, profile):
+        config = dict(settings.DATABASES['default'], NAME=path, OPTIONS=profile['OPTIONS'],
+                      CONN_MAX_AGE=profile['CONN_MAX_AGE'])
+        # configure_settings() fills in the per-database defaults; it insists on a 'default' entry.
+        connections.settings[alias] = connections.configure_settings({'default': dict(config), alias: config})[alias]
+
+    def _seed(self, alias, count):
+        now = timezone.now().isoformat()
+        games = [
+            Game(room_code=f'B{i:05d}', num_players=4, is_game_started=True,
+                 players_data=json.dumps([{'player_num': n, 'name': f'P{n}', 'hand': [], 'last_ping_time': now}
+                                          for n in range(1, 5)]))
+            for i in range(count)
+        ]
+        Game.objects.using(alias).bulk_create(games)
+        return [game.game_id for game in games]
+
+    def _run(self, alias, game_ids, threads, seconds):
+        reads, writes = [], []
+        counters = {'lock_errors': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local_reads, local_writes, errors = [], [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        game = Game.objects.using(alias).get(game_id=rng.choice(game_ids))
+                        # Roughly the request mix of the page: a ping every second
+                        # (a write) against a state poll every 2.5 seconds (a read).
+                        if rng.random() < 0.7:
+                            player_num = rng.randint(1, 4)
+                            players = json.loads(game.players_data)
+                            players[player_num - 1]['last_ping_time'] = timezone.now().isoformat()
+                            game.players_data = json.dumps(players)
+                            game.save(using=alias)
+                            local_writes.append(time.perf_counter() - started)
+                        else:
+                            local_reads.append(time.perf_counter() - started)
+                    except OperationalError as exc:
+                        if 'locked' not in str(exc):
+                            raise
+                        errors += 1
+            finally:
+                connections[alias].close()
+            with lock:
+                reads.extend(local_reads)
+                writes.extend(local_writes)
+                counters['lock_errors'] += errors
+
+        started = time.perf_counter()
+        pool = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {
+            'ops_per_second': (len(reads) + len(writes)) / elapsed,
+            'reads': summarize(reads),
+            'writes': summarize(writes),
+            'lock_errors': counters['lock_errors'],
+        }
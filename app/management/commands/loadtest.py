@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.bench import scratch_database, write_results
+from app.loadtest import HttpClient, InProcessClient, LoadTest
+
+
+class Command(BaseCommand):
+    help = (
+        "Play N simulated tables through create_room, join_room, start_game and the "
+        "ping/poll/play loop, then report latency percentiles and error rates per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', type=int, default=10)
+        parser.add_argument('--players', type=int, default=4, help="Seats per table (2-8).")
+        parser.add_argument('--url', help="Base URL of a running server. Without it the test runs in-process "
+                                          "against the Django test client and a throwaway database.")
+        parser.add_argument('--time-scale', type=float, default=1.0,
+                            help="Multiplier on the 1 s ping / 2.5 s poll cadence; 0 runs without waiting.")
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Worker threads issuing requests (default: one per table over HTTP, 1 in-process).")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--max-seconds', type=float, default=None, help="Stop scheduling after this wall time.")
+        parser.add_argument('--auto-pass', action='store_true', help="Create the tables with auto-pass on.")
+        parser.add_argument('--websocket', action='store_true',
+                            help="Open each seat's game socket and send the moves over it (follows shard redirects).")
+        parser.add_argument('--output', help="Write the report as JSON to this path.")
+
+    def handle(self, *args, **options):
+        if not 2 <= options['players'] <= 8:
+            raise CommandError("--players must be between 2 and 8.")
+
+        if options['url']:
+            base_url = options['url']
+            client_factory = lambda: HttpClient(base_url)
+            concurrency = options['concurrency'] or options['tables']
+        else:
+            client_factory = InProcessClient
+            # The test client shares this thread's database connection.
+            concurrency = 1
+
+        load_test = LoadTest(
+            client_factory,
+            tables=options['tables'],
+            players=options['players'],
+            time_scale=options['time_scale'],
+            concurrency=concurrency,
+            seed=options['seed'],
+            max_seconds=options['max_seconds'],
+            auto_pass=options['auto_pass'],
+            websocket=options['websocket'],
+        )
+        if options['url']:
+            report = load_test.run()
+        else:
+            with scratch_database():
+                report = load_test.run()
+        report['mode'] = 'http' if options['url'] else 'in-process'
+
+        self._print(report)
+        if options['output']:
+            write_results(options['output'], report)
+
+    def _print(self, report):
+        self.stdout.write(
+            f"{report['games_finished']}/{report['tables']} games finished in {report['wall_seconds']:.1f}s "
+            f"({report['simulated_seconds']:.0f}s simulated, mode={report['mode']})"
+        )
+        self.stdout.write(f"{'endpoint':<18}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for endpoint, row in report['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint:<18}{row['count']:>8}{row['p50_us'] / 1000:>10.2f}{row['p95_us'] / 1000:>10.2f}"
+                f"{row['p99_us'] / 1000:>10.2f}{row['error_rate']:>8.1%}"
+            )
+        db = report['db']
+        if db['write_statements']['count']:
+            self.stdout.write(
+                f"db writes: {db['write_statements']['count']} "
+                f"p99={db['write_statements']['p99_us'] / 1000:.2f}ms lock errors={db['lock_errors']}"
+            )
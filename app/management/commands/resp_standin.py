@@ -0,0 +1,28 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from app.resp_standin import serve
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a small in-memory Redis-protocol server for RespChannelLayer during local development "
+        "(CHANNEL_LAYER_URL=redis://127.0.0.1:6390/0)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=6390)
+
+    def handle(self, *args, **options):
+        async def run():
+            server = await serve(options['host'], options['port'])
+            self.stdout.write(f"RESP stand-in listening on {options['host']}:{options['port']}")
+            async with server:
+                await server.serve_forever()
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import ShardNode
+from app.sharding import HashRing
+
+
+class Command(BaseCommand):
+    help = "Show the shard ring: registered nodes, their heartbeat age and which node owns given rooms."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', nargs='*', default=[], help="Room codes to look up.")
+        parser.add_argument('--leave', metavar='NODE_ID', help="Remove a node from the ring (e.g. after a crash).")
+
+    def handle(self, *args, **options):
+        if options['leave']:
+            deleted, _ = ShardNode.objects.filter(node_id=options['leave']).delete()
+            self.stdout.write(f"Removed {options['leave']}." if deleted else f"No node {options['leave']}.")
+
+        now = timezone.now()
+        nodes = list(ShardNode.objects.order_by('node_id'))
+        if not nodes:
+            self.stdout.write("No shard nodes registered.")
+        for node in nodes:
+            self.stdout.write(f"{node.node_id:<12}{node.base_url:<32}heartbeat {(now - node.heartbeat_at).total_seconds():.0f}s ago")
+
+        ring = HashRing(node.node_id for node in nodes)
+        for room_code in options['room']:
+            self.stdout.write(f"{room_code.upper()} -> {ring.owner(room_code.upper())}")
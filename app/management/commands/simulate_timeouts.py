@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.bench import write_results
+from app.simulator import SCENARIOS, TimeoutSimulator
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive N tables through ping, disconnect, reconnect and timeout timelines in virtual time, "
+        "then report how long each lifecycle path takes and every state transition that went wrong."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', type=int, default=1000)
+        parser.add_argument('--players', type=int, default=0, help="Seats per table (2-8); 0 mixes sizes.")
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help="Only run this scenario (repeatable). Default: all, in equal numbers.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the report as JSON to this path.")
+
+    def handle(self, *args, **options):
+        if options['players'] and not 2 <= options['players'] <= 8:
+            raise CommandError("--players must be between 2 and 8.")
+
+        report = TimeoutSimulator(
+            tables=options['tables'],
+            players=options['players'],
+            seed=options['seed'],
+            scenarios=tuple(options['scenario'] or SCENARIOS),
+        ).run()
+
+        self._print(report)
+        if options['output']:
+            write_results(options['output'], report)
+
+    def _print(self, report):
+        self.stdout.write(
+            f"{report['tables']} tables, {report['events']} events, {report['virtual_seconds']:.0f}s simulated "
+            f"in {report['wall_seconds']:.1f}s"
+        )
+        self.stdout.write(f"{'scenario':<20}{'tables':>8}{'ok':>8}")
+        for scenario, row in report['scenarios'].items():
+            self.stdout.write(f"{scenario:<20}{row['tables']:>8}{row['ok']:>8}")
+        self.stdout.write(f"{'path':<28}{'count':>9}{'p50 us':>10}{'p99 us':>10}{'max us':>10}")
+        for path, row in report['paths'].items():
+            self.stdout.write(
+                f"{path:<28}{row['count']:>9}{row['p50_us']:>10.1f}{row['p99_us']:>10.1f}{row['max_us']:>10.1f}"
+            )
+        for problem, count in report['problems'].items():
+            self.stdout.write(f"{count:>6}  {problem}")
@@ -0,0 +1,214 @@
+# badam_satti_app/matchmaking.py
+"""
+Quick-match: "play now" without sharing a room code.
+
+``enqueue()`` puts a player in the queue for their table size and returns a
+ticket; the page polls ``/play_now/<ticket>/`` until it has a seat. A tick
+thread wakes every ``MATCHMAKING_TICK_SECONDS``, cuts every queue into full
+tables, deals them all with ``dealing.deal_many`` and inserts the whole batch
+-- games and their deal records -- with one ``bulk_create`` each in a single
+transaction. Enqueueing is an append under a lock, so the queue takes
+thousands of players a second; the database sees one write per tick however
+many tables it formed.
+
+Tickets whose page stopped polling for ``MATCHMAKING_TICKET_TTL`` seconds are
+dropped instead of being seated at a table nobody will play. Queues live in
+this process: with sharding, each node matches the players that reach it.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+
+from . import clock, dealing
+from .db_writer import run_write
+from .log import log_game
+from .metrics import json_dumps, registry
+from .models import Game, GameMove
+from .room_codes import MAX_INSERT_ATTEMPTS, allocator
+
+logger = logging.getLogger(__name__)
+
+TABLE_SIZES = range(2, 9)
+WAIT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Ticket:
+    __slots__ = ('ticket_id', 'player_name', 'num_players', 'enqueued_at', 'last_seen', 'seat')
+
+    def __init__(self, player_name, num_players):
+        self.ticket_id = uuid.uuid4().hex
+        self.player_name = player_name
+        self.num_players = num_players
+        self.enqueued_at = self.last_seen = time.monotonic()
+        self.seat = None  # (game_id, room_code, player_num, name) once matched
+
+
+def _seat_names(tickets):
+    # join_room finds returning players by name, so names at one table must differ.
+    names, taken = [], set()
+    for ticket in tickets:
+        name, suffix = ticket.player_name, 2
+        while name.lower() in taken:
+            name = f'{ticket.player_name} ({suffix})'
+            suffix += 1
+        taken.add(name.lower())
+        names.append(name)
+    return names
+
+
+def _insert_batch(games, moves):
+    with transaction.atomic():
+        Game.objects.bulk_create(games)
+        GameMove.objects.bulk_create(moves)
+
+
+class Matchmaker:
+    def __init__(self, tick_seconds=0.1, ticket_ttl=30):
+        self.tick_seconds = tick_seconds
+        self.ticket_ttl = ticket_ttl
+        self._queues = {size: deque() for size in TABLE_SIZES}
+        self._tickets = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._swept_at = time.monotonic()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='matchmaker', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick_seconds)
+            try:
+                self.tick()
+            except Exception:
+                log_game(logger, logging.ERROR, "Matchmaking tick failed.", exc_info=True)
+            finally:
+                close_old_connections()
+
+    # --- queue ---
+    def enqueue(self, player_name, num_players, start=True):
+        if num_players not in self._queues:
+            raise ValueError(f"Tables seat {TABLE_SIZES.start}-{TABLE_SIZES.stop - 1} players.")
+        ticket = Ticket(player_name, num_players)
+        with self._lock:
+            self._tickets[ticket.ticket_id] = ticket
+            self._queues[num_players].append(ticket)
+        if start:
+            self._ensure_started()
+        return ticket
+
+    def poll(self, ticket_id):
+        """The ticket, kept alive for another ``ticket_ttl`` seconds; None if unknown or expired."""
+        ticket = self._tickets.get(ticket_id)
+        if ticket is not None:
+            ticket.last_seen = time.monotonic()
+        return ticket
+
+    def done(self, ticket_id):
+        with self._lock:
+            self._tickets.pop(ticket_id, None)
+
+    def depth(self, num_players):
+        return len(self._queues[num_players])
+
+    # --- tick ---
+    def tick(self):
+        """Seat every full table queued right now. Returns the number of tables formed."""
+        now = time.monotonic()
+        cutoff = now - self.ticket_ttl
+        batches = {}
+        with self._lock:
+            for size, queue in self._queues.items():
+                live = [ticket for ticket in queue if ticket.last_seen >= cutoff]
+                full = len(live) - len(live) % size
+                if full:
+                    batches[size] = [live[i:i + size] for i in range(0, full, size)]
+                queue.clear()
+                queue.extend(live[full:])
+                QUEUE_DEPTH.set(len(queue), num_players=size)
+            if now - self._swept_at >= self.ticket_ttl:
+                self._swept_at = now
+                for ticket_id in [t.ticket_id for t in self._tickets.values() if t.last_seen < cutoff]:
+                    del self._tickets[ticket_id]
+
+        formed = 0
+        for size, tables in batches.items():
+            try:
+                self._seat(size, tables)
+                formed += len(tables)
+            except Exception:
+                log_game(logger, logging.ERROR, "Could not form %s-player tables; requeueing.", size, exc_info=True)
+                with self._lock:
+                    self._queues[size].extendleft(reversed([t for table in tables for t in table]))
+        return formed
+
+    def _seat(self, num_players, tables):
+        started = time.perf_counter()
+        deals = dealing.deal_many(num_players, count=len(tables))
+        empty_desk = json_dumps({'H': [], 'D': [], 'C': [], 'S': []})
+        started_at = clock.now()
+        now = started_at.isoformat()
+
+        games, moves, seats = [], [], []
+        for tickets, dealt in zip(tables, deals):
+            names = _seat_names(tickets)
+            players = [{'player_num': seat, 'name': name, 'hand': dealt.hands[seat], 'last_ping_time': now}
+                       for seat, name in enumerate(names, 1)]
+            game = Game(num_players=num_players, players_data=json_dumps(players), desk_cards=empty_desk,
+                        current_player=dealt.first_player, is_game_started=True, deal_seed=dealt.seed,
+                        seats_taken=num_players, turn_started_at=started_at)
+            game.record_move(GameMove.DEAL)
+            moves.extend(game._take_pending_moves())
+            games.append(game)
+            seats.append(list(zip(tickets, names)))
+
+        for attempt in range(MAX_INSERT_ATTEMPTS):
+            for game, code in zip(games, allocator.next_codes(len(games))):
+                game.room_code = code
+            try:
+                run_write(_insert_batch, games, moves)
+                break
+            except IntegrityError:
+                # Another process took one of the codes; draw a fresh set.
+                if attempt == MAX_INSERT_ATTEMPTS - 1:
+                    raise
+
+        matched_at = time.monotonic()
+        for game, table in zip(games, seats):
+            for player_num, (ticket, name) in enumerate(table, 1):
+                ticket.seat = (str(game.game_id), game.room_code, player_num, name)
+                MATCH_WAIT_SECONDS.observe(matched_at - ticket.enqueued_at, num_players=num_players)
+        TABLES_FORMED.inc(len(games), num_players=num_players)
+        BATCH_SECONDS.observe(time.perf_counter() - started)
+
+
+_matchmaker = None
+_matchmaker_lock = threading.Lock()
+
+
+def matchmaker():
+    global _matchmaker
+    if _matchmaker is None:
+        with _matchmaker_lock:
+            if _matchmaker is None:
+                _matchmaker = Matchmaker(
+                    tick_seconds=getattr(settings, 'MATCHMAKING_TICK_SECONDS', 0.1),
+                    ticket_ttl=getattr(settings, 'MATCHMAKING_TICKET_TTL', 30),
+                )
+    return _matchmaker
+
+
+QUEUE_DEPTH = registry.gauge('badam_matchmaking_queued', 'Players waiting for a quick-match table, by table size.')
+MATCH_WAIT_SECONDS = registry.histogram('badam_matchmaking_wait_seconds', 'Time from joining the queue to a seat.',
+                                        WAIT_BUCKETS)
+TABLES_FORMED = registry.counter('badam_matchmaking_tables_total', 'Quick-match tables formed, by table size.')
+BATCH_SECONDS = registry.histogram('badam_matchmaking_batch_seconds', 'Time to deal and insert one batch of tables.')
@@ -0,0 +1,360 @@
+# badam_satti_app/metrics.py
+"""
+In-process metrics exported in the Prometheus text format on ``/metrics/``,
+to staff users and to scrapers holding ``METRICS_TOKEN``.
+
+Requests are sampled at ``METRICS_SAMPLE_RATE`` (0.1 by default, 0 disables
+the middleware entirely). A sampled request records its latency, the number
+and duration of its database queries, the time spent encoding/decoding game
+JSON and an estimate of how long it waited on the SQLite write lock.
+
+Game writes and most of the game JSON work happen off the request thread: on
+the game actors' threads and, in the production profile, on the db_writer
+thread. Those are sampled at the same rate with ``sampled_work()`` and
+recorded under ``view="game_actor"`` and ``view="db_writer"``.
+"""
+import bisect
+import contextvars
+import hmac
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import OperationalError, connection
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34)
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'BEGIN', 'COMMIT')
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return lines
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(Counter):
+    """A settable value, or one computed by ``callback`` at scrape time."""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, callback=None):
+        super().__init__(name, help_text)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.callback is None:
+            return super().samples()
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [f'{self.name} {_format_value(value)}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._series.get(_label_key(labels))
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_format_labels(key, [("le", _format_value(bound))])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics.setdefault(metric.name, metric)
+        return self._metrics[metric.name]
+
+    def counter(self, name, help_text):
+        return self.register(Counter(name, help_text))
+
+    def gauge(self, name, help_text, callback=None):
+        return self.register(Gauge(name, help_text, callback))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _active_games():
+    from .models import Game
+    return Game.objects.filter(is_game_started=True, game_over=False).count()
+
+
+def _pending_reconnects():
+    from .models import Game
+    return Game.objects.filter(disconnected_player__isnull=False, game_over=False).count()
+
+
+REQUESTS = registry.counter('badam_http_requests_total', 'Sampled HTTP requests by view and status.')
+REQUEST_SECONDS = registry.histogram('badam_http_request_seconds', 'Sampled HTTP request latency by view.')
+DB_QUERIES = registry.histogram('badam_db_queries_per_request',
+                                'Database queries per sampled request, actor batch or db_writer write.', COUNT_BUCKETS)
+DB_SECONDS = registry.histogram('badam_db_seconds',
+                                'Time in database queries per sampled request, actor batch or db_writer write.')
+JSON_SECONDS = registry.histogram('badam_json_seconds',
+                                  'Time encoding/decoding game JSON per sampled request, actor batch or db_writer write.')
+LOCK_WAIT_SECONDS = registry.counter(
+    'badam_sqlite_lock_wait_seconds_total',
+    'Estimated SQLite write-lock wait: time in write statements that hit the lock or exceeded '
+    'METRICS_LOCK_WAIT_THRESHOLD.')
+LOCK_ERRORS = registry.counter('badam_sqlite_locked_total', 'Statements that failed with "database is locked".')
+CONSUMER_SECONDS = registry.histogram('badam_consumer_handler_seconds', 'GameConsumer handler latency.')
+CONSUMER_ERRORS = registry.counter('badam_consumer_handler_errors_total', 'GameConsumer handlers that raised.')
+ACTIVE_GAMES = registry.gauge('badam_active_games', 'Started games that are not over.', _active_games)
+CONNECTED_SOCKETS = registry.gauge('badam_connected_sockets', 'Open GameConsumer WebSockets in this process.')
+PENDING_RECONNECTS = registry.gauge('badam_pending_reconnect_timers', 'Games waiting for a player to reconnect.',
+                                    _pending_reconnects)
+
+
+class RequestSample:
+    __slots__ = ('queries', 'db_seconds', 'json_seconds', 'lock_wait_seconds', 'lock_threshold')
+
+    def __init__(self, lock_threshold):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.json_seconds = 0.0
+        self.lock_wait_seconds = 0.0
+        self.lock_threshold = lock_threshold
+
+    def db_probe(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        locked = False
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as exc:
+            locked = 'locked' in str(exc)
+            if locked:
+                LOCK_ERRORS.inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            if locked or (elapsed > self.lock_threshold and sql.lstrip().upper().startswith(WRITE_PREFIXES)):
+                self.lock_wait_seconds += elapsed
+
+    def record(self, view):
+        DB_QUERIES.observe(self.queries, view=view)
+        DB_SECONDS.observe(self.db_seconds, view=view)
+        JSON_SECONDS.observe(self.json_seconds, view=view)
+        if self.lock_wait_seconds:
+            LOCK_WAIT_SECONDS.inc(self.lock_wait_seconds, view=view)
+
+
+_current_sample = contextvars.ContextVar('badam_metrics_sample', default=None)
+
+
+def json_loads(text):
+    sample = _current_sample.get()
+    if sample is None:
+        return json.loads(text)
+    started = time.perf_counter()
+    try:
+        return json.loads(text)
+    finally:
+        sample.json_seconds += time.perf_counter() - started
+
+
+def json_dumps(value):
+    sample = _current_sample.get()
+    if sample is None:
+        return json.dumps(value)
+    started = time.perf_counter()
+    try:
+        return json.dumps(value)
+    finally:
+        sample.json_seconds += time.perf_counter() - started
+
+
+def sample_rate():
+    return float(getattr(settings, 'METRICS_SAMPLE_RATE', 0.0))
+
+
+def scrape_allowed(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_staff)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = sample_rate()
+        self.lock_threshold = float(getattr(settings, 'METRICS_LOCK_WAIT_THRESHOLD', 0.005))
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        sample = RequestSample(self.lock_threshold)
+        token = _current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(sample.db_probe):
+                response = self.get_response(request)
+        finally:
+            _current_sample.reset(token)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unresolved'
+        REQUESTS.inc(view=view, status=response.status_code)
+        REQUEST_SECONDS.observe(elapsed, view=view)
+        sample.record(view)
+        return response
+
+
+@contextmanager
+def sampled_work(view):
+    """
+    Sample the database and JSON time of the block under ``view``, for work
+    that runs off the request thread. Nested inside a sampled request or
+    block it adds to that sample instead. A block that did neither (its write
+    was handed to the db_writer thread, which samples it) records nothing.
+    """
+    rate = sample_rate()
+    if rate <= 0 or _current_sample.get() is not None or (rate < 1 and random.random() >= rate):
+        yield
+        return
+    sample = RequestSample(float(getattr(settings, 'METRICS_LOCK_WAIT_THRESHOLD', 0.005)))
+    token = _current_sample.set(sample)
+    try:
+        with connection.execute_wrapper(sample.db_probe):
+            yield
+    finally:
+        _current_sample.reset(token)
+        if sample.queries or sample.json_seconds:
+            sample.record(view)
+
+
+def instrument_handler(name):
+    """Time an async GameConsumer handler. A no-op when sampling is off."""
+    def decorator(handler):
+        rate = sample_rate()
+        if rate <= 0:
+            return handler
+
+        @wraps(handler)
+        async def wrapper(*args, **kwargs):
+            if rate < 1 and random.random() >= rate:
+                return await handler(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return await handler(*args, **kwargs)
+            except Exception:
+                CONSUMER_ERRORS.inc(handler=name)
+                raise
+            finally:
+                CONSUMER_SECONDS.observe(time.perf_counter() - started, handler=name)
+        return wrapper
+    return decorator
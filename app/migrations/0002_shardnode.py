@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardNode',
+            fields=[
+                ('node_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('base_url', models.CharField(max_length=200)),
+                ('heartbeat_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_shardnode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='deal_seed',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
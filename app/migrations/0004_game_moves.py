@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_game_deal_seed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='move_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='GameMove',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.IntegerField()),
+                ('kind', models.CharField(choices=[('d', 'deal'), ('p', 'play'), ('x', 'pass'), ('r', 'reseat')], max_length=1)),
+                ('player_num', models.IntegerField(blank=True, null=True)),
+                ('card_num', models.IntegerField(blank=True, null=True)),
+                ('is_checkpoint', models.BooleanField(default=False)),
+                ('state', models.TextField(blank=True, default='')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moves', to='app.game')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['game', 'is_checkpoint', 'seq'], name='gamemove_checkpoints')],
+                'constraints': [models.UniqueConstraint(fields=('game', 'seq'), name='gamemove_game_seq')],
+            },
+        ),
+    ]
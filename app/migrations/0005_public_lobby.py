@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_game_moves'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='is_public',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='seats_taken',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('is_game_started', False), ('is_public', True)), fields=['created_at'], name='game_open_public'),
+        ),
+    ]
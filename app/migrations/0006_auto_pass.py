@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_public_lobby'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='auto_pass',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='auto_passed',
+            field=models.TextField(default='[]'),
+        ),
+        migrations.AlterField(
+            model_name='gamemove',
+            name='kind',
+            field=models.CharField(choices=[('d', 'deal'), ('p', 'play'), ('x', 'pass'), ('a', 'auto-pass'), ('r', 'reseat')], max_length=1),
+        ),
+    ]
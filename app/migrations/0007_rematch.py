@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_auto_pass'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='match_scores',
+            field=models.TextField(default='{}'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='round_number',
+            field=models.IntegerField(default=1),
+        ),
+    ]
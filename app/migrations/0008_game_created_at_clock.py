@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:59
+
+import app.clock
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_rematch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='game',
+            name='created_at',
+            field=models.DateTimeField(default=app.clock.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_game_created_at_clock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='turn_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('game_over', False), ('is_game_started', True)), fields=['turn_started_at'], name='game_live'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['created_at'], name='game_created'),
+        ),
+    ]
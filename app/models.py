@@ -1,17 +1,26 @@
 # badam_satti_app/models.py
 
-from django.db import models
-from django.utils.translation import gettext_lazy as _
-import json
+from django.conf import settings
+from django.db import models, transaction
+import logging
 import uuid
 from django.utils import timezone
-import random
 from datetime import timedelta
 
+from . import clock
+from .db_writer import arun_write, run_write
+from .log import log_game
+from .metrics import json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
 # --- Constants for the game ---
 CARD_RANKS = ['A', '2', '3', '4', '5', '6', '7', '8', '9', 'T', 'J', 'Q', 'K']
 CARD_SUITS = ['H', 'D', 'C', 'S']
 
+ROOM_TTL_SECONDS = 300  # an unstarted room expires after this long
+RECONNECT_WINDOW_SECONDS = 120  # a disconnected player is removed after this long
+
 CARDS_MAP = {
     1: "AH", 2: "2H", 3: "3H", 4: "4H", 5: "5H", 6: "6H", 7: "7H", 8: "8H", 9: "9H", 10: "TH", 11: "JH", 12: "QH", 13: "KH",
     14: "AD", 15: "2D", 16: "3D", 17: "4D", 18: "5D", 19: "6D", 20: "7D", 21: "8D", 22: "9D", 23: "TD", 24: "JD", 25: "QD", 26: "KD",
@@ -30,17 +39,113 @@ class Game(models.Model):
     is_game_started = models.BooleanField(default=False)
     game_over = models.BooleanField(default=False)
     winner_player_num = models.IntegerField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=clock.now, editable=False)
     last_updated = models.DateTimeField(auto_now=True)
     disconnected_player = models.IntegerField(null=True, blank=True)
     reconnect_timer_start = models.DateTimeField(null=True, blank=True)
     terminated_due_to_disconnect = models.BooleanField(default=False)
     game_scores = models.TextField(default='{}')
+    deal_seed = models.BigIntegerField(null=True, blank=True)
+    move_count = models.IntegerField(default=0)  # GameMove rows recorded so far (see replay.py)
+    is_public = models.BooleanField(default=False)
+    seats_taken = models.IntegerField(default=1)  # len(players_data), kept for the lobby (see lobby.py)
+    auto_pass = models.BooleanField(default=False)
+    auto_passed = models.TextField(default='[]')  # seats auto-passed by the last play or pass
+    round_number = models.IntegerField(default=1)
+    match_scores = models.TextField(default='{}')  # running score per player name across rematches
+    turn_started_at = models.DateTimeField(null=True, blank=True)  # when current_player last changed (see ops.py)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='game_open_public',
+                         condition=models.Q(is_public=True, is_game_started=False)),
+            models.Index(fields=['turn_started_at'], name='game_live',
+                         condition=models.Q(is_game_started=True, game_over=False)),
+            models.Index(fields=['created_at'], name='game_created'),
+        ]
 
 
     def __str__(self):
         return f"Game {self.room_code}"
 
+    def save(self, *args, **kwargs):
+        moves = self._take_pending_moves()
+        if moves:
+            return run_write(self._save_with_moves, moves, *args, **kwargs)
+        return run_write(super().save, *args, **kwargs)
+
+    async def asave(self, *args, **kwargs):
+        moves = self._take_pending_moves()
+        if moves:
+            return await arun_write(self._save_with_moves, moves, *args, **kwargs)
+        return await arun_write(super().save, *args, **kwargs)
+
+    def _save_with_moves(self, moves, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            GameMove.objects.bulk_create(moves)
+
+    def delete(self, *args, **kwargs):
+        return run_write(super().delete, *args, **kwargs)
+
+    # --- move log ---
+    # Off for the games replay.py rebuilds: the moves they apply are already in the log.
+    records_moves = True
+
+    def record_move(self, kind, player_num=None, card_num=None):
+        """Queue a GameMove for the next save(); it is written in the same transaction."""
+        if not self.records_moves:
+            return
+        seq = self.move_count
+        self.move_count = seq + 1
+        checkpoint = kind in GameMove.ALWAYS_CHECKPOINT or seq % replay_checkpoint_interval() == 0
+        pending = self.__dict__.setdefault('_pending_moves', [])
+        # Entries at or past seq were queued by a change that was rolled back.
+        pending[:] = [move for move in pending if move.seq < seq]
+        pending.append(GameMove(game_id=self.game_id, seq=seq, kind=kind, player_num=player_num,
+                                card_num=card_num, is_checkpoint=checkpoint,
+                                state=json_dumps(self.replay_state()) if checkpoint else ''))
+
+    def _take_pending_moves(self):
+        moves = self.__dict__.pop('_pending_moves', None)
+        return [move for move in moves if move.seq < self.move_count] if moves else None
+
+    def replay_state(self):
+        return {
+            'num_players': self.num_players,
+            'players': [{'player_num': p['player_num'], 'name': p['name'], 'hand': p['hand']}
+                        for p in json_loads(self.players_data)],
+            'desk_cards': json_loads(self.desk_cards),
+            'current_player': self.current_player,
+            'game_over': self.game_over,
+            'winner_player_num': self.winner_player_num,
+            'terminated_due_to_disconnect': self.terminated_due_to_disconnect,
+        }
+
+    @classmethod
+    def from_replay_state(cls, state):
+        """An unsaved Game in ``state``, for applying moves forward with commit=False; it logs no moves."""
+        game = cls(num_players=state['num_players'], players_data=json_dumps(state['players']),
+                   desk_cards=json_dumps(state['desk_cards']), current_player=state['current_player'],
+                   game_over=state['game_over'], winner_player_num=state['winner_player_num'],
+                   terminated_due_to_disconnect=state['terminated_due_to_disconnect'], is_game_started=True)
+        game.records_moves = False
+        return game
+
+    @property
+    def is_halted(self):
+        return self.disconnected_player is not None and not self.game_over
+
+    def reconnect_time_left(self):
+        if self.disconnected_player is None or not self.reconnect_timer_start:
+            return 0
+        elapsed = (clock.now() - self.reconnect_timer_start).total_seconds()
+        return max(0, int(RECONNECT_WINDOW_SECONDS - elapsed))
+
+    def room_expired(self):
+        """Whether this room was never started and has outlived ROOM_TTL_SECONDS."""
+        return not self.is_game_started and (clock.now() - self.created_at).total_seconds() > ROOM_TTL_SECONDS
+
     @staticmethod
     def _get_rank_value(rank_name):
         if rank_name in CARD_RANKS:
@@ -72,7 +177,7 @@ class Game(models.Model):
             })
 
         scores.sort(key=lambda x: x['score'])
-        self.game_scores = json.dumps(scores)
+        self.game_scores = json_dumps(scores)
 
 
     def _get_valid_moves(self, player_hand, desk_cards):
@@ -113,9 +218,11 @@ class Game(models.Model):
 
         return valid_moves
 
-    def update_game_state_after_move(self, card_num, player_num):
-        players_data = json.loads(self.players_data)
-        desk_cards = json.loads(self.desk_cards)
+    # The mutating methods below save unless called with commit=False, which
+    # lets an async caller apply the change in memory and write it once.
+    def update_game_state_after_move(self, card_num, player_num, commit=True):
+        players_data = json_loads(self.players_data)
+        desk_cards = json_loads(self.desk_cards)
 
         card_to_play = None
         for p_data in players_data:
@@ -141,29 +248,32 @@ class Game(models.Model):
             self.winner_player_num = player_num
             self._calculate_and_save_scores(players_data)
 
-        self.players_data = json.dumps(players_data)
-        self.desk_cards = json.dumps(desk_cards)
+        self.players_data = json_dumps(players_data)
+        self.desk_cards = json_dumps(desk_cards)
         self.current_player = (self.current_player % self.num_players) + 1
-        
-        self.save()
+        self.record_move(GameMove.PLAY, player_num, card_num)
+        self._chain_auto_passes(players_data, desk_cards)
+
+        if commit:
+            self.save()
         return True
 
     def get_player_hand(self, player_num):
-        players_data = json.loads(self.players_data)
+        players_data = json_loads(self.players_data)
         for player in players_data:
             if player['player_num'] == player_num:
                 return player['hand']
         return None
 
     def get_player_data(self, player_num):
-        players_data = json.loads(self.players_data)
+        players_data = json_loads(self.players_data)
         return next((p for p in players_data if p['player_num'] == player_num), None)
 
     def get_players_data(self):
-        return json.loads(self.players_data)
+        return json_loads(self.players_data)
 
     def get_desk_cards(self):
-        return json.loads(self.desk_cards)
+        return json_loads(self.desk_cards)
 
     def is_player_turn(self, player_num):
         return self.current_player == player_num
@@ -173,24 +283,63 @@ class Game(models.Model):
         desk_cards = self.get_desk_cards()
         return self._get_valid_moves(player_hand, desk_cards)
 
-    def pass_turn(self, player_num):
+    def pass_turn(self, player_num, commit=True):
         self.current_player = (self.current_player % self.num_players) + 1
-        self.save()
+        self.record_move(GameMove.PASS, player_num)
+        self._chain_auto_passes()
+        if commit:
+            self.save()
         return True, "Turn passed successfully."
 
-    def handle_player_disconnect(self, player_num):
+    def _chain_auto_passes(self, players_data=None, desk_cards=None):
+        """
+        With ``auto_pass`` on, pass for every seat that has no legal move, in
+        turn order, as part of the same change, stopping at the first seat
+        that has one and never going more than one lap round the table. A
+        full deck always leaves someone a move, but a seat removal discards
+        that player's hand: the cards the others need may have gone with it,
+        and then the turn comes back to a seat that can only pass.
+        """
+        if not self.auto_pass:
+            return
+        passed = []
+        if not self.game_over:
+            hands = {p['player_num']: p['hand'] for p in (players_data or json_loads(self.players_data))}
+            desk_cards = desk_cards if desk_cards is not None else json_loads(self.desk_cards)
+            for _attempt in range(self.num_players - 1):
+                if self._get_valid_moves(hands.get(self.current_player, []), desk_cards):
+                    break
+                passed.append(self.current_player)
+                self.record_move(GameMove.AUTO_PASS, self.current_player)
+                self.current_player = (self.current_player % self.num_players) + 1
+        self.auto_passed = json_dumps(passed)
+
+    def handle_player_disconnect(self, player_num, commit=True):
         if not self.disconnected_player:
             self.disconnected_player = player_num
-            self.reconnect_timer_start = timezone.now()
+            self.reconnect_timer_start = clock.now()
+            if commit:
+                self.save()
+            log_game(logger, logging.DEBUG, "Player %s disconnected. Timer started.", player_num,
+                     game=self, player_num=player_num)
+            return True
+        return False
+
+    def handle_player_reconnect(self, player_num, commit=True):
+        if self.disconnected_player != player_num:
+            return False, "You are not the disconnected player."
+        self.disconnected_player = None
+        self.reconnect_timer_start = None
+        if commit:
             self.save()
-            print(f"DEBUG: Player {player_num} disconnected from game {self.game_id}. Timer started.")
+        return True, f"Player {player_num} reconnected. Game resumed."
 
-    def check_for_termination(self):
+    def check_for_termination(self, commit=True):
         if self.disconnected_player and self.reconnect_timer_start:
-            time_elapsed = timezone.now() - self.reconnect_timer_start
-            if time_elapsed.total_seconds() >= 120:
+            time_elapsed = clock.now() - self.reconnect_timer_start
+            if time_elapsed.total_seconds() >= RECONNECT_WINDOW_SECONDS:
                 disconnected_player_num = self.disconnected_player
-                players_data = json.loads(self.players_data)
+                players_data = json_loads(self.players_data)
 
                 remaining_players = [p for p in players_data if p['player_num'] != disconnected_player_num]
 
@@ -217,40 +366,128 @@ class Game(models.Model):
                     else:
                         self.current_player = new_current_player_num
 
-                    self.players_data = json.dumps(remaining_players)
+                    self.players_data = json_dumps(remaining_players)
                     self.num_players = len(remaining_players)
+                    self.seats_taken = len(remaining_players)
 
                 self.disconnected_player = None
                 self.reconnect_timer_start = None
-                self.save()
-                print(f"DEBUG: Player {disconnected_player_num} removed due to timeout. Game continues.")
+                self.record_move(GameMove.RESEAT, disconnected_player_num)
+                if commit:
+                    self.save()
+                log_game(logger, logging.DEBUG, "Player %s removed due to timeout. Game continues.",
+                         disconnected_player_num, game=self, player_num=disconnected_player_num)
                 return True
         return False
 
-    def update_player_ping_time(self, player_num):
-        players_data = json.loads(self.players_data)
+    def check_for_game_termination(self, commit=True):
+        """check_for_termination() with a message for the table: (changed, message)."""
+        disconnected_player_num = self.disconnected_player
+        if not self.check_for_termination(commit=commit):
+            return False, None
+        if self.terminated_due_to_disconnect:
+            return True, "Game terminated as a player did not reconnect in time."
+        return True, f"Player {disconnected_player_num} did not reconnect and was removed. Game continues."
+
+    def receive_ping(self, player_num, commit=True):
+        """A ping from ``player_num``; resumes the game if they were the one away. False if they are not seated."""
+        if not any(p['player_num'] == player_num for p in json_loads(self.players_data)):
+            return False
+        if self.disconnected_player == player_num:
+            self.disconnected_player = None
+            self.reconnect_timer_start = None
+        self.update_player_ping_time(player_num, commit=commit)
+        return True
+
+    def update_player_ping_time(self, player_num, commit=True):
+        players_data = json_loads(self.players_data)
         for player in players_data:
             if player['player_num'] == player_num:
-                player['last_ping_time'] = timezone.now().isoformat()
+                player['last_ping_time'] = clock.now().isoformat()
                 break
-        self.players_data = json.dumps(players_data)
-        self.save()
+        self.players_data = json_dumps(players_data)
+        if commit:
+            self.save()
 
-    def check_for_player_inactivity(self, ping_timeout_seconds=20):
+    def lifecycle_check_due(self, ping_timeout_seconds=20):
+        """Whether run_lifecycle_checks() could change anything right now."""
+        if self.disconnected_player and self.reconnect_timer_start:
+            return (clock.now() - self.reconnect_timer_start).total_seconds() >= RECONNECT_WINDOW_SECONDS
+        if self.game_over or not self.is_game_started or self.disconnected_player is not None:
+            return False
+        cutoff = clock.now() - timedelta(seconds=ping_timeout_seconds)
+        for player in json_loads(self.players_data):
+            if player.get('last_ping_time'):
+                try:
+                    if timezone.datetime.fromisoformat(player['last_ping_time']) < cutoff:
+                        return True
+                except (ValueError, TypeError):
+                    return True
+        return False
+
+    def run_lifecycle_checks(self, ping_timeout_seconds=20, commit=True):
+        self.check_for_termination(commit=commit)
+        if self.disconnected_player is None and self.is_game_started and not self.game_over:
+            self.check_for_player_inactivity(ping_timeout_seconds=ping_timeout_seconds, commit=commit)
+
+    def check_for_player_inactivity(self, ping_timeout_seconds=20, commit=True):
         if self.game_over or not self.is_game_started or self.disconnected_player is not None:
             return
 
-        players_data = json.loads(self.players_data)
+        players_data = json_loads(self.players_data)
         for player in players_data:
             if 'last_ping_time' in player and player['last_ping_time']:
                 try:
                     last_ping_time = timezone.datetime.fromisoformat(player['last_ping_time'])
-                    time_since_last_ping = timezone.now() - last_ping_time
+                    time_since_last_ping = clock.now() - last_ping_time
 
                     if time_since_last_ping.total_seconds() > ping_timeout_seconds:
-                        print(f"DEBUG: Player {player['player_num']} detected as inactive. Marking as disconnected.")
-                        self.handle_player_disconnect(player['player_num'])
+                        log_game(logger, logging.DEBUG, "Player %s detected as inactive. Marking as disconnected.",
+                                 player['player_num'], game=self, player_num=player['player_num'])
+                        self.handle_player_disconnect(player['player_num'], commit=commit)
                         break
                 except (ValueError, TypeError):
-                    print(f"DEBUG: Invalid last_ping_time for Player {player['player_num']}. Setting now.")
-                    self.update_player_ping_time(player['player_num'])
\ No newline at end of file
+                    log_game(logger, logging.DEBUG, "Invalid last_ping_time for Player %s. Setting now.",
+                             player['player_num'], game=self, player_num=player['player_num'])
+                    self.update_player_ping_time(player['player_num'], commit=commit)
+
+
+def replay_checkpoint_interval():
+    return getattr(settings, 'REPLAY_CHECKPOINT_INTERVAL', 16)
+
+
+class GameMove(models.Model):
+    """
+    One entry in a game's move log. ``seq`` 0 is the deal; every later entry
+    is a play, a pass, or a seat removal. Checkpoint entries carry the whole
+    table (``state``) as it stood after them.
+    """
+    DEAL, PLAY, PASS, AUTO_PASS, RESEAT = 'd', 'p', 'x', 'a', 'r'
+    KIND_CHOICES = [(DEAL, 'deal'), (PLAY, 'play'), (PASS, 'pass'), (AUTO_PASS, 'auto-pass'), (RESEAT, 'reseat')]
+    # Not replayable from the previous state alone, so they always carry it.
+    ALWAYS_CHECKPOINT = (DEAL, RESEAT)
+
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='moves')
+    seq = models.IntegerField()
+    kind = models.CharField(max_length=1, choices=KIND_CHOICES)
+    player_num = models.IntegerField(null=True, blank=True)
+    card_num = models.IntegerField(null=True, blank=True)
+    is_checkpoint = models.BooleanField(default=False)
+    state = models.TextField(blank=True, default='')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['game', 'seq'], name='gamemove_game_seq')]
+        indexes = [models.Index(fields=['game', 'is_checkpoint', 'seq'], name='gamemove_checkpoints')]
+
+    def __str__(self):
+        return f"{self.game_id} #{self.seq} {self.get_kind_display()}"
+
+
+class ShardNode(models.Model):
+    """A server process taking part in the shard ring (see sharding.py)."""
+    node_id = models.CharField(max_length=64, primary_key=True)
+    base_url = models.CharField(max_length=200)
+    heartbeat_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.node_id} ({self.base_url})"
@@ -0,0 +1,118 @@
+# badam_satti_app/ops.py
+"""
+What the live-games page in the admin (``/admin/app/game/live/``) shows.
+
+Started, unfinished games are read with ``.only()`` the columns the page
+needs -- never the hands, desk or scores -- through the partial ``game_live``
+index on ``turn_started_at``, stalest turn first and at most
+``OPS_LIVE_LIMIT`` rows, so the page costs the same however many finished
+games the table holds. ``turn_started_at`` is stamped by the actors whenever
+a move, a deal or a new player to act changes the game.
+
+Request rates come from ``TableRateMiddleware`` and the game socket, which
+count each call against its game id or room code in ``table_rates``: calls
+per second over the last whole ``OPS_RATE_WINDOW`` seconds, in this process
+only. The page header adds the in-memory counters the metrics already keep.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import actors, cadence, clock, write_behind
+
+LIVE_FIELDS = (
+    'game_id', 'room_code', 'num_players', 'seats_taken', 'current_player', 'round_number', 'move_count',
+    'is_public', 'disconnected_player', 'reconnect_timer_start', 'turn_started_at', 'created_at', 'game_over',
+)
+
+
+class TableRates:
+    """Calls per second for each table over the last whole ``window`` seconds."""
+
+    def __init__(self, window=10.0):
+        self.window = window
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._counts = Counter()
+        self._rates = {}
+
+    def hit(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._roll(now)
+            self._counts[key] += 1
+
+    def rate(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._roll(now)
+            return self._rates.get(key, 0.0)
+
+    def _roll(self, now):
+        elapsed = now - self._started
+        if elapsed >= self.window:
+            # Only tables seen in the last window are kept, so this never outgrows the live ones.
+            if elapsed < 2 * self.window:
+                self._rates = {key: count / elapsed for key, count in self._counts.items()}
+            else:
+                self._rates = {}
+            self._started, self._counts = now, Counter()
+
+
+table_rates = TableRates(getattr(settings, 'OPS_RATE_WINDOW', 10.0))
+
+
+class TableRateMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'OPS_TABLE_RATES', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        key = view_kwargs.get('game_id') or view_kwargs.get('room_code')
+        if key:
+            table_rates.hit(str(key))
+        return None
+
+
+def live_games(limit=None):
+    """Started, unfinished games, stalest turn first, with only LIVE_FIELDS loaded."""
+    from .models import Game
+    limit = limit or getattr(settings, 'OPS_LIVE_LIMIT', 200)
+    return list(
+        Game.objects.filter(is_game_started=True, game_over=False)
+        .only(*LIVE_FIELDS)
+        .order_by('turn_started_at')[:limit]
+    )
+
+
+def table_row(game, now):
+    started = game.turn_started_at
+    return {
+        'game': game,
+        'turn_age': int((now - started).total_seconds()) if started else None,
+        'reconnect_left': game.reconnect_time_left() if game.is_halted else None,
+        'requests_per_second': table_rates.rate(str(game.game_id)) + table_rates.rate(game.room_code),
+    }
+
+
+def dashboard():
+    from .models import Game
+    now = clock.now()
+    live = Game.objects.filter(is_game_started=True, game_over=False)
+    rows = [table_row(game, now) for game in live_games()]
+    return {
+        'rows': rows,
+        'live_count': live.count(),
+        'halted_count': live.filter(disconnected_player__isnull=False).count(),
+        'actors': actors.ACTIVE_ACTORS.callback(),
+        'unwritten': write_behind.DIRTY_GAMES.callback(),
+        'requests_per_second': cadence.meter.rate(),
+        'rate_window': table_rates.window,
+    }
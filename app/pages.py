@@ -0,0 +1,71 @@
+# badam_satti_app/pages.py
+"""
+Pages that are the same for every visitor, rendered once per process.
+
+The home page, the rules and the join form only differ between visitors by
+their CSRF token. ``render_page()`` renders each template the first time it
+is asked for, with a placeholder where ``{% csrf_token %}`` goes; after that
+a request only swaps in the visitor's token, and GZipMiddleware compresses
+the result (with its padding against BREACH, since the page holds a secret).
+
+A page without a token -- the rules, which every page's rules modal also
+fetches -- is finished at render time: its ETag and gzip/brotli variants are
+computed once, browsers keep it for ``PAGE_MAX_AGE`` seconds and then get a
+304 while it is unchanged.
+"""
+import hashlib
+import threading
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
+
+from .assets import accepted_encoding, compress
+
+CSRF_PLACEHOLDER = 'csrf-token-placeholder'
+PAGE_MAX_AGE = 3600
+
+
+class Page:
+    __slots__ = ('body', 'has_token', 'etag', 'variants')
+
+    def __init__(self, body):
+        self.body = body
+        self.has_token = CSRF_PLACEHOLDER.encode() in body
+        self.etag = 'W/"%s"' % hashlib.md5(body).hexdigest()
+        self.variants = {} if self.has_token else compress(body)
+
+
+_pages = {}
+_pages_lock = threading.Lock()
+
+
+def page(template_name):
+    rendered = _pages.get(template_name)
+    if rendered is None:
+        with _pages_lock:
+            rendered = _pages.get(template_name)
+            if rendered is None:
+                body = render_to_string(template_name, {'csrf_token': CSRF_PLACEHOLDER}).encode()
+                rendered = _pages[template_name] = Page(body)
+    return rendered
+
+
+def render_page(request, template_name):
+    rendered = page(template_name)
+    if rendered.has_token:
+        return HttpResponse(rendered.body.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode()))
+
+    if rendered.etag.removeprefix('W/') in [tag.strip().removeprefix('W/')
+                                            for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        coding = accepted_encoding(request, {coding: len(body) for coding, body in rendered.variants.items()})
+        response = HttpResponse(rendered.variants[coding] if coding else rendered.body)
+        if coding:
+            response['Content-Encoding'] = coding
+    response['ETag'] = rendered.etag
+    response['Cache-Control'] = f'public, max-age={PAGE_MAX_AGE}'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
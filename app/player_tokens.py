@@ -0,0 +1,60 @@
+# badam_satti_app/player_tokens.py
+"""
+Signed per-game player tokens for the game API.
+
+The game page is rendered with a token naming (game_id, player name), signed
+with SECRET_KEY. The page sends it in the ``X-Player-Token`` header on its
+once-a-second calls (ping, state, play, pass), so those views identify the
+caller without loading the database-backed session. Clients that do not send
+the header still go through the session; the HTML views always do. The game
+socket takes the token in its query string, which also lets it follow a shard
+redirect to a host that has no session cookie.
+
+Seats are renumbered when a player leaves (check_for_termination,
+remove_player), so neither the token nor the session is trusted for a seat
+number. Both carry the player's name -- join_room and matchmaking already keep
+names unique at a table -- and seat_of() finds the seat it holds in the game
+as it is when the request is applied.
+"""
+from django.core import signing
+
+from .metrics import json_loads
+
+# Tokens naming a seat number were signed with 'app.player_tokens'; they no longer verify.
+SIGNING_SALT = 'app.player_tokens.name'
+HEADER = 'X-Player-Token'
+
+
+def issue(game_id, player_name):
+    return signing.Signer(salt=SIGNING_SALT).sign(f'{game_id}:{player_name}')
+
+
+def player_name_for(token, game_id):
+    try:
+        value = signing.Signer(salt=SIGNING_SALT).unsign(token)
+    except signing.BadSignature:
+        return None
+    token_game_id, _, player_name = value.partition(':')
+    if token_game_id != str(game_id):
+        return None
+    return player_name
+
+
+def player_name_from_request(request, game_id):
+    token = request.headers.get(HEADER)
+    if token is not None:
+        return player_name_for(token, game_id)
+    if request.session.get('game_id') != str(game_id):
+        return None
+    return request.session.get('player_name')
+
+
+def seat_of(game, player_name):
+    """The seat ``player_name`` holds at ``game`` now, or None once they have left it."""
+    if not player_name:
+        return None
+    return next((p['player_num'] for p in json_loads(game.players_data) if p['name'] == player_name), None)
+
+
+def player_num_from_request(request, game):
+    return seat_of(game, player_name_from_request(request, game.game_id))
@@ -0,0 +1,220 @@
+# badam_satti_app/profiling.py
+"""
+On-demand stack sampling of live requests and socket handlers.
+
+``ProfilingMiddleware`` picks ``PROFILE_SAMPLE_RATE`` of the requests to
+``app.views`` endpoints -- plus, with ``PROFILE_ON_HEADER``, any request from
+a staff user carrying ``X-Profile: 1`` -- and ``profile_handler()`` does the
+same for GameConsumer handlers. While a picked call runs, one sampler thread
+reads its thread's stack every ``PROFILE_INTERVAL`` seconds; the stacks are
+written, collapsed, to ``PROFILE_DIR/<endpoint>.folded`` -- one
+``frame;frame;frame count`` line per distinct stack, the input of
+``flamegraph.pl`` and speedscope. A file past ``PROFILE_MAX_BYTES`` is
+rotated, keeping ``PROFILE_BACKUP_COUNT`` old ones.
+
+A sample is a point in wall time, so a file only means something across
+many calls; a call shorter than the interval is usually not seen at all. A
+socket handler's stacks start at the handler, and samples taken while it
+awaits (the loop is running something else) are counted as ``<awaiting>``.
+
+With the rate at 0 and the header off the middleware removes itself and the
+decorator returns the handler unchanged. When on, at most
+``PROFILE_MAX_ACTIVE`` calls are sampled at once and stacks are cut at
+``MAX_DEPTH`` frames.
+"""
+import atexit
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import registry
+
+PROFILE_HEADER = 'X-Profile'
+VIEWS_MODULE = 'app.views'
+MAX_DEPTH = 128
+FLUSH_EVERY_SECONDS = 5.0
+
+
+def sample_rate():
+    return float(getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0))
+
+
+def _label(code, module):
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse(frame, root_code, root_label):
+    """The stack of ``frame`` from the ``root_code`` frame down, as a folded-stack key."""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_label(frame.f_code, frame.f_globals.get('__name__', '?')))
+        if frame.f_code is root_code:
+            return ';'.join(reversed(labels))
+        frame = frame.f_back
+    return f'{root_label};<awaiting>'
+
+
+class _Target:
+    __slots__ = ('endpoint', 'thread_id', 'root_code', 'root_label', 'stacks')
+
+    def __init__(self, endpoint, root_code, root_label):
+        self.endpoint = endpoint
+        self.thread_id = threading.get_ident()
+        self.root_code = root_code
+        self.root_label = root_label
+        self.stacks = Counter()
+
+
+class Sampler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._targets = set()
+        self._collected = defaultdict(Counter)
+        self._wake = threading.Event()
+        self._thread = None
+        self._flushed_at = time.monotonic()
+
+    def start(self, endpoint, root_code, root_label):
+        """Begin sampling the calling thread under ``endpoint``; None when PROFILE_MAX_ACTIVE are running."""
+        with self._lock:
+            if len(self._targets) >= getattr(settings, 'PROFILE_MAX_ACTIVE', 8):
+                SKIPPED.inc(endpoint=endpoint)
+                return None
+            target = _Target(endpoint, root_code, root_label)
+            self._targets.add(target)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        self._wake.set()
+        return target
+
+    def stop(self, target):
+        with self._lock:
+            self._targets.discard(target)
+            self._collected[target.endpoint].update(target.stacks)
+        PROFILED.inc(endpoint=target.endpoint)
+
+    def sample(self):
+        """Take one sample of every running target."""
+        frames = sys._current_frames()
+        with self._lock:
+            for target in self._targets:
+                frame = frames.get(target.thread_id)
+                if frame is not None:
+                    target.stacks[collapse(frame, target.root_code, target.root_label)] += 1
+
+    def flush(self):
+        """Append everything collected so far to the endpoints' files."""
+        with self._lock:
+            collected, self._collected = self._collected, defaultdict(Counter)
+            self._flushed_at = time.monotonic()
+        directory = getattr(settings, 'PROFILE_DIR', 'profiles')
+        for endpoint, stacks in collected.items():
+            if stacks:
+                os.makedirs(directory, exist_ok=True)
+                _append(os.path.join(directory, f'{endpoint}.folded'),
+                        ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common()))
+
+    def _run(self):
+        while True:
+            if time.monotonic() - self._flushed_at >= FLUSH_EVERY_SECONDS:
+                self.flush()
+            with self._lock:
+                idle = not self._targets
+                if idle:
+                    self._wake.clear()
+            if idle:
+                self._wake.wait(FLUSH_EVERY_SECONDS)
+                continue
+            self.sample()
+            time.sleep(getattr(settings, 'PROFILE_INTERVAL', 0.005))
+
+
+def _append(path, text):
+    data = text.encode()
+    max_bytes = getattr(settings, 'PROFILE_MAX_BYTES', 5 * 1024 * 1024)
+    if os.path.exists(path) and os.path.getsize(path) + len(data) > max_bytes:
+        _rotate(path, getattr(settings, 'PROFILE_BACKUP_COUNT', 3))
+    with open(path, 'ab') as fh:
+        fh.write(data)
+
+
+def _rotate(path, backups):
+    if backups <= 0:
+        os.remove(path)
+        return
+    for n in range(backups - 1, 0, -1):
+        if os.path.exists(f'{path}.{n}'):
+            os.replace(f'{path}.{n}', f'{path}.{n + 1}')
+    os.replace(path, f'{path}.1')
+
+
+sampler = Sampler()
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = sample_rate()
+        self.on_header = getattr(settings, 'PROFILE_ON_HEADER', False)
+        if self.sample_rate <= 0 and not self.on_header:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            target = getattr(request, '_profile_target', None)
+            if target is not None:
+                sampler.stop(target)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Runs after the other middleware, so request.user is there for the header check.
+        if getattr(view_func, '__module__', None) != VIEWS_MODULE:
+            return None
+        if random.random() < self.sample_rate or self._requested(request):
+            endpoint = request.resolver_match.url_name or view_func.__name__
+            request._profile_target = sampler.start(endpoint, ProfilingMiddleware.__call__.__code__, endpoint)
+        return None
+
+    def _requested(self, request):
+        if not self.on_header or request.headers.get(PROFILE_HEADER) != '1':
+            return False
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_staff)
+
+
+def profile_handler(name):
+    """Stack-sample an async GameConsumer handler. A no-op when sampling is off."""
+    def decorator(handler):
+        rate = sample_rate()
+        if rate <= 0:
+            return handler
+        endpoint = f'consumer.{name}'
+
+        @wraps(handler)
+        async def wrapper(*args, **kwargs):
+            if random.random() >= rate:
+                return await handler(*args, **kwargs)
+            target = sampler.start(endpoint, handler.__code__, endpoint)
+            if target is None:
+                return await handler(*args, **kwargs)
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                sampler.stop(target)
+        return wrapper
+    return decorator
+
+
+PROFILED = registry.counter('badam_profiled_total', 'Calls stack-sampled by the profiler, by endpoint.')
+SKIPPED = registry.counter('badam_profile_skipped_total',
+                           'Calls picked for profiling but skipped because PROFILE_MAX_ACTIVE were running.')
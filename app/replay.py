@@ -0,0 +1,94 @@
+# badam_satti_app/replay.py
+"""
+Replays and delayed spectating from the move log (``GameMove``).
+
+Every play, pass and seat removal is logged in the same transaction as the
+change to the game. Every ``REPLAY_CHECKPOINT_INTERVAL``-th entry, and every
+entry that cannot be derived from the one before it (the deal, a seat
+removal), also stores the whole table. ``state_at(game_id, seq)`` seeks the
+last checkpoint at or before ``seq`` through the (game, is_checkpoint, seq)
+index and applies at most an interval's worth of moves forward with the
+same rules the live game uses, so any position costs one index seek plus a
+bounded number of moves however long the game is.
+
+None of this reads the ``Game`` row: a spectator view of a busy table never
+competes with its players for it.
+"""
+import json
+
+from .metrics import json_loads
+from .models import Game, GameMove
+
+
+class NoMoves(Exception):
+    """The game has no move log (not started, or started before moves were recorded)."""
+
+
+def last_seq(game_id):
+    seq = GameMove.objects.filter(game_id=game_id).order_by('-seq').values_list('seq', flat=True).first()
+    if seq is None:
+        raise NoMoves(game_id)
+    return seq
+
+
+def last_finished_seq(game_id, game_over):
+    """
+    The last move of a finished round: the whole log once the game is over,
+    else the move before the deal of the round being played (a rematch), or
+    None in a first round.
+    """
+    if game_over:
+        return last_seq(game_id)
+    deal = (GameMove.objects.filter(game_id=game_id, is_checkpoint=True, kind=GameMove.DEAL)
+            .order_by('-seq').values_list('seq', flat=True).first())
+    return deal - 1 if deal else None
+
+
+def state_at(game_id, seq):
+    """The table as it stood right after move ``seq`` (0 is the deal)."""
+    checkpoint = (GameMove.objects.filter(game_id=game_id, is_checkpoint=True, seq__lte=seq)
+                  .order_by('-seq').values_list('seq', 'state').first())
+    if checkpoint is None:
+        raise NoMoves(game_id)
+    start, state = checkpoint
+    moves = (GameMove.objects.filter(game_id=game_id, seq__gt=start, seq__lte=seq)
+             .order_by('seq').values_list('kind', 'player_num', 'card_num'))
+    moves = list(moves)
+    if not moves:
+        return json_loads(state)
+
+    game = Game.from_replay_state(json_loads(state))
+    for kind, player_num, card_num in moves:
+        # The replay game has auto_pass off: logged auto-passes are applied as passes.
+        if kind == GameMove.PLAY:
+            game.update_game_state_after_move(card_num, player_num, commit=False)
+        else:
+            game.pass_turn(player_num, commit=False)
+    return game.replay_state()
+
+
+def public_view(state):
+    """``state`` with each hand reduced to its size, for spectators of a live game."""
+    view = dict(state)
+    view['players'] = [{'player_num': p['player_num'], 'name': p['name'], 'hand_size': len(p['hand'])}
+                       for p in state['players']]
+    return view
+
+
+def frames(game_id, last=None):
+    """
+    The game up to move ``last`` (all of it by default) as NDJSON lines: ``[seq, kind, player_num, card_num]`` per
+    move, with the table appended for the entries that need it (the deal and
+    seat removals). Periodic checkpoints are left out; a player of the stream
+    applies moves forward from the deal.
+    """
+    rows = GameMove.objects.filter(game_id=game_id)
+    if last is not None:
+        rows = rows.filter(seq__lte=last)
+    rows = (rows.order_by('seq')
+            .values_list('seq', 'kind', 'player_num', 'card_num', 'state'))
+    for seq, kind, player_num, card_num, state in rows.iterator(chunk_size=500):
+        frame = [seq, kind, player_num, card_num]
+        if kind in GameMove.ALWAYS_CHECKPOINT:
+            frame.append(json_loads(state))
+        yield json.dumps(frame, separators=(',', ':')) + '\n'
@@ -0,0 +1,333 @@
+# badam_satti_app/resp_standin.py
+"""
+A tiny in-memory server speaking enough of the Redis protocol for
+RespChannelLayer: lists with BLPOP, sorted sets, EXPIRE, KEYS and DEL. EVAL
+runs only the layer's own scripts, each reimplemented in Python; like any
+command here it runs to completion before the next one starts.
+
+It is for local development and benchmarks (``python manage.py resp_standin``),
+not for production: there is no persistence, one database, and keys only
+expire when they are next touched.
+"""
+import asyncio
+import collections
+import fnmatch
+import threading
+import time
+
+from .channel_layers import SEND_SCRIPT, RespError
+
+
+class SimpleString(str):
+    pass
+
+
+OK = SimpleString('OK')
+PONG = SimpleString('PONG')
+WRONGTYPE = RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+
+
+def encode_reply(value):
+    if isinstance(value, SimpleString):
+        return b'+%s\r\n' % value.encode()
+    if isinstance(value, RespError):
+        return b'-%s\r\n' % str(value).encode()
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    if isinstance(value, (list, tuple)):
+        return b'*%d\r\n' % len(value) + b''.join(encode_reply(item) for item in value)
+    if isinstance(value, _NullArray):
+        return b'*-1\r\n'
+    raise TypeError(f"Cannot encode {value!r}")
+
+
+class _NullArray:
+    pass
+
+
+NULL_ARRAY = _NullArray()
+
+
+async def read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if line[:1] != b'*':
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readline()
+        args.append((await reader.readexactly(int(header[1:-2]) + 2))[:-2])
+    return args
+
+
+class RespStandIn:
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._waiters = collections.defaultdict(collections.deque)
+        self._scripts = {SEND_SCRIPT.encode(): self._send_script}
+
+    # --- storage ---
+    def _get(self, key, kind):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._delete(key)
+        value = self._data.get(key)
+        if value is not None and not isinstance(value, kind):
+            raise WRONGTYPE
+        return value
+
+    def _delete(self, key):
+        self._expires.pop(key, None)
+        return self._data.pop(key, None) is not None
+
+    def _list(self, key):
+        value = self._get(key, collections.deque)
+        if value is None:
+            value = self._data[key] = collections.deque()
+        return value
+
+    def _zset(self, key):
+        value = self._get(key, dict)
+        if value is None:
+            value = self._data[key] = {}
+        return value
+
+    def _drop_if_empty(self, key):
+        if not self._data.get(key):
+            self._delete(key)
+
+    # --- connection ---
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None or command[0].upper() == b'QUIT':
+                    break
+                name = command[0].decode().lower()
+                handler = getattr(self, f'cmd_{name}', None)
+                try:
+                    if handler is None:
+                        raise RespError(f"ERR unknown command '{name}'")
+                    reply = handler(*command[1:])
+                    if asyncio.iscoroutine(reply):
+                        reply = await reply
+                except RespError as exc:
+                    reply = exc
+                except (TypeError, ValueError):
+                    reply = RespError(f"ERR wrong arguments for '{name}' command")
+                writer.write(encode_reply(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # CancelledError: the stand-in is shutting down.
+            pass
+        finally:
+            writer.close()
+
+    # --- commands ---
+    def cmd_ping(self, *args):
+        return args[0] if args else PONG
+
+    def cmd_auth(self, *args):
+        return OK
+
+    def cmd_select(self, db):
+        return OK
+
+    def cmd_flushdb(self, *args):
+        self._data.clear()
+        self._expires.clear()
+        return OK
+
+    cmd_flushall = cmd_flushdb
+
+    def cmd_del(self, *keys):
+        return sum(self._delete(key) for key in keys)
+
+    def cmd_exists(self, *keys):
+        return sum(self._get(key, object) is not None for key in keys)
+
+    def cmd_expire(self, key, seconds):
+        if self._get(key, object) is None:
+            return 0
+        self._expires[key] = time.monotonic() + int(seconds)
+        return 1
+
+    def cmd_keys(self, pattern):
+        pattern = pattern.decode()
+        return [key for key in list(self._data) if self._get(key, object) is not None
+                and fnmatch.fnmatchcase(key.decode(), pattern)]
+
+    def cmd_rpush(self, key, *values):
+        if not values:
+            raise TypeError
+        items = self._list(key)
+        items.extend(values)
+        length = len(items)
+        waiters = self._waiters.get(key)
+        while waiters and items:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result((key, items.popleft()))
+        if not waiters:
+            self._waiters.pop(key, None)
+        self._drop_if_empty(key)
+        return length
+
+    def cmd_lpop(self, key):
+        items = self._get(key, collections.deque)
+        if not items:
+            return None
+        value = items.popleft()
+        self._drop_if_empty(key)
+        return value
+
+    def cmd_lrange(self, key, start, stop):
+        items = self._get(key, collections.deque)
+        if not items:
+            return []
+        start, stop = int(start), int(stop)
+        if stop < 0:
+            stop += len(items)
+        return list(items)[start:stop + 1]
+
+    def cmd_ltrim(self, key, start, stop):
+        items = self._get(key, collections.deque)
+        if items:
+            start, stop = int(start), int(stop)
+            if stop < 0:
+                stop += len(items)
+            kept = list(items)[start:stop + 1]
+            items.clear()
+            items.extend(kept)
+            self._drop_if_empty(key)
+        return OK
+
+    def cmd_llen(self, key):
+        items = self._get(key, collections.deque)
+        return len(items) if items else 0
+
+    async def cmd_blpop(self, *args):
+        *keys, timeout = args
+        timeout = float(timeout)
+        for key in keys:
+            items = self._get(key, collections.deque)
+            if items:
+                value = items.popleft()
+                self._drop_if_empty(key)
+                return [key, value]
+
+        waiter = asyncio.get_running_loop().create_future()
+        for key in keys:
+            self._waiters[key].append(waiter)
+        try:
+            key, value = await asyncio.wait_for(waiter, timeout or None)
+        except asyncio.TimeoutError:
+            return NULL_ARRAY
+        finally:
+            for key_ in keys:
+                waiters = self._waiters.get(key_)
+                if waiters is not None:
+                    try:
+                        waiters.remove(waiter)
+                    except ValueError:
+                        pass
+                    if not waiters:
+                        del self._waiters[key_]
+        return [key, value]
+
+    def cmd_eval(self, script, numkeys, *args):
+        handler = self._scripts.get(script)
+        if handler is None:
+            raise RespError("ERR the stand-in only runs RespChannelLayer's scripts")
+        numkeys = int(numkeys)
+        return handler(args[:numkeys], args[numkeys:])
+
+    def _send_script(self, keys, args):
+        (key,), (frame, capacity, seconds) = keys, args
+        if self.cmd_llen(key) >= int(capacity):
+            return 0
+        self.cmd_rpush(key, frame)
+        self.cmd_expire(key, seconds)
+        return 1
+
+    def cmd_zadd(self, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise TypeError
+        members = self._zset(key)
+        added = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            added += member not in members
+            members[member] = float(score)
+        return added
+
+    def cmd_zrem(self, key, *members):
+        zset = self._get(key, dict)
+        if not zset:
+            return 0
+        removed = sum(zset.pop(member, None) is not None for member in members)
+        self._drop_if_empty(key)
+        return removed
+
+    def cmd_zcard(self, key):
+        zset = self._get(key, dict)
+        return len(zset) if zset else 0
+
+    def cmd_zrange(self, key, start, stop):
+        zset = self._get(key, dict)
+        if not zset:
+            return []
+        ordered = [member for member, _ in sorted(zset.items(), key=lambda item: (item[1], item[0]))]
+        start, stop = int(start), int(stop)
+        if stop < 0:
+            stop += len(ordered)
+        return ordered[start:stop + 1]
+
+    def cmd_zremrangebyscore(self, key, low, high):
+        zset = self._get(key, dict)
+        if not zset:
+            return 0
+        low, high = float(low), float(high)
+        doomed = [member for member, score in zset.items() if low <= score <= high]
+        for member in doomed:
+            del zset[member]
+        self._drop_if_empty(key)
+        return len(doomed)
+
+
+async def serve(host='127.0.0.1', port=6390):
+    return await asyncio.start_server(RespStandIn().handle, host, port)
+
+
+def start_in_thread(host='127.0.0.1', port=0):
+    """Run a stand-in on its own event loop thread. Returns (port, stop)."""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    holder = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        holder['server'] = loop.run_until_complete(serve(host, port))
+        started.set()
+        loop.run_forever()
+        holder['server'].close()
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+
+    thread = threading.Thread(target=run, name='resp-standin', daemon=True)
+    thread.start()
+    started.wait()
+
+    def stop():
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return holder['server'].sockets[0].getsockname()[1], stop
@@ -0,0 +1,118 @@
+# badam_satti_app/room_codes.py
+"""
+Room-code allocation.
+
+Codes come from a per-process counter pushed through a keyed permutation of
+the 36^6 code space, so consecutive rooms get unrelated-looking codes and we
+never have to ask the database whether a code is free. The unique index on
+``Game.room_code`` is the only arbiter: if another process (or a recycled
+code) got there first the INSERT raises ``IntegrityError`` and we move on to
+the next code. Room creation is therefore one INSERT in the common case, no
+matter how many games the table holds.
+"""
+import hashlib
+import secrets
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Game
+
+ROOM_CODE_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+ROOM_CODE_LENGTH = 6
+CODE_SPACE = len(ROOM_CODE_ALPHABET) ** ROOM_CODE_LENGTH
+
+# An INSERT only fails when two processes land on the same code, so a
+# handful of retries is already far more than we should ever need.
+MAX_INSERT_ATTEMPTS = 8
+FEISTEL_ROUNDS = 4
+RECYCLE_POOL_SIZE = 1024
+
+
+def encode_room_code(value):
+    chars = []
+    for _ in range(ROOM_CODE_LENGTH):
+        value, digit = divmod(value, len(ROOM_CODE_ALPHABET))
+        chars.append(ROOM_CODE_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class RoomCodeAllocator:
+    def __init__(self, secret=None, start=None):
+        self._secret = secret
+        self._keys = None
+        self._counter = secrets.randbelow(CODE_SPACE) if start is None else start % CODE_SPACE
+        self._recycled = deque(maxlen=RECYCLE_POOL_SIZE)
+        self._lock = threading.Lock()
+
+    def _round_keys(self):
+        if self._keys is None:
+            secret = self._secret if self._secret is not None else settings.SECRET_KEY
+            digest = hashlib.sha256(f'room-codes:{secret}'.encode()).digest()
+            self._keys = [int.from_bytes(digest[i * 4:(i + 1) * 4], 'big') for i in range(FEISTEL_ROUNDS)]
+        return self._keys
+
+    def _feistel(self, value):
+        # Balanced Feistel network over 32 bits: a bijection for any round function.
+        left, right = value >> 16, value & 0xFFFF
+        for key in self._round_keys():
+            mixed = (right * 0x45D9F3B + key) & 0xFFFFFFFF
+            mixed ^= mixed >> 16
+            left, right = right, left ^ (mixed & 0xFFFF)
+        return (left << 16) | right
+
+    def permute(self, index):
+        # Cycle-walk until we land inside the code space; this keeps the
+        # mapping a bijection on [0, CODE_SPACE) and takes < 2 steps on average.
+        value = self._feistel(index)
+        while value >= CODE_SPACE:
+            value = self._feistel(value)
+        return value
+
+    def next_code(self):
+        with self._lock:
+            if self._recycled:
+                return self._recycled.popleft()
+            index = self._counter
+            self._counter = (self._counter + 1) % CODE_SPACE
+        return encode_room_code(self.permute(index))
+
+    def next_codes(self, count):
+        return [self.next_code() for _ in range(count)]
+
+    def release(self, room_code):
+        # Codes of expired or archived games are handed out before any new
+        # code, oldest release first, so the space is reused before the
+        # counter wraps.
+        if room_code:
+            self._recycled.append(room_code)
+
+    def _insert(self, room_code, fields):
+        # In autocommit mode a failed INSERT leaves nothing to undo; only an
+        # enclosing transaction needs a savepoint to survive the conflict.
+        if not transaction.get_connection().in_atomic_block:
+            return Game.objects.create(room_code=room_code, **fields)
+        with transaction.atomic():
+            return Game.objects.create(room_code=room_code, **fields)
+
+    def create_game(self, **fields):
+        for _ in range(MAX_INSERT_ATTEMPTS):
+            room_code = self.next_code()
+            try:
+                return self._insert(room_code, fields)
+            except IntegrityError:
+                continue
+        raise IntegrityError(f"Could not allocate a free room code after {MAX_INSERT_ATTEMPTS} attempts.")
+
+
+allocator = RoomCodeAllocator()
+
+
+def create_game(**fields):
+    return allocator.create_game(**fields)
+
+
+def release_room_code(room_code):
+    allocator.release(room_code)
@@ -0,0 +1,10 @@
+# badam_satti_app/routing.py
+
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/game/<str:room_code>/', consumers.GameConsumer.as_asgi()),
+    path('ws/lobby/', consumers.LobbyConsumer.as_asgi()),
+]
@@ -0,0 +1,356 @@
+# badam_satti_app/sharding.py
+"""
+Sticky game-to-node sharding.
+
+Each table is owned by one server process, chosen by a consistent-hash ring
+over the live nodes keyed on the room code (``game_id`` URLs are mapped to
+their room code first). ``ShardRoutingMiddleware`` hands every request for a
+table that another node owns to that node, either by proxying it (default; the
+page's fetch() calls stay same-origin) or with a signed 307 redirect. The
+owner accepts a signed hop without re-checking, so nodes that briefly disagree
+about the ring cannot bounce a request back and forth.
+
+Nodes announce themselves in the ``ShardNode`` table and heartbeat every
+``SHARD_HEARTBEAT_INTERVAL`` seconds. A node that leaves (or stops
+heartbeating for ``SHARD_HEARTBEAT_TIMEOUT``) drops out of the ring and its
+tables move to their next node; ``ownership_changed`` is sent whenever the
+ring changes so anything holding per-table state in memory can flush it.
+
+The heartbeat is also the lease that keeps one writer per table, which the
+game actors rely on. A node serves its tables only while its own last
+successful heartbeat is younger than the timeout minus one interval;
+otherwise it answers 503. A peer takes a table over only once the owner's
+heartbeat in the database is past the timeout. An owner that is slow or
+briefly unreachable but still heartbeating gets the request's caller a 503
+and a retry, never a second writer.
+
+Trying it locally with two processes sharing db.sqlite3:
+
+    SHARD_NODE_ID=a SHARD_BASE_URL=http://127.0.0.1:8001 python manage.py runserver 8001
+    SHARD_NODE_ID=b SHARD_BASE_URL=http://127.0.0.1:8002 python manage.py runserver 8002
+    python manage.py shard_status --room ABC123
+"""
+import atexit
+import bisect
+import hashlib
+import logging
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.dispatch import Signal
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.utils import timezone
+
+from .log import log_game
+
+logger = logging.getLogger(__name__)
+
+# Sent with ``previous`` and ``current`` (tuples of node ids) when the ring changes.
+ownership_changed = Signal()
+
+SIGNING_SALT = 'app.sharding'
+FORWARD_HEADER = 'X-Shard-Route'
+REDIRECT_PARAM = '_shard'
+HOP_MAX_AGE = 30
+HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te', 'trailers',
+              'transfer-encoding', 'upgrade', 'content-length', 'host'}
+
+
+class HashRing:
+    def __init__(self, nodes, replicas=64):
+        self.nodes = tuple(sorted(nodes))
+        points = sorted((self._hash(f'{node}#{i}'), node) for node in self.nodes for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def owner(self, key):
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class _RoomCodeCache:
+    """game_id -> room_code; a game's room code never changes, so entries never go stale."""
+
+    def __init__(self, size=65536):
+        self._entries = OrderedDict()
+        self._size = size
+        self._lock = threading.Lock()
+
+    def get(self, game_id):
+        with self._lock:
+            room_code = self._entries.get(game_id)
+            if room_code is not None:
+                self._entries.move_to_end(game_id)
+                return room_code
+        from .models import Game
+        room_code = Game.objects.filter(game_id=game_id).values_list('room_code', flat=True).first()
+        if room_code is not None:
+            with self._lock:
+                self._entries[game_id] = room_code
+                if len(self._entries) > self._size:
+                    self._entries.popitem(last=False)
+        return room_code
+
+
+class ShardMap:
+    def __init__(self, node_id, base_url, refresh_seconds=2.0):
+        self.node_id = node_id
+        self.base_url = base_url
+        self.refresh_seconds = refresh_seconds
+        self._members = {}
+        self._ring = HashRing(())
+        self._refreshed_at = 0.0
+        self._heartbeat_ok_at = None
+        self._lock = threading.Lock()
+        self._heartbeat_thread = None
+        self._stopping = threading.Event()
+        self.room_codes = _RoomCodeCache()
+
+    # --- membership ---
+    def heartbeat(self):
+        from .models import ShardNode
+        ShardNode.objects.update_or_create(node_id=self.node_id,
+                                           defaults={'base_url': self.base_url, 'heartbeat_at': timezone.now()})
+        self._heartbeat_ok_at = time.monotonic()
+
+    def holds_lease(self):
+        """Whether this node's own heartbeat is recent enough that no peer can have taken its tables."""
+        if self._heartbeat_ok_at is None:
+            return False
+        lease = _heartbeat_timeout() - getattr(settings, 'SHARD_HEARTBEAT_INTERVAL', 5)
+        return time.monotonic() - self._heartbeat_ok_at < lease
+
+    def is_alive(self, node_id):
+        """Whether ``node_id`` is heartbeating according to the database now, not as of the last refresh."""
+        from .models import ShardNode
+        return ShardNode.objects.filter(node_id=node_id, heartbeat_at__gte=_heartbeat_cutoff()).exists()
+
+    def start_heartbeat(self):
+        if self._heartbeat_thread is not None:
+            return
+        self.heartbeat()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='shard-heartbeat', daemon=True)
+        self._heartbeat_thread.start()
+        atexit.register(self.leave)
+
+    def _heartbeat_loop(self):
+        from django.db import close_old_connections
+        interval = getattr(settings, 'SHARD_HEARTBEAT_INTERVAL', 5)
+        while not self._stopping.wait(interval):
+            try:
+                self.heartbeat()
+            except Exception:
+                log_game(logger, logging.WARNING, "Shard heartbeat failed for node %s", self.node_id, exc_info=True)
+            finally:
+                close_old_connections()
+
+    def leave(self):
+        """Drop out of the ring; peers pick up this node's tables on their next refresh."""
+        from .models import ShardNode
+        self._stopping.set()
+        try:
+            ShardNode.objects.filter(node_id=self.node_id).delete()
+        finally:
+            self._set_members({})
+
+    def members(self):
+        if time.monotonic() - self._refreshed_at > self.refresh_seconds:
+            self.refresh()
+        return self._members
+
+    def refresh(self):
+        from .models import ShardNode
+        live = dict(ShardNode.objects.filter(heartbeat_at__gte=_heartbeat_cutoff()).values_list('node_id', 'base_url'))
+        self._set_members(live)
+
+    def _set_members(self, members):
+        with self._lock:
+            previous = self._ring.nodes
+            self._refreshed_at = time.monotonic()
+            if members == self._members:
+                return
+            self._members = members
+            self._ring = HashRing(members)
+            current = self._ring.nodes
+        if previous != current:
+            log_game(logger, logging.INFO, "Shard ring changed: %s -> %s", previous, current)
+            ownership_changed.send(sender=self.__class__, previous=previous, current=current)
+
+    # --- ownership ---
+    def owner(self, room_code):
+        self.members()
+        return self._ring.owner(room_code.upper())
+
+    def is_local(self, room_code):
+        owner = self.owner(room_code)
+        return owner is None or owner == self.node_id
+
+    def owner_url(self, room_code):
+        owner = self.owner(room_code)
+        return owner, self._members.get(owner)
+
+    def room_code_for(self, game_id):
+        return self.room_codes.get(game_id)
+
+
+def _heartbeat_timeout():
+    return getattr(settings, 'SHARD_HEARTBEAT_TIMEOUT', 15)
+
+
+def _heartbeat_cutoff():
+    return timezone.now() - timedelta(seconds=_heartbeat_timeout())
+
+
+_shard_map = None
+
+
+def shard_map():
+    """The process-wide ShardMap, or None when sharding is off (SHARD_NODE_ID unset)."""
+    global _shard_map
+    node_id = getattr(settings, 'SHARD_NODE_ID', None)
+    if not node_id:
+        return None
+    if _shard_map is None:
+        _shard_map = ShardMap(node_id, settings.SHARD_BASE_URL)
+    return _shard_map
+
+
+def _sign_hop(owner, room_code):
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign(f'{owner}:{room_code}')
+
+
+def _verify_hop(token, node_id):
+    try:
+        value = signing.TimestampSigner(salt=SIGNING_SALT).unsign(token, max_age=HOP_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return value.split(':', 1)[0] == node_id
+
+
+def room_code_for_request(shards, request, view_kwargs):
+    room_code = view_kwargs.get('room_code')
+    if room_code:
+        return room_code.upper()
+    game_id = view_kwargs.get('game_id')
+    if game_id:
+        return shards.room_code_for(game_id)
+    if request.method == 'POST' and request.resolver_match and request.resolver_match.url_name == 'join_room':
+        request.body  # keep the raw body readable for forwarding after POST is parsed
+        return request.POST.get('room_code', '').upper().strip() or None
+    return None
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def forward(request, base_url, token, timeout=10):
+    headers = {}
+    for key, value in request.META.items():
+        if key.startswith('HTTP_'):
+            name = key[5:].replace('_', '-').title()
+            if name.lower() not in HOP_BY_HOP:
+                headers[name] = value
+    if request.META.get('CONTENT_TYPE'):
+        headers['Content-Type'] = request.META['CONTENT_TYPE']
+    # Keep the browser's Host so CSRF origin checks and absolute URLs still line up.
+    headers['Host'] = request.get_host()
+    headers['X-Forwarded-For'] = request.META.get('REMOTE_ADDR', '')
+    headers[FORWARD_HEADER] = token
+
+    body = request.body if request.method not in ('GET', 'HEAD') else None
+    upstream = urllib.request.Request(base_url.rstrip('/') + request.get_full_path(), data=body,
+                                      headers=headers, method=request.method)
+    try:
+        upstream_response = _opener.open(upstream, timeout=timeout)
+    except urllib.error.HTTPError as exc:
+        upstream_response = exc
+
+    with upstream_response:
+        response = HttpResponse(upstream_response.read(), status=upstream_response.status)
+        for name, value in upstream_response.headers.items():
+            lowered = name.lower()
+            if lowered in HOP_BY_HOP or lowered == 'set-cookie':
+                continue
+            response[name] = value
+        for raw in upstream_response.headers.get_all('Set-Cookie') or ():
+            response.cookies.load(raw)
+    return response
+
+
+def _unavailable(reason):
+    response = JsonResponse({'status': 'error', 'message': 'This table is briefly unavailable; try again.'},
+                            status=503)
+    response['Retry-After'] = '1'
+    response['X-Shard-Unavailable'] = reason
+    return response
+
+
+class ShardRoutingMiddleware:
+    def __init__(self, get_response, shards=None):
+        self.get_response = get_response
+        self.shards = shards or shard_map()
+        if self.shards is None:
+            raise MiddlewareNotUsed
+        if shards is None:
+            self.shards.start_heartbeat()
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        token = request.headers.get(FORWARD_HEADER) or request.GET.get(REDIRECT_PARAM)
+        if token and _verify_hop(token, self.shards.node_id):
+            return self._serve_locally()
+
+        room_code = room_code_for_request(self.shards, request, view_kwargs)
+        if not room_code:
+            return None
+        owner, base_url = self.shards.owner_url(room_code)
+        if owner is None or owner == self.shards.node_id or not base_url:
+            return self._serve_locally()
+
+        hop = _sign_hop(owner, room_code)
+        if getattr(settings, 'SHARD_ROUTING', 'proxy') == 'redirect':
+            separator = '&' if request.GET else '?'
+            return HttpResponseRedirect(
+                f"{base_url.rstrip('/')}{request.get_full_path()}{separator}{urllib.parse.urlencode({REDIRECT_PARAM: hop})}",
+                status=307,
+            )
+        try:
+            return forward(request, base_url, hop)
+        except (urllib.error.URLError, OSError):
+            if self.shards.is_alive(owner):
+                # Slow, not gone: it may hold the table in memory, so a second writer here would lose updates.
+                log_game(logger, logging.WARNING, "Shard owner %s did not answer but is heartbeating; refusing",
+                         owner, room_code=room_code)
+                return _unavailable('owner-busy')
+            log_game(logger, logging.WARNING, "Shard owner %s stopped heartbeating; rerouting", owner,
+                     room_code=room_code)
+            # The refresh drops it from the ring, so this retries with the table's next owner.
+            self.shards.refresh()
+            return self.process_view(request, view_func, view_args, view_kwargs)
+
+    def _serve_locally(self):
+        if self.shards.holds_lease():
+            return None
+        # Our heartbeat has lapsed, so a peer may already be serving our tables.
+        return _unavailable('lease-expired')
@@ -0,0 +1,315 @@
+# badam_satti_app/simulator.py
+"""
+Discrete-event simulation of the table lifecycle in virtual time.
+
+Every table is an unsaved ``Game`` driven through the same model methods the
+views and the game socket call -- ``receive_ping`` for ``player_ping``,
+``lifecycle_check_due`` / ``run_lifecycle_checks`` for ``get_game_state``,
+``handle_player_disconnect`` / ``handle_player_reconnect`` for the socket,
+``check_for_game_termination`` for the reconnect watcher, ``room_expired``
+for ``check_room_status`` -- while ``clock.use(VirtualClock())`` makes
+minutes of pings, polls and timeouts pass in one pass over an event heap.
+
+Each table follows one scenario:
+
+* ``steady``: everyone pings and polls; nothing should happen.
+* ``ping_timeout``: one player goes silent. They should be halted 20 s after
+  their last ping, at the next poll, and removed 120 s later.
+* ``reconnect``: one player's socket drops and comes back within the window.
+* ``disconnect_timeout``: one player's socket drops for good; they should be
+  removed (or, at a 2-seat table, the game ended) 120 s later.
+* ``lobby_expiry``: a room that never fills should expire 300 s after it
+  was created.
+
+Clients identify themselves by the name in their player token and have their
+seat looked up on every call, as the views do.
+Every change of state (halted, resumed, removed, terminated, expired, a ping
+refused) is checked against the scenario's expected sequence and time
+window, and anything else is reported as an anomaly. The time spent in each
+model call is reported per path.
+"""
+import heapq
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from . import cadence, clock, dealing, player_tokens
+from .bench import summarize
+from .metrics import json_dumps, json_loads
+from .models import RECONNECT_WINDOW_SECONDS, ROOM_TTL_SECONDS, Game
+
+PING_TIMEOUT_SECONDS = 20  # what get_game_state passes to the lifecycle checks
+PING_INTERVAL = cadence.IDLE_PING_MS / 1000
+POLL_INTERVAL = cadence.IDLE_POLL_MS / 1000
+ROOM_POLL_INTERVAL = 3.0  # waiting-room.js
+WATCH_INTERVAL = 5.0  # consumers.watch_reconnect_timer
+JITTER = 0.1  # each interval is stretched or shrunk by up to this fraction
+FAULT_WINDOW = (10.0, 60.0)  # when the scenario's fault happens
+SETTLE_SECONDS = 2 * PING_TIMEOUT_SECONDS + 30  # how long a table keeps running after its last expected change
+
+SCENARIOS = ('steady', 'ping_timeout', 'reconnect', 'disconnect_timeout', 'lobby_expiry')
+
+
+class Client:
+    __slots__ = ('name', 'pinging', 'last_ping_at')
+
+    def __init__(self, name):
+        self.name = name  # from the player token; the seat is looked up per call
+        self.pinging = True
+        self.last_ping_at = 0.0
+
+
+class Table:
+    def __init__(self, index, scenario, game, clients):
+        self.index = index
+        self.scenario = scenario
+        self.game = game
+        self.clients = clients
+        self.seats = game.num_players
+        self.faulty = None
+        self.fault_at = None
+        self.back_at = None
+        self.end_at = 0.0
+        self.transitions = []  # (virtual seconds, kind, player name)
+        self._state = self._observe()
+
+    def _observe(self):
+        game = self.game
+        players = json_loads(game.players_data)
+        names = {p['player_num']: p['name'] for p in players}
+        return (names.get(game.disconnected_player), frozenset(names.values()),
+                game.game_over and game.terminated_due_to_disconnect, not game.is_game_started and game.room_expired())
+
+    def record(self, at, kind=None, name=None):
+        """Note what changed since the last call; ``kind`` records an event the state does not show."""
+        if kind:
+            self.transitions.append((at, kind, name))
+        (was_away, was_seated, was_terminated, was_expired) = self._state
+        self._state = away, seated, terminated, expired = self._observe()
+        if expired and not was_expired:
+            self.transitions.append((at, 'expired', None))
+        if terminated and not was_terminated:
+            self.transitions.append((at, 'terminated', was_away))
+        for name in sorted(was_seated - seated):
+            self.transitions.append((at, 'removed', name))
+        if away != was_away:
+            if was_away is not None and not terminated and was_away in seated:
+                self.transitions.append((at, 'resumed', was_away))
+            if away is not None:
+                self.transitions.append((at, 'halted', away))
+
+    def expected(self):
+        """[(kind, player name, earliest, latest)], offsets from the previous change (the first from the fault)."""
+        slack = POLL_INTERVAL * (1 + JITTER)
+        name = self.faulty.name if self.faulty else None
+        removal = 'terminated' if self.seats == 2 else 'removed'
+        if self.scenario == 'ping_timeout':
+            return [('halted', name, PING_TIMEOUT_SECONDS, PING_TIMEOUT_SECONDS + slack),
+                    (removal, name, RECONNECT_WINDOW_SECONDS, RECONNECT_WINDOW_SECONDS + slack)]
+        if self.scenario == 'reconnect':
+            return [('halted', name, 0, 0), ('resumed', name, self.back_at - self.fault_at, self.back_at - self.fault_at)]
+        if self.scenario == 'disconnect_timeout':
+            return [('halted', name, 0, 0),
+                    (removal, name, RECONNECT_WINDOW_SECONDS, RECONNECT_WINDOW_SECONDS + min(slack, WATCH_INTERVAL))]
+        if self.scenario == 'lobby_expiry':
+            return [('expired', None, ROOM_TTL_SECONDS, ROOM_TTL_SECONDS + ROOM_POLL_INTERVAL * (1 + JITTER))]
+        return []
+
+    def anomalies(self):
+        found = []
+        base = self.faulty.last_ping_at if self.scenario == 'ping_timeout' else (self.fault_at or 0.0)
+        transitions = list(self.transitions)
+        for kind, name, earliest, latest in self.expected():
+            if not transitions:
+                found.append(self._anomaly('missing', kind, name, base + earliest))
+                return found
+            at, actual_kind, actual_name = transitions.pop(0)
+            if (actual_kind, actual_name) != (kind, name):
+                found.append(self._anomaly('wrong_transition', actual_kind, actual_name, at, expected=kind))
+                return found
+            if not earliest - 1e-6 <= at - base <= latest + 1e-6:
+                found.append(self._anomaly('early' if at - base < earliest else 'late', kind, name, at,
+                                           delay=round(at - base, 3), window=[earliest, round(latest, 3)]))
+            base = at
+        for at, kind, name in transitions:
+            found.append(self._anomaly('unexpected', kind, name, at))
+        return found
+
+    def _anomaly(self, problem, kind, name, at, **detail):
+        return dict(table=self.index, scenario=self.scenario, problem=problem, transition=kind, player=name,
+                    at=round(at, 3), **detail)
+
+
+class TimeoutSimulator:
+    def __init__(self, tables=1000, players=0, seed=0, scenarios=SCENARIOS):
+        self.table_count = tables
+        self.players = players  # 0: a random size from 2 to 8 per table
+        self.rng = random.Random(seed)
+        self.scenarios = scenarios
+        self.tables = []
+        self.samples = defaultdict(list)
+        self._events = []
+        self._seq = 0
+
+    # --- timing ---
+    def _timed(self, path, fn, *args, **kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples[path].append(time.perf_counter() - started)
+        return result
+
+    def _at(self, at, kind, table, client=None):
+        self._seq += 1
+        heapq.heappush(self._events, (at, self._seq, kind, table, client))
+
+    def _interval(self, seconds):
+        return seconds * self.rng.uniform(1 - JITTER, 1 + JITTER)
+
+    # --- tables ---
+    def _build(self, index):
+        scenario = self.scenarios[index % len(self.scenarios)]
+        num_players = self.players or self.rng.randint(2, 8)
+        now = clock.now().isoformat()
+        if scenario == 'lobby_expiry':
+            seated = self.rng.randint(1, num_players - 1)
+            players = [{'player_num': seat, 'name': f't{index}p{seat}', 'hand': [], 'last_ping_time': now}
+                       for seat in range(1, seated + 1)]
+            game = Game(room_code=f'S{index}', num_players=num_players, players_data=json_dumps(players),
+                        seats_taken=seated)
+        else:
+            dealt = dealing.deal(num_players, seed=self.rng.getrandbits(dealing.SEED_BITS))
+            players = [{'player_num': seat, 'name': f't{index}p{seat}', 'hand': dealt.hands[seat],
+                        'last_ping_time': now} for seat in range(1, num_players + 1)]
+            game = Game(room_code=f'S{index}', num_players=num_players, players_data=json_dumps(players),
+                        desk_cards=json_dumps({'H': [], 'D': [], 'C': [], 'S': []}), is_game_started=True,
+                        current_player=dealt.first_player, deal_seed=dealt.seed, seats_taken=num_players)
+
+        table = Table(index, scenario, game, [Client(p['name']) for p in players])
+        if scenario == 'lobby_expiry':
+            table.end_at = ROOM_TTL_SECONDS + SETTLE_SECONDS
+            for client in table.clients:
+                self._at(self.rng.uniform(0, ROOM_POLL_INTERVAL), 'room_poll', table, client)
+            return table
+
+        for client in table.clients:
+            self._at(self.rng.uniform(0, PING_INTERVAL), 'ping', table, client)
+            self._at(self.rng.uniform(0, POLL_INTERVAL), 'poll', table, client)
+        if scenario == 'steady':
+            table.end_at = FAULT_WINDOW[1] + SETTLE_SECONDS
+        else:
+            table.faulty = self.rng.choice(table.clients)
+            table.fault_at = self.rng.uniform(*FAULT_WINDOW)
+            self._at(table.fault_at, 'fault', table, table.faulty)
+            table.end_at = table.fault_at + PING_TIMEOUT_SECONDS + RECONNECT_WINDOW_SECONDS + SETTLE_SECONDS
+            if scenario == 'reconnect':
+                table.back_at = table.fault_at + self.rng.uniform(1.0, RECONNECT_WINDOW_SECONDS - 5)
+                self._at(table.back_at, 'back', table, table.faulty)
+        return table
+
+    # --- events ---
+    def _ping(self, at, table, client):
+        if not client.pinging or table.game.game_over:
+            return
+        away = table.game.disconnected_player
+        seat = player_tokens.seat_of(table.game, client.name)
+        if seat and self._timed('receive_ping', table.game.receive_ping, seat, commit=False):
+            client.last_ping_at = at
+            self._at(at + self._interval(PING_INTERVAL), 'ping', table, client)
+            if table.game.disconnected_player != away:
+                table.record(at)
+        else:
+            # A 403: the page tells the player they are out and leaves.
+            client.pinging = False
+            table.record(at, 'ping_refused', client.name)
+
+    def _poll(self, at, table, client):
+        if not client.pinging or table.game.game_over:
+            return
+        game = table.game
+        if self._timed('lifecycle_check_due', game.lifecycle_check_due, ping_timeout_seconds=PING_TIMEOUT_SECONDS):
+            self._timed('run_lifecycle_checks', game.run_lifecycle_checks,
+                        ping_timeout_seconds=PING_TIMEOUT_SECONDS, commit=False)
+            game._take_pending_moves()
+            table.record(at)
+        self._at(at + self._interval(POLL_INTERVAL), 'poll', table, client)
+
+    def _room_poll(self, at, table, client):
+        if self._timed('room_expired', table.game.room_expired):
+            table.record(at)
+            return
+        self._at(at + self._interval(ROOM_POLL_INTERVAL), 'room_poll', table, client)
+
+    def _fault(self, at, table, client):
+        client.pinging = False
+        if table.scenario == 'ping_timeout':
+            return
+        game = table.game
+        seat = player_tokens.seat_of(game, client.name)
+        # The socket's disconnect handler, then its reconnect watcher.
+        if (seat and game.is_game_started and not game.game_over
+                and self._timed('handle_player_disconnect', game.handle_player_disconnect, seat, commit=False)):
+            table.record(at)
+            self._watch(at, table)
+
+    def _back(self, at, table, client):
+        game = table.game
+        seat = player_tokens.seat_of(game, client.name)
+        if seat and game.disconnected_player == seat and game.is_halted:
+            self._timed('handle_player_reconnect', game.handle_player_reconnect, seat, commit=False)
+            table.record(at)
+        client.pinging = True
+        self._at(at, 'ping', table, client)
+        self._at(at + self._interval(POLL_INTERVAL), 'poll', table, client)
+
+    def _watch(self, at, table, client=None):
+        game = table.game
+        if not game.is_halted:
+            return
+        changed, _ = self._timed('check_for_game_termination', game.check_for_game_termination, commit=False)
+        if changed:
+            game._take_pending_moves()
+            table.record(at)
+            return
+        self._at(at + WATCH_INTERVAL, 'watch', table)
+
+    # --- run ---
+    def run(self):
+        started = time.perf_counter()
+        virtual = clock.VirtualClock()
+        origin = virtual.now()
+        handlers = {'ping': self._ping, 'poll': self._poll, 'room_poll': self._room_poll,
+                    'fault': self._fault, 'back': self._back, 'watch': self._watch}
+        events = 0
+        virtual_seconds = 0.0
+        with clock.use(virtual):
+            self.tables = [self._build(index) for index in range(self.table_count)]
+            while self._events:
+                at, _, kind, table, client = heapq.heappop(self._events)
+                if at > table.end_at:
+                    continue
+                virtual.set(origin + timedelta(seconds=at))
+                handlers[kind](at, table, client)
+                events += 1
+                virtual_seconds = at
+        return self.report(events, virtual_seconds, time.perf_counter() - started)
+
+    def report(self, events, virtual_seconds, wall_seconds):
+        anomalies = [anomaly for table in self.tables for anomaly in table.anomalies()]
+        by_scenario = {}
+        for scenario in self.scenarios:
+            tables = [t for t in self.tables if t.scenario == scenario]
+            broken = {a['table'] for a in anomalies if a['scenario'] == scenario}
+            by_scenario[scenario] = {'tables': len(tables), 'ok': len(tables) - len(broken)}
+        problems = Counter(f"{a['scenario']}: {a['problem']} {a['transition']}" for a in anomalies)
+        return {
+            'tables': len(self.tables),
+            'events': events,
+            'virtual_seconds': virtual_seconds,
+            'wall_seconds': wall_seconds,
+            'scenarios': by_scenario,
+            'paths': {path: summarize(samples) for path, samples in sorted(self.samples.items())},
+            'problems': dict(problems.most_common()),
+            'examples': anomalies[:20],
+        }
+
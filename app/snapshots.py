@@ -0,0 +1,278 @@
+# badam_satti_app/snapshots.py
+"""
+Warm restarts for game actors.
+
+With ``GAME_SNAPSHOT_PATH`` set (and ``GAME_ACTORS`` on), the in-memory state
+of every live actor is written to one binary file every
+``GAME_SNAPSHOT_INTERVAL`` seconds and again when the server exits. The next
+process reads the whole file in one sequential read at startup, checks it,
+and hands each game straight to a new actor, so the first request for a
+table does not have to load and parse its row.
+
+``startup()`` is called by the server entry points (project/asgi.py,
+project/wsgi.py). The last group commit and snapshot run from ``atexit``,
+not from a signal handler: daphne's reactor replaces any SIGTERM handler
+(and exits normally on SIGTERM anyway), and a handler can run while the main
+thread holds the group commit's lock. Where SIGTERM would otherwise kill the
+process outright it is turned into a normal exit, so ``atexit`` runs.
+
+A game is only restored when its row still has the ``last_updated`` stored in
+the snapshot; anything written since (by another process, or after the last
+snapshot) is left to load from the database as usual. A file older than
+``GAME_SNAPSHOT_MAX_AGE`` seconds, from another schema, or failing its CRC is
+ignored altogether.
+
+Layout (little-endian)::
+
+    header   magic 'BSNP', u16 version, f64 written_at, u32 count, u32 fields_len, fields (comma-separated)
+    index    count x (16-byte game_id, u64 offset, u32 length)
+    records  one per game: every concrete field, each a type tag and its value
+    trailer  u32 CRC-32 of everything before it
+
+The index makes the file usable memory-mapped (seek straight to one game);
+restore reads it front to back instead.
+"""
+import atexit
+import datetime
+import logging
+import os
+import signal
+import struct
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .log import log_game
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'BSNP'
+VERSION = 1
+HEADER = struct.Struct('<4sHdII')
+INDEX_ENTRY = struct.Struct('<16sQI')
+CRC = struct.Struct('<I')
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+_INT = struct.Struct('<q')
+_LEN = struct.Struct('<I')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _field_names():
+    from .models import Game
+    return [field.attname for field in Game._meta.concrete_fields]
+
+
+# --- encoding ---
+
+def _encode_value(value, out):
+    if value is None:
+        out.append(b'N')
+    elif value is True:
+        out.append(b'T')
+    elif value is False:
+        out.append(b'F')
+    elif isinstance(value, int):
+        out.append(b'i' + _INT.pack(value))
+    elif isinstance(value, str):
+        data = value.encode()
+        out.append(b's' + _LEN.pack(len(data)) + data)
+    elif isinstance(value, datetime.datetime):
+        delta = value - EPOCH
+        out.append(b'd' + _INT.pack((delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds))
+    elif isinstance(value, uuid.UUID):
+        out.append(b'u' + value.bytes)
+    else:
+        raise SnapshotError(f"Cannot store {type(value).__name__} in a snapshot.")
+
+
+def _decode_value(view, pos):
+    tag = view[pos:pos + 1].tobytes()
+    pos += 1
+    if tag == b'N':
+        return None, pos
+    if tag == b'T':
+        return True, pos
+    if tag == b'F':
+        return False, pos
+    if tag == b'i':
+        return _INT.unpack_from(view, pos)[0], pos + 8
+    if tag == b's':
+        (length,) = _LEN.unpack_from(view, pos)
+        pos += 4
+        return view[pos:pos + length].tobytes().decode(), pos + length
+    if tag == b'd':
+        (micros,) = _INT.unpack_from(view, pos)
+        return EPOCH + datetime.timedelta(microseconds=micros), pos + 8
+    if tag == b'u':
+        return uuid.UUID(bytes=view[pos:pos + 16].tobytes()), pos + 16
+    raise SnapshotError(f"Unknown value tag {tag!r}.")
+
+
+def encode(games):
+    names = _field_names()
+    records = []
+    for game in games:
+        out = []
+        for name in names:
+            _encode_value(getattr(game, name), out)
+        records.append((game.game_id, b''.join(out)))
+
+    fields = ','.join(names).encode()
+    offset = HEADER.size + len(fields) + INDEX_ENTRY.size * len(records)
+    parts = [HEADER.pack(MAGIC, VERSION, time.time(), len(records), len(fields)), fields]
+    for game_id, record in records:
+        parts.append(INDEX_ENTRY.pack(game_id.bytes, offset, len(record)))
+        offset += len(record)
+    parts.extend(record for _, record in records)
+    body = b''.join(parts)
+    return body + CRC.pack(zlib.crc32(body))
+
+
+def decode(data):
+    """(written_at, [Game]) from snapshot bytes; raises SnapshotError for anything unusable."""
+    from .models import Game
+    if len(data) < HEADER.size + CRC.size:
+        raise SnapshotError("Snapshot is truncated.")
+    view = memoryview(data)
+    (crc,) = CRC.unpack_from(view, len(data) - CRC.size)
+    if zlib.crc32(view[:len(data) - CRC.size]) != crc:
+        raise SnapshotError("Snapshot checksum does not match.")
+
+    magic, version, written_at, count, fields_len = HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version != VERSION:
+        raise SnapshotError("Not a game snapshot, or from another version.")
+    names = bytes(view[HEADER.size:HEADER.size + fields_len]).decode().split(',')
+    if names != _field_names():
+        raise SnapshotError("Snapshot was written for another schema.")
+
+    games = []
+    index_at = HEADER.size + fields_len
+    for i in range(count):
+        _, offset, length = INDEX_ENTRY.unpack_from(view, index_at + i * INDEX_ENTRY.size)
+        values, pos = [], offset
+        for _ in names:
+            value, pos = _decode_value(view, pos)
+            values.append(value)
+        if pos != offset + length:
+            raise SnapshotError("Snapshot record is corrupt.")
+        games.append(Game.from_db('default', names, values))
+    return written_at, games
+
+
+# --- files ---
+
+def write(path, games):
+    data = encode(games)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return len(data)
+
+
+def read(path):
+    with open(path, 'rb') as fh:
+        return decode(fh.read())
+
+
+def fresh_games(games, max_age, written_at):
+    """The games whose rows have not changed since the snapshot was written."""
+    from .models import Game
+    if time.time() - written_at > max_age:
+        return []
+    current = dict(Game.objects.filter(game_id__in=[game.game_id for game in games])
+                   .values_list('game_id', 'last_updated'))
+    return [game for game in games if current.get(game.game_id) == game.last_updated]
+
+
+# --- wiring into the actor system ---
+
+def save_now(system):
+    path = settings.GAME_SNAPSHOT_PATH
+    started = time.perf_counter()
+    games = system.snapshots()
+    size = write(path, games)
+    log_game(logger, logging.DEBUG, "Wrote %d games (%d bytes) to %s in %.1f ms.", len(games), size, path,
+             (time.perf_counter() - started) * 1000)
+
+
+def restore(system):
+    path = settings.GAME_SNAPSHOT_PATH
+    if not os.path.exists(path):
+        return 0
+    started = time.perf_counter()
+    try:
+        written_at, games = read(path)
+        fresh = fresh_games(games, getattr(settings, 'GAME_SNAPSHOT_MAX_AGE', 3600), written_at)
+    except (OSError, SnapshotError):
+        log_game(logger, logging.WARNING, "Ignoring game snapshot %s.", path, exc_info=True)
+        return 0
+    finally:
+        close_old_connections()
+    for game in fresh:
+        system.preload(game)
+    log_game(logger, logging.INFO, "Restored %d of %d games from %s in %.1f ms.", len(fresh), len(games), path,
+             (time.perf_counter() - started) * 1000)
+    return len(fresh)
+
+
+def _timer(system, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            save_now(system)
+        except Exception:
+            log_game(logger, logging.ERROR, "Game snapshot failed.", exc_info=True)
+
+
+def start(system):
+    """Restore from the last snapshot, then keep writing one every ``GAME_SNAPSHOT_INTERVAL`` seconds."""
+    restore(system)
+    interval = getattr(settings, 'GAME_SNAPSHOT_INTERVAL', 30)
+    threading.Thread(target=_timer, args=(system, interval), name='game-snapshot', daemon=True).start()
+
+
+def shutdown(system):
+    """Write what the group commit still holds, then a last snapshot."""
+    from . import write_behind
+    try:
+        write_behind.committer.flush()
+        save_now(system)
+    except Exception:
+        log_game(logger, logging.ERROR, "Game snapshot at exit failed.", exc_info=True)
+
+
+def _exit_on_sigterm(signum, frame):
+    sys.exit(128 + signum)
+
+
+def startup():
+    """Restore the actors' games and arrange the last snapshot at exit. A no-op unless both settings are on."""
+    if not (getattr(settings, 'GAME_ACTORS', False) and getattr(settings, 'GAME_SNAPSHOT_PATH', None)):
+        return None
+    from . import actors
+    system = actors.system()
+    start(system)
+    atexit.register(shutdown, system)
+    if (threading.current_thread() is threading.main_thread()
+            and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL):
+        signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    return system
@@ -0,0 +1,404 @@
+// --- Your Full Original Script ---
+const suitIcons = {
+    'H': '<svg viewBox="0 0 100 100" fill="currentColor"><path d="M50,85 C20,65 5,40 5,25 C5,10 20,0 35,0 C50,0 50,20 50,20 C50,20 50,0 65,0 C80,0 95,10 95,25 C95,40 80,65 50,85 Z"/></svg>',
+    'D': '<svg viewBox="0 0 100 100" fill="currentColor"><path d="M50,5 L95,50 L50,95 L5,50 Z"/></svg>',
+    'C': '<svg viewBox="0 0 100 100" fill="currentColor"><circle cx="50" cy="30" r="25"/><circle cx="30" cy="60" r="25"/><circle cx="70" cy="60" r="25"/><path d="M45 75 L55 75 L50 95 Z"/></svg>',
+    'S': '<svg viewBox="0 0 100 100" fill="currentColor"><path d="M50,5 L90,45 A20,20 0 0,1 70,75 L50,95 L30,75 A20,20 0 0,1 10,45 L50,5 Z"/></svg>'
+};
+
+const suitColors = { 'H': 'red-suit', 'D': 'red-suit', 'C': 'black-suit', 'S': 'black-suit' };
+let lastGameState = null;
+let pollTimer = null, reconnectTimerInterval = null, pingTimer = null, rematchWatchInterval = null;
+// The server recommends when to call next (next_poll_ms / next_ping_ms); these are the defaults until it does.
+let pollDelay = 2500, pingDelay = 1000, polling = false, pinging = false;
+let isGamePausedByDisconnect = false;
+// The game socket only says that the table changed; the state itself still comes from get_game_state.
+let gameSocket = null, socketBaseUrl = window.location.origin, socketRetryTimer = null;
+
+function showMessage(message, type = 'info') {
+    const container = document.getElementById('message-container');
+    container.textContent = message;
+    container.className = 'visible';
+    if (type === 'error') container.style.backgroundColor = 'var(--error-red)';
+    else if (type === 'success') container.style.backgroundColor = 'var(--success-green)';
+    else container.style.backgroundColor = 'var(--primary-blue-dark)';
+    setTimeout(() => { container.classList.remove('visible'); }, 3000);
+}
+
+// One timer chain each: the next call is only scheduled once the previous one has answered.
+function schedulePoll() {
+    clearTimeout(pollTimer);
+    if (polling) pollTimer = setTimeout(async () => { await fetchGameState(); schedulePoll(); }, pollDelay);
+}
+function schedulePing() {
+    clearTimeout(pingTimer);
+    if (pinging) pingTimer = setTimeout(async () => { await sendPing(); schedulePing(); }, pingDelay);
+}
+function startAutoRefresh() { if (!polling) { polling = true; schedulePoll(); } }
+function stopAutoRefresh() { polling = false; clearTimeout(pollTimer); pollTimer = null; }
+function startPing() { if (!pinging) { pinging = true; schedulePing(); } }
+function stopPing() { pinging = false; clearTimeout(pingTimer); pingTimer = null; }
+function applyCadence(data) {
+    if (data.next_poll_ms) pollDelay = data.next_poll_ms;
+    if (data.next_ping_ms) pingDelay = data.next_ping_ms;
+}
+function retryAfterMs(response) { return 1000 * (parseInt(response.headers.get('Retry-After')) || 1); }
+
+async function sendPing() {
+    try {
+        const response = await fetch(`/player_ping/${gameId}/`, {
+            method: 'POST', headers: { 'X-CSRFToken': csrfToken, 'X-Player-Token': playerToken, 'Content-Type': 'application/json' }, body: JSON.stringify({})
+        });
+        if (response.status === 429) { pingDelay = Math.max(pingDelay, retryAfterMs(response)); return; }
+        const data = await response.json();
+        if (response.ok) applyCadence(data);
+        else if (response.status === 403) {
+            showMessage(data.message, 'error'); stopAutoRefresh(); stopPing();
+            setTimeout(() => window.location.href = '/', 3000);
+        }
+    } catch (error) { console.error("Error sending ping:", error); }
+}
+
+function openGameSocket(roomCode) {
+    clearTimeout(socketRetryTimer);
+    socketRetryTimer = null;
+    const url = new URL(`/ws/game/${roomCode}/`, socketBaseUrl);
+    url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:';
+    // The token, not the session cookie: after a redirect the socket is on another host.
+    url.search = new URLSearchParams({ game_id: gameId, token: playerToken });
+    let redirectTo = null;
+    const socket = gameSocket = new WebSocket(url);
+    socket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === 'shard_redirect') redirectTo = data.base_url;
+        else if (data.type !== 'error') fetchGameState();
+    };
+    socket.onclose = (event) => {
+        if (gameSocket !== socket) return;
+        gameSocket = null;
+        if (event.code === 4307 && redirectTo && redirectTo !== socketBaseUrl) {
+            // Another node owns this table: reconnect there straight away.
+            socketBaseUrl = redirectTo;
+            openGameSocket(roomCode);
+        } else if (polling) {
+            // Polling carries on meanwhile; try the socket again later.
+            socketRetryTimer = setTimeout(() => openGameSocket(roomCode), 5000);
+        }
+    };
+}
+function closeGameSocket() {
+    clearTimeout(socketRetryTimer);
+    socketRetryTimer = null;
+    const socket = gameSocket;
+    gameSocket = null;
+    if (socket) socket.close();
+}
+
+function renderCard(card_num, card_name, isPlayable = false) {
+    const rank = card_name.length === 2 ? card_name[0] : card_name.substring(0, 2);
+    const suit = card_name.slice(-1);
+    const cardDiv = document.createElement('div');
+    cardDiv.className = `card ${suitColors[suit]} ${isPlayable ? 'playable-card' : 'disabled'}`;
+    cardDiv.dataset.cardNum = card_num;
+    cardDiv.dataset.cardName = card_name;
+    cardDiv.innerHTML = `<div class="rank-top">${rank}</div><div class="suit-middle">${suitIcons[suit]}</div><div class="rank-bottom">${rank}</div>`;
+    return cardDiv;
+}
+
+function renderYourHand(hand, validMoves, isYourTurn, isGamePaused) {
+    const handContainer = document.getElementById('player-hand-bottom');
+    handContainer.innerHTML = '';
+    hand.sort((a, b) => a[0] - b[0]).forEach(card => {
+        const isPlayable = validMoves.includes(card[0]) && isYourTurn && !isGamePaused;
+        const cardElement = renderCard(card[0], card[1], isPlayable);
+        if (isPlayable) cardElement.addEventListener('click', handleCardClick);
+        handContainer.appendChild(cardElement);
+    });
+}
+
+function renderOtherPlayers(players, yourPlayerNum, currentPlayerTurn, isGamePaused) {
+    const container = document.getElementById('player-hands-top');
+    container.innerHTML = '';
+    players.forEach(player => {
+        if (player.player_num !== yourPlayerNum) {
+            const wrapper = document.createElement('div');
+            wrapper.className = 'player-hand-wrapper';
+            if (player.player_num === currentPlayerTurn && !isGamePaused) {
+                wrapper.classList.add('active-turn');
+            }
+
+            const infoDiv = document.createElement('div');
+            infoDiv.className = 'player-info';
+            infoDiv.textContent = `${player.name} ${player.player_num === 1 ? '(Host)' : ''}`;
+            if (player.player_num === currentPlayerTurn && !isGamePaused) {
+                infoDiv.classList.add('current-player-indicator');
+            }
+
+            const stackDiv = document.createElement('div');
+            stackDiv.className = `other-player-cards-stack ${player.hand_size === 0 ? 'no-cards' : ''}`;
+            stackDiv.innerHTML = `<div class="card-count-overlay">${player.hand_size}</div>`;
+
+            wrapper.appendChild(infoDiv);
+            wrapper.appendChild(stackDiv);
+            container.appendChild(wrapper);
+        }
+    });
+}
+
+function renderDesk(deskCards) {
+    ['H', 'D', 'C', 'S'].forEach(suit => {
+        const suitRow = document.getElementById(`desk-${suit}`);
+        suitRow.querySelectorAll('.card').forEach(c => c.remove());
+        if (deskCards[suit]) {
+            deskCards[suit].sort((a, b) => a[0] - b[0]).forEach(card => {
+                suitRow.appendChild(renderCard(card[0], card[1], false));
+            });
+        }
+    });
+}
+
+async function handleCardClick(event) {
+    const cardElement = event.currentTarget;
+    if (isGamePausedByDisconnect) { showMessage("Game is paused.", 'error'); return; }
+    const cardNum = parseInt(cardElement.dataset.cardNum);
+    document.querySelectorAll('#player-hand-bottom .card').forEach(c => {
+        c.classList.add('disabled');
+        c.classList.remove('playable-card');
+    });
+    try {
+        const response = await fetch(`/play_card/${gameId}/`, {
+            method: 'POST', headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken, 'X-Player-Token': playerToken },
+            body: JSON.stringify({ card_num: cardNum })
+        });
+        const data = await response.json();
+        if (!response.ok) {
+           showMessage(data.message || 'Invalid move.', 'error');
+        }
+    } catch (error) { showMessage('Network error occurred.', 'error'); }
+    finally { fetchGameState(); }
+}
+
+function updateGameStatus(gs) {
+    const statusDiv = document.getElementById('game-status-message');
+    const passBtn = document.getElementById('pass-turn-button');
+    const overControls = document.getElementById('game-over-controls');
+    const hintEmoji = document.getElementById('pass-button-hint-emoji');
+    const spacer = document.querySelector('.pass-button-left-spacer');
+    const isYourTurn = gs.your_player_num === gs.current_player_turn;
+    isGamePausedByDisconnect = gs.disconnected_player !== null;
+    const scorecardSection = document.getElementById('scorecard-section');
+    const scorecardBody = document.getElementById('scorecard-body');
+
+    if (gs.game_over) {
+        statusDiv.textContent = gs.message || "Game Over!";
+        statusDiv.style.color = gs.terminated_due_to_disconnect ? 'var(--error-red)' : 'var(--success-green)';
+        passBtn.style.display = 'none';
+        overControls.style.display = 'block';
+        hintEmoji.classList.remove('visible-emoji');
+        spacer.classList.remove('active-spacer');
+        stopAutoRefresh();
+        stopPing();
+        watchForRematch(gs.round_number);
+        if (gs.scores && gs.scores.length > 0) {
+            scorecardBody.innerHTML = '';
+            gs.scores.forEach((player, index) => {
+                const rank = index + 1;
+                const row = `<tr style="background-color: ${rank === 1 ? '#e8f5e9' : 'transparent'}; font-weight: ${rank === 1 ? 'bold' : 'normal'};">
+                    <td style="padding: 10px 15px;">${rank === 1 ? '🏆' : rank}</td>
+                    <td style="padding: 10px 15px;">${player.name}${gs.round_number > 1 || gs.match_scores[player.name] ? ` (match: ${(gs.match_scores[player.name] || 0) + player.score})` : ''}</td>
+                    <td style="padding: 10px 15px;">${player.score}</td>
+                    <td style="padding: 10px 15px;">${player.remaining_cards}</td>
+                </tr>`;
+                scorecardBody.innerHTML += row;
+            });
+            scorecardSection.style.display = 'block';
+        }
+    } else if (isGamePausedByDisconnect) {
+        const pName = gs.players.find(p => p.player_num === gs.disconnected_player)?.name;
+        statusDiv.textContent = `Game paused: ${pName || 'Player'} has disconnected.`;
+        statusDiv.style.color = 'var(--warning-yellow)';
+        passBtn.disabled = true;
+        hintEmoji.classList.remove('visible-emoji');
+        spacer.classList.remove('active-spacer');
+    } else {
+        const pName = gs.players.find(p => p.player_num === gs.current_player_turn)?.name;
+        statusDiv.textContent = isYourTurn ? 'Your Turn!' : `${pName || 'Player'}'s Turn`;
+        statusDiv.style.color = isYourTurn ? 'var(--success-green)' : 'var(--dark-text)';
+        const canPass = gs.valid_moves.length === 0;
+        passBtn.disabled = !isYourTurn;
+        if (isYourTurn && canPass) {
+            hintEmoji.classList.add('visible-emoji');
+            spacer.classList.add('active-spacer');
+        } else {
+            hintEmoji.classList.remove('visible-emoji');
+            spacer.classList.remove('active-spacer');
+        }
+    }
+}
+
+async function fetchGameState() {
+    if (lastGameState && lastGameState.game_over) return;
+    try {
+        const response = await fetch(`/get_game_state/${gameId}/`, { headers: { 'X-Player-Token': playerToken } });
+        if (response.status === 429) { pollDelay = Math.max(pollDelay, retryAfterMs(response)); return; }
+        if (!response.ok) throw new Error(`HTTP error ${response.status}`);
+        const gs = await response.json();
+        applyCadence(gs);
+        delete gs.next_poll_ms;
+        delete gs.next_ping_ms;
+        if (JSON.stringify(gs) === JSON.stringify(lastGameState)) return;
+
+        if (gs.auto_passed && gs.auto_passed.length && (!lastGameState || lastGameState.move_count !== gs.move_count)) {
+            const names = gs.auto_passed.map(num => gs.players.find(p => p.player_num === num)?.name || `Player ${num}`);
+            showMessage(`${names.join(', ')} had no move and passed automatically.`);
+        }
+
+        renderYourHand(gs.your_hand, gs.valid_moves, gs.your_player_num === gs.current_player_turn, gs.disconnected_player !== null);
+        renderOtherPlayers(gs.players, gs.your_player_num, gs.current_player_turn, gs.disconnected_player !== null);
+        renderDesk(gs.desk_cards);
+        updateGameStatus(gs);
+
+        const recMsgDiv = document.getElementById('reconnect-message');
+        if (gs.disconnected_player) {
+            recMsgDiv.style.display = 'block';
+            const pName = gs.players.find(p => p.player_num === gs.disconnected_player)?.name || 'A player';
+            document.getElementById('reconnect-text').textContent = `${pName} has disconnected. The game is paused.`;
+            startReconnectTimer(gs.reconnect_time_left);
+        } else {
+            recMsgDiv.style.display = 'none';
+            stopReconnectTimer();
+        }
+        lastGameState = gs;
+        if (!gameSocket && !socketRetryTimer && !gs.game_over) openGameSocket(gs.room_code);
+    } catch (error) {
+        console.error("Fetch error:", error);
+        showMessage('Lost server connection.', 'error');
+        stopAutoRefresh();
+        stopPing();
+    }
+}
+
+// After a game ends, someone else at the table may start a rematch in this same room.
+function watchForRematch(finishedRound) {
+    if (rematchWatchInterval) return;
+    rematchWatchInterval = setInterval(async () => {
+        try {
+            const response = await fetch(`/get_game_state/${gameId}/`, { headers: { 'X-Player-Token': playerToken } });
+            const gs = await response.json();
+            if (response.ok && gs.round_number !== finishedRound) resumeAfterRematch();
+        } catch (error) { console.error("Rematch check failed:", error); }
+    }, 5000);
+}
+
+function resumeAfterRematch() {
+    clearInterval(rematchWatchInterval);
+    rematchWatchInterval = null;
+    lastGameState = null;
+    document.getElementById('game-over-controls').style.display = 'none';
+    document.getElementById('scorecard-section').style.display = 'none';
+    document.getElementById('pass-turn-button').style.display = '';
+    showMessage('New round dealt!', 'success');
+    fetchGameState();
+    startAutoRefresh();
+    startPing();
+}
+
+document.getElementById('rematch-button').addEventListener('click', async () => {
+    try {
+        const response = await fetch(`/rematch/${gameId}/`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken, 'X-Player-Token': playerToken },
+            body: JSON.stringify({ round: lastGameState.round_number, keep_scores: document.getElementById('keep-scores').checked })
+        });
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.message);
+        resumeAfterRematch();
+    } catch (error) { showMessage(error.message, 'error'); }
+});
+
+function stopReconnectTimer() {
+    if (reconnectTimerInterval) clearInterval(reconnectTimerInterval);
+    reconnectTimerInterval = null;
+}
+
+function startReconnectTimer(initialTime) {
+    stopReconnectTimer();
+    let timeLeft = initialTime;
+    const timerElement = document.getElementById('reconnect-timer');
+    if (timerElement) timerElement.textContent = timeLeft;
+    reconnectTimerInterval = setInterval(() => {
+        timeLeft--;
+        if (timeLeft >= 0 && timerElement) {
+            timerElement.textContent = timeLeft;
+        } else {
+            stopReconnectTimer();
+            fetchGameState();
+        }
+    }, 1000);
+}
+
+document.getElementById('pass-turn-button').addEventListener('click', async () => {
+    if (isGamePausedByDisconnect) return;
+    try {
+        const response = await fetch(`/pass_turn/${gameId}/`, {
+            method: 'POST', headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken, 'X-Player-Token': playerToken }
+        });
+        if (!response.ok) { const data = await response.json(); throw new Error(data.message); }
+        showMessage("Turn passed.", 'success');
+    } catch (error) { showMessage(error.message, 'error'); }
+    finally { fetchGameState(); }
+});
+
+document.addEventListener('DOMContentLoaded', () => {
+    fetchGameState();
+    startAutoRefresh();
+    startPing();
+
+    const modalOverlay = document.getElementById('rules-modal-overlay');
+    const contentContainer = document.getElementById('rules-content-container');
+    const closeBtn = modalOverlay.querySelector('.modal-close-btn');
+
+    const openModal = () => {
+        if (contentContainer.innerHTML.trim() === '') {
+            contentContainer.innerHTML = '<p>Loading rules...</p>';
+            fetch(rulesUrl)
+                .then(response => response.text())
+                .then(html => {
+                    const parser = new DOMParser();
+                    const doc = parser.parseFromString(html, 'text/html');
+                    const rulesBody = doc.querySelector('.rules-container');
+                    if (rulesBody) {
+                        const backLink = rulesBody.querySelector('.back-link');
+                        if (backLink) backLink.remove();
+                        contentContainer.innerHTML = rulesBody.outerHTML;
+                    }
+                }).catch(err => {
+                    contentContainer.innerHTML = '<p>Sorry, could not load the rules.</p>';
+                    console.error('Failed to fetch rules:', err);
+                });
+        }
+        modalOverlay.style.display = 'flex';
+    };
+    const closeModal = () => {
+        modalOverlay.style.display = 'none';
+    };
+
+    const rulesBtnGame = document.getElementById('rules-trigger-game');
+    if (rulesBtnGame) {
+        rulesBtnGame.addEventListener('click', function(e) {
+            e.preventDefault();
+            openModal();
+        });
+    }
+    if(closeBtn) closeBtn.addEventListener('click', closeModal);
+    modalOverlay.addEventListener('click', function(event) {
+        if (event.target === modalOverlay) {
+            closeModal();
+        }
+    });
+});
+window.addEventListener('beforeunload', () => {
+    stopAutoRefresh();
+    stopPing();
+    closeGameSocket();
+});
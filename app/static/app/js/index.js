@@ -0,0 +1,123 @@
+// showAlert function for popups
+function showAlert(message) {
+  const overlay = document.getElementById("custom-alert-overlay");
+  const alertMessage = document.getElementById("custom-alert-message");
+  const alertButton = document.getElementById("custom-alert-button");
+
+  alertMessage.textContent = message;
+  overlay.classList.add("visible");
+
+  const closeAlert = () => {
+    overlay.classList.remove("visible");
+    alertButton.removeEventListener("click", closeAlert);
+  };
+  alertButton.addEventListener("click", closeAlert);
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+  const createRoomForm = document.getElementById("createRoomForm");
+  const playerNameInput = document.getElementById("player-name");
+  const playerCountButtons =
+    document.querySelectorAll(".player-count-btn");
+  const selectedNumPlayersInput = document.getElementById(
+    "selected_num_players"
+  );
+  playerCountButtons.forEach((button) => {
+    button.addEventListener("click", function () {
+      playerCountButtons.forEach((btn) =>
+        btn.classList.remove("selected")
+      );
+      this.classList.add("selected");
+      selectedNumPlayersInput.value = this.dataset.players;
+    });
+  });
+
+  createRoomForm.addEventListener("submit", function (e) {
+    const playerName = playerNameInput.value.trim();
+    if (!playerName) {
+      e.preventDefault(); 
+      showAlert("Please enter your name!");
+      playerNameInput.focus();
+      return false;
+    }
+  });
+
+  // Quick match: queue for a table of the selected size and poll until seated.
+  const playNowBtn = document.getElementById("playNowBtn");
+  playNowBtn.addEventListener("click", function () {
+    if (!playerNameInput.value.trim()) {
+      showAlert("Please enter your name!");
+      playerNameInput.focus();
+      return;
+    }
+    playNowBtn.disabled = true;
+    playNowBtn.textContent = "Finding a table...";
+    fetch(playNowUrl, { method: "POST", body: new FormData(createRoomForm) })
+      .then((response) => response.json())
+      .then((data) => {
+        if (data.status !== "queued") throw new Error(data.message);
+        const poll = () =>
+          fetch(data.poll_url)
+            .then((response) => response.json())
+            .then((state) => {
+              if (state.status === "matched") {
+                window.location.href = state.redirect_url;
+              } else if (state.status === "waiting") {
+                setTimeout(poll, 1000);
+              } else {
+                throw new Error(state.message);
+              }
+            });
+        return poll();
+      })
+      .catch((err) => {
+        playNowBtn.disabled = false;
+        playNowBtn.innerHTML = '<i class="fas fa-bolt"></i> Play Now';
+        showAlert(err.message || "Could not find a table. Please try again.");
+      });
+  });
+
+  const rulesBtn = document.getElementById("rules-btn");
+  const modalOverlay = document.getElementById("rules-modal-overlay");
+  const contentContainer = document.getElementById(
+    "rules-content-container"
+  );
+  const closeBtn = modalOverlay.querySelector(".modal-close-btn");
+
+  const openModal = () => {
+    if (contentContainer.innerHTML.trim() === "") {
+      contentContainer.innerHTML = "<p>Loading rules...</p>";
+      fetch(rulesUrl)
+        .then((response) => response.text())
+        .then((html) => {
+          const parser = new DOMParser();
+          const doc = parser.parseFromString(html, "text/html");
+          const rulesBody = doc.querySelector(".rules-container");
+          if (rulesBody) {
+            const backLink = rulesBody.querySelector(".back-link");
+            if (backLink) backLink.remove();
+            contentContainer.innerHTML = rulesBody.outerHTML;
+          }
+        })
+        .catch((err) => {
+          contentContainer.innerHTML =
+            "<p>Sorry, could not load the rules.</p>";
+          console.error("Failed to fetch rules:", err);
+        });
+    }
+    modalOverlay.style.display = "flex";
+  };
+
+  const closeModal = () => {
+    modalOverlay.style.display = "none";
+  };
+
+  if (rulesBtn) rulesBtn.addEventListener("click", openModal);
+  if (closeBtn) closeBtn.addEventListener("click", closeModal);
+
+  modalOverlay.addEventListener("click", function (event) {
+    if (event.target === modalOverlay) {
+      closeModal();
+    }
+  });
+});
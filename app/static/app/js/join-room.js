@@ -0,0 +1,68 @@
+// JS from original k_join-room.html is preserved.
+// It's compatible with the new element IDs.
+document.addEventListener('DOMContentLoaded', () => {
+    const roomCodeInput = document.getElementById('roomCode');
+    const playerNameInput = document.getElementById('playerName');
+
+    // Auto-fill Room Code from URL query parameter if present
+    const urlParams = new URLSearchParams(window.location.search);
+    const roomCodeFromUrl = urlParams.get('room_code');
+    if (roomCodeFromUrl) {
+        roomCodeInput.value = roomCodeFromUrl.toUpperCase();
+        playerNameInput.focus();
+    }
+
+    // Convert room code to uppercase as the user types
+    roomCodeInput.addEventListener('input', () => {
+        roomCodeInput.value = roomCodeInput.value.toUpperCase();
+    });
+
+    // Public tables: the full list once, then one update per room change.
+    const lobbyList = document.getElementById('lobbyList');
+    const lobbyRooms = new Map();
+
+    function renderLobby() {
+        lobbyList.innerHTML = '';
+        const rooms = [...lobbyRooms.values()].sort((a, b) => a.created_at.localeCompare(b.created_at));
+        for (const room of rooms) {
+            const item = document.createElement('li');
+            item.textContent = room.room_code;
+            const seats = document.createElement('span');
+            seats.textContent = `${room.seats_taken}/${room.num_players} seated`;
+            item.appendChild(seats);
+            item.addEventListener('click', () => {
+                roomCodeInput.value = room.room_code;
+                playerNameInput.focus();
+            });
+            lobbyList.appendChild(item);
+        }
+        document.getElementById('lobbyHint').style.display = rooms.length ? '' : 'none';
+    }
+
+    function showRooms(rooms) {
+        lobbyRooms.clear();
+        rooms.forEach(room => lobbyRooms.set(room.room_code, room));
+        renderLobby();
+    }
+
+    const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const lobbySocket = new WebSocket(`${scheme}://${window.location.host}/ws/lobby/`);
+    lobbySocket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === 'lobby') {
+            showRooms(data.rooms);
+        } else if (data.type === 'lobby_update') {
+            if (data.room.open) {
+                lobbyRooms.set(data.room.room_code, data.room);
+            } else {
+                lobbyRooms.delete(data.room.room_code);
+            }
+            renderLobby();
+        }
+    };
+    lobbySocket.onerror = () => {
+        // No socket (plain WSGI server): show the list as it is now.
+        fetch('/lobby/').then(response => response.json()).then(data => showRooms(data.rooms));
+    };
+    renderLobby();
+});
@@ -0,0 +1,191 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // --- Your Full Original Script ---
+    const roomCode = document.getElementById('room-code-display').textContent;
+    const playersListDiv = document.getElementById('players-list');
+    const playerCountSpan = document.getElementById('player-count');
+    const numPlayersNeededSpan = document.getElementById('num-players-needed');
+    const startBtn = document.getElementById('start-game-btn');
+    const gameId = startBtn ? startBtn.dataset.gameId : null;
+    let countdownInterval = null;
+    function displayMessage(message, type = 'info') {
+        const messageBox = document.getElementById('message-box');
+        if (!messageBox) return;
+        messageBox.textContent = message;
+        messageBox.style.backgroundColor = type === 'error' ? '#dc3545' : type === 'success' ? '#28a745' : '#007bff';
+        Object.assign(messageBox.style, { opacity: '1', top: '20px' });
+        setTimeout(() => { Object.assign(messageBox.style, { opacity: '0', top: '-50px' }); }, 3000);
+    }
+    function startCountdown(duration) {
+        if (countdownInterval) clearInterval(countdownInterval);
+        let timer = duration;
+        const timerElement = document.getElementById('countdown-timer');
+        countdownInterval = setInterval(() => {
+            let minutes = parseInt(timer / 60, 10).toString().padStart(2, '0');
+            let seconds = parseInt(timer % 60, 10).toString().padStart(2, '0');
+            if (timerElement) timerElement.textContent = `${minutes}:${seconds}`;
+            if (--timer < 0) {
+                clearInterval(countdownInterval);
+                if (timerElement) timerElement.textContent = "00:00";
+            }
+        }, 1000);
+    }
+    function updatePlayerList(players) {
+        playersListDiv.innerHTML = '';
+        playerCountSpan.textContent = players.length;
+        const colors = ['#298DDC', '#4CAF50', '#FF5722', '#9C27B0', '#00BCD4', '#FFEB3B'];
+        players.forEach((player, index) => {
+            const playerCard = document.createElement('div');
+            playerCard.className = 'player-card';
+            const playerNumber = player.player_num || (index + 1);
+            const initials = player.name ? player.name.substring(0, 2).toUpperCase() : 'P' + playerNumber;
+            const avatarColor = colors[index % colors.length];
+            let statusText = playerNumber === 1 ? '(Host)' : '(Joined)';
+            playerCard.innerHTML = `
+                <div class="player-avatar" style="background-color: ${avatarColor};">
+                    <span>${initials}</span>
+                </div>
+                <div class="player-info">
+                    <span class="player-name">${player.name}</span>
+                    <span class="player-status">${statusText}</span>
+                </div>
+                ${(isHost && playerNumber !== 1) ? `<button class="remove-player-btn" data-player-num="${playerNumber}"><i class="fas fa-times-circle"></i></button>` : ''}
+            `;
+            playersListDiv.appendChild(playerCard);
+            if (isHost && playerNumber !== 1) {
+                const removeBtn = playerCard.querySelector('.remove-player-btn');
+                removeBtn.addEventListener('click', (e) => {
+                    const playerNumToRemove = e.currentTarget.dataset.playerNum;
+                    if (confirm(`Are you sure you want to remove ${player.name}?`)) {
+                        removePlayer(playerNumToRemove);
+                    }
+                });
+            }
+        });
+    }
+    function removePlayer(playerNum) {
+        if (!gameId) return;
+        const url = `/remove_player/${gameId}/`;
+        fetch(url, { 
+            method: 'POST', 
+            body: JSON.stringify({ player_num_to_remove: playerNum }),
+            headers: { 'X-CSRFToken': csrfToken, 'Content-Type': 'application/json' }
+        })
+        .then(response => response.json())
+        .then(data => {
+            displayMessage(data.message, data.status === 'success' ? 'success' : 'error');
+            if (data.status === 'success') pollRoomStatus();
+        })
+        .catch(error => console.error('Error removing player:', error));
+    }
+    function pollRoomStatus() {
+        if (!roomCode) return;
+        fetch(`/check_room_status/${roomCode}/`)
+            .then(response => {
+                if (response.status === 429) {
+                    setTimeout(pollRoomStatus, 1000 * (parseInt(response.headers.get('Retry-After')) || 3));
+                    return null;
+                }
+                return response.json();
+            })
+            .then(data => {
+                if (!data) return;
+                if (data.status === 'started' || data.status === 'redirect' || data.status === 'expired') {
+                    clearInterval(countdownInterval);
+                    window.location.href = data.redirect_url || '/index/';
+                } else if (data.status === 'waiting') {
+                    updatePlayerList(data.current_players);
+                    if (data.time_left_seconds !== undefined) startCountdown(data.time_left_seconds);
+                    const currentPlayers = data.current_players.length;
+                    const numPlayersNeeded = parseInt(numPlayersNeededSpan.textContent);
+                    const statusText = document.getElementById('player-count-status');
+                    statusText.textContent = `Waiting for Players (${currentPlayers}/${numPlayersNeeded})`;
+                    if (startBtn) {
+                        const startBtnText = startBtn.nextElementSibling;
+                        if (currentPlayers >= numPlayersNeeded) {
+                            startBtn.disabled = false;
+                            if(startBtnText) startBtnText.textContent = 'All players have joined! Ready to start.';
+                        } else {
+                            startBtn.disabled = true;
+                            if(startBtnText) startBtnText.textContent = `Waiting for ${numPlayersNeeded - currentPlayers} more player(s)...`;
+                        }
+                    }
+                    setTimeout(pollRoomStatus, 3000);
+                }
+            })
+            .catch(error => {
+                displayMessage('Room not found or expired. Redirecting...', 'error');
+                clearInterval(countdownInterval);
+                setTimeout(() => window.location.href = '/index/', 3000);
+            });
+    }
+    if (startBtn) {
+        startBtn.addEventListener('click', () => {
+            if (!gameId) return;
+            startBtn.disabled = true;
+            startBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Starting...';
+            fetch(`/start_game/${gameId}/`, { method: 'POST', headers: { 'X-CSRFToken': csrfToken }})
+            .then(response => response.json())
+            .then(data => {
+                if (data.status === 'success' && data.redirect_url) {
+                    window.location.href = data.redirect_url;
+                } else {
+                    displayMessage(data.message, 'error');
+                    startBtn.disabled = false;
+                    startBtn.innerHTML = '<i class="fas fa-play"></i> Start Game';
+                }
+            });
+        });
+    }
+    const copyBtn = document.getElementById('copy-btn');
+    const roomLinkInput = document.getElementById('room-link');
+    copyBtn.addEventListener('click', () => {
+        roomLinkInput.select();
+        document.execCommand('copy');
+        displayMessage('Link copied to clipboard!', 'success');
+    });
+    pollRoomStatus();
+
+    /* --- INSERTED: JAVASCRIPT FOR RULES MODAL --- */
+    const modalOverlay = document.getElementById('rules-modal-overlay');
+    const contentContainer = document.getElementById('rules-content-container');
+    const closeBtn = modalOverlay.querySelector('.modal-close-btn');
+
+    const openModal = () => {
+        if (contentContainer.innerHTML.trim() === '') {
+            contentContainer.innerHTML = '<p>Loading rules...</p>';
+            fetch(rulesUrl)
+                .then(response => response.text())
+                .then(html => {
+                    const parser = new DOMParser();
+                    const doc = parser.parseFromString(html, 'text/html');
+                    const rulesBody = doc.querySelector('.rules-container');
+                    if (rulesBody) {
+                        const backLink = rulesBody.querySelector('.back-link');
+                        if (backLink) backLink.remove();
+                        contentContainer.innerHTML = rulesBody.outerHTML;
+                    }
+                }).catch(err => {
+                    contentContainer.innerHTML = '<p>Sorry, could not load the rules.</p>';
+                    console.error('Failed to fetch rules:', err);
+                });
+        }
+        modalOverlay.style.display = 'flex';
+    };
+    const closeModal = () => {
+        modalOverlay.style.display = 'none';
+    };
+
+    const rulesBtnLobby = document.getElementById('rules-trigger-lobby');
+    if (rulesBtnLobby) {
+        rulesBtnLobby.addEventListener('click', function(e) {
+            e.preventDefault();
+            openModal();
+        });
+    }
+    if(closeBtn) closeBtn.addEventListener('click', closeModal);
+    modalOverlay.addEventListener('click', function(event) {
+        if (event.target === modalOverlay) {
+            closeModal();
+        }
+    });
+});
@@ -1,3 +1,883 @@
-from django.test import TestCase
+import asyncio
+import copy
+import io
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.exceptions import ChannelFull
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import JsonResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from project.asgi import application
+
+from . import (actors, cadence, clock, db_writer, dealing, matchmaking, metrics, ops, pages, player_tokens, profiling, replay,
+               resp_standin, sharding, simulator, snapshots, throttle, write_behind)
+from .channel_layers import RespChannelLayer
+from .loadtest import InProcessClient, LoadTest
+from .log import QueueWriterHandler, log_game
+from .management.commands.bench_engine import build_mid_game
+from .models import ROOM_TTL_SECONDS, Game, GameMove, ShardNode
+from .room_codes import CODE_SPACE, MAX_INSERT_ATTEMPTS, ROOM_CODE_ALPHABET, RoomCodeAllocator
+
+
+@override_settings(SQLITE_SERIALIZED_WRITES=True)
+class SingleWriterTest(TransactionTestCase):
+    def test_writes_run_in_order_on_one_thread_and_raise_in_the_caller(self):
+        ran = []
+
+        def write(n):
+            ran.append((n, threading.current_thread().name))
+            return n
+
+        futures = [db_writer.writer.submit(write, n) for n in range(50)]
+        self.assertEqual([future.result(5) for future in futures], list(range(50)))
+        self.assertEqual(ran, [(n, 'game-db-writer') for n in range(50)])
+
+        def fail():
+            raise IntegrityError('duplicate room code')
+
+        with self.assertRaisesRegex(IntegrityError, 'duplicate room code'):
+            db_writer.run_write(fail)
+        self.assertEqual(db_writer.run_write(lambda: threading.current_thread().name), 'game-db-writer')
+        with transaction.atomic():
+            # Inside a transaction the write stays on the caller's connection.
+            self.assertEqual(db_writer.run_write(lambda: threading.current_thread().name),
+                             threading.current_thread().name)
+
+        async def from_the_event_loop():
+            name = await db_writer.arun_write(lambda: threading.current_thread().name)
+            with self.assertRaises(IntegrityError):
+                await db_writer.arun_write(fail)
+            return name
+
+        self.assertEqual(asyncio.run(from_the_event_loop()), 'game-db-writer')
+        room_code = db_writer.run_write(lambda: Game.objects.create(room_code='DBW001', num_players=2).room_code)
+        self.assertTrue(Game.objects.filter(room_code=room_code).exists())
+
+
+class StructuredLogTest(TestCase):
+    def test_log_game_writes_one_json_object_per_line_off_the_calling_thread(self):
+        stream = io.StringIO()
+        handler = QueueWriterHandler(stream)
+        logger = logging.getLogger('app.tests.structured')
+        logger.addHandler(handler)
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        self.addCleanup(logger.removeHandler, handler)
+        game = Game(room_code='LOG001')
+
+        log_game(logger, logging.INFO, "Player %s joined.", 2, game=game, player_num=2)
+        log_game(logger, logging.DEBUG, "Not written: %s", object())
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            log_game(logger, logging.ERROR, "Move failed.", game_id='g-1', exc_info=True)
+        handler.close()  # waits for the writer thread to drain the queue
+
+        joined, failed = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual({key: joined[key] for key in ('level', 'logger', 'msg', 'game_id', 'room_code', 'player_num')},
+                         {'level': 'INFO', 'logger': 'app.tests.structured', 'msg': 'Player 2 joined.',
+                          'game_id': str(game.game_id), 'room_code': 'LOG001', 'player_num': 2})
+        self.assertRegex(joined['ts'], r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z$')
+        self.assertEqual((failed['game_id'], failed['msg']), ('g-1', 'Move failed.'))
+        self.assertNotIn('room_code', failed)
+        self.assertIn('ZeroDivisionError', failed['exc'])
+
+
+class BenchEngineTest(TestCase):
+    def test_benchmarks_run_on_a_mid_game_and_flag_regressions(self):
+        game = build_mid_game(4, seed=11)
+        self.assertEqual(sum(len(cards) for cards in json.loads(game.desk_cards).values()), 26)
+        self.assertFalse(game.game_over)
+        self.assertEqual((game.move_count, game._take_pending_moves()), (0, None))  # no move log to grow
+
+        with tempfile.TemporaryDirectory() as directory:
+            results_path, baseline_path = os.path.join(directory, 'now.json'), os.path.join(directory, 'then.json')
+            call_command('bench_engine', players=[2, 8], rounds=1, inner=5, output=results_path, stdout=io.StringIO())
+            with open(results_path) as fh:
+                results = json.load(fh)
+            self.assertEqual(len(results['results']), 14)
+            self.assertIn('update_game_state_after_move[8p]', results['results'])
+
+            for row in results['results'].values():
+                row['min_us'] /= 100
+            with open(baseline_path, 'w') as fh:
+                json.dump(results, fh)
+            with self.assertRaises(CommandError):
+                call_command('bench_engine', players=[2, 8], rounds=1, inner=5, compare=baseline_path,
+                             stdout=io.StringIO(), stderr=io.StringIO())
+
+
+class MetricsTest(TransactionTestCase):
+    def test_registry_renders_the_prometheus_text_format(self):
+        registry = metrics.Registry()
+        requests = registry.counter('t_requests_total', 'Requests.')
+        requests.inc(view='state', status=200)
+        requests.inc(2, view='state', status=200)
+        registry.gauge('t_sockets', 'Sockets.').set(3)
+        registry.gauge('t_broken', 'Raises.', callback=lambda: 1 / 0)
+        latency = registry.histogram('t_seconds', 'Latency.', buckets=(0.1, 1.0))
+        latency.observe(0.05, view='a"b')
+        latency.observe(2.0, view='a"b')
+        self.assertIs(registry.counter('t_requests_total', 'Again.'), requests)
+
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP t_requests_total Requests.', '# TYPE t_requests_total counter',
+            't_requests_total{status="200",view="state"} 3',
+            '# HELP t_sockets Sockets.', '# TYPE t_sockets gauge', 't_sockets 3',
+            '# HELP t_broken Raises.', '# TYPE t_broken gauge',
+            '# HELP t_seconds Latency.', '# TYPE t_seconds histogram',
+            't_seconds_bucket{view="a\\"b",le="0.1"} 1',
+            't_seconds_bucket{view="a\\"b",le="1.0"} 1',
+            't_seconds_bucket{view="a\\"b",le="+Inf"} 2',
+            't_seconds_sum{view="a\\"b"} 2.05',
+            't_seconds_count{view="a\\"b"} 2',
+        ])
+
+    @override_settings(METRICS_TOKEN='scrape')
+    def test_endpoint_is_for_staff_or_the_token(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        response = self.client.get('/metrics/', headers={'Authorization': 'Bearer scrape'})
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        self.assertIn('# TYPE badam_http_requests_total counter', response.content.decode())
+        self.client.force_login(User.objects.create_user('ops', password='unused', is_staff=True))
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+    @override_settings(GAME_ACTORS=True, GAME_WRITE_BEHIND=False, SQLITE_SERIALIZED_WRITES=True,
+                       METRICS_SAMPLE_RATE=1.0, METRICS_LOCK_WAIT_THRESHOLD=0)
+    def test_actor_and_db_writer_threads_are_sampled(self):
+        players = [{'player_num': n, 'name': f'P{n}', 'hand': [], 'last_ping_time': timezone.now().isoformat()}
+                   for n in (1, 2)]
+        game = Game.objects.create(room_code='MET001', num_players=2, is_game_started=True,
+                                   players_data=json.dumps(players))
+        actor_json = metrics.JSON_SECONDS.count(view='game_actor')
+        writer_lock_wait = metrics.LOCK_WAIT_SECONDS.value(view='db_writer')
+
+        actors.mutate(game.game_id, lambda live: live.receive_ping(1, commit=False))
+        actors.system().stop_all()
+        self.assertGreater(metrics.JSON_SECONDS.count(view='game_actor'), actor_json)
+        self.assertGreater(metrics.LOCK_WAIT_SECONDS.value(view='db_writer'), writer_lock_wait)
+        self.assertIn('badam_sqlite_lock_wait_seconds_total{view="db_writer"}', metrics.registry.render())
+
+
+class RoomCodeTest(TestCase):
+    def test_codes_are_unique_recycled_first_and_retried_on_collision(self):
+        allocator = RoomCodeAllocator(secret='test', start=CODE_SPACE - 50000)
+        codes = allocator.next_codes(100000)  # across the counter's wrap
+        self.assertEqual(len(set(codes)), len(codes))
+        self.assertTrue(all(len(code) == 6 and set(code) <= set(ROOM_CODE_ALPHABET) for code in codes))
+        walked = sum(allocator._feistel(index % CODE_SPACE) >= CODE_SPACE
+                     for index in range(CODE_SPACE - 50000, CODE_SPACE + 50000))
+        self.assertGreater(walked, 0)
+
+        allocator.release('OLD001')
+        allocator.release('OLD002')
+        self.assertEqual(allocator.next_codes(3)[:2], ['OLD001', 'OLD002'])
+
+        taken = Game.objects.create(room_code='TAKEN1', num_players=2).room_code
+        allocator.release(taken)
+        self.assertNotEqual(allocator.create_game(num_players=2).room_code, taken)
+        for _ in range(MAX_INSERT_ATTEMPTS):
+            allocator.release(taken)
+        with self.assertRaises(IntegrityError):
+            allocator.create_game(num_players=2)
+
+
+class LoadTestSmokeTest(TransactionTestCase):
+    def test_simulated_tables_play_to_completion(self):
+        report = LoadTest(InProcessClient, tables=2, players=3, time_scale=0, seed=1).run()
+
+        self.assertEqual(report['games_finished'], 2)
+        for endpoint, row in report['endpoints'].items():
+            self.assertEqual(row['errors'], 0, endpoint)
+        self.assertGreater(report['endpoints']['play_card']['count'], 0)
+
+    def test_moves_over_the_game_socket(self):
+        report = LoadTest(InProcessClient, tables=1, players=3, time_scale=0, seed=1, websocket=True).run()
+
+        self.assertEqual(report['games_finished'], 1)
+        for endpoint, row in report['endpoints'].items():
+            self.assertEqual(row['errors'], 0, endpoint)
+        self.assertEqual(report['endpoints']['ws_connect']['count'], 3)
+        self.assertGreater(report['endpoints']['ws_play_card']['count'], 0)
+        self.assertNotIn('play_card', report['endpoints'])
+
+
+class GameConsumerTest(TransactionTestCase):
+    def _connect(self, game, player_name):
+        session = SessionStore()
+        session['player_name'] = player_name
+        session['game_id'] = str(game.game_id)
+        session.create()
+        return WebsocketCommunicator(
+            application, f'/ws/game/{game.room_code}/',
+            headers=[(b'cookie', f'sessionid={session.session_key}'.encode()), (b'origin', b'http://testserver')],
+        )
+
+    async def test_move_is_broadcast_to_the_table(self):
+        players = [{'player_num': 1, 'name': 'A', 'hand': [[7, '7H'], [8, '8H']]},
+                   {'player_num': 2, 'name': 'B', 'hand': [[20, '7D']]}]
+        game = await Game.objects.acreate(room_code='WS0001', num_players=2, current_player=1, is_game_started=True,
+                                          players_data=json.dumps(players),
+                                          desk_cards=json.dumps({'H': [], 'D': [], 'C': [], 'S': []}))
+        first = await sync_to_async(self._connect)(game, 'A')
+        second = await sync_to_async(self._connect)(game, 'B')
+        self.assertTrue((await first.connect())[0])
+        self.assertTrue((await second.connect())[0])
+
+        await second.send_json_to({'type': 'play_card', 'card_num': 20})
+        self.assertEqual((await second.receive_json_from())['message'], 'It is not your turn.')
+
+        await first.send_json_to({'type': 'play_card', 'card_num': 7})
+        for communicator in (first, second):
+            update = await communicator.receive_json_from()
+            self.assertEqual(update['type'], 'game_state_update')
+            self.assertEqual(update['game_data']['current_player_turn'], 2)
+            self.assertEqual(update['game_data']['players'][0]['hand_size'], 1)
+
+        await game.arefresh_from_db()
+        self.assertEqual(game.current_player, 2)
+        self.assertEqual(json.loads(game.desk_cards)['H'], [[7, '7H']])
+
+        await first.disconnect()
+        message = await second.receive_json_from()
+        self.assertEqual(message['type'], 'player_disconnected')
+        await second.disconnect()
+
+
+    @override_settings(SHARD_NODE_ID='a', SHARD_BASE_URL='http://a.test')
+    async def test_socket_on_the_wrong_shard_is_sent_to_the_owner(self):
+        sharding._shard_map = None
+        self.addCleanup(setattr, sharding, '_shard_map', None)
+        shards = sharding.shard_map()
+        await sync_to_async(shards.heartbeat)()
+        await ShardNode.objects.acreate(node_id='b', base_url='http://b.test', heartbeat_at=timezone.now())
+        with self.assertLogs('app.sharding', 'INFO'):
+            await sync_to_async(shards.refresh)()
+        room_code = next(code for code in (f'SH{n:04d}' for n in range(100)) if shards.owner(code) == 'b')
+        players = [{'player_num': 1, 'name': 'A', 'hand': [[7, '7H']]}, {'player_num': 2, 'name': 'B', 'hand': []}]
+        game = await Game.objects.acreate(room_code=room_code, num_players=2, current_player=1, is_game_started=True,
+                                          players_data=json.dumps(players))
+        # What game.js opens: no session cookie, the player token in the query string.
+        path = f'/ws/game/{room_code}/?game_id={game.game_id}&token={player_tokens.issue(game.game_id, "A")}'
+
+        communicator = WebsocketCommunicator(application, path, headers=[(b'origin', b'http://testserver')])
+        self.assertTrue((await communicator.connect())[0])
+        self.assertEqual(await communicator.receive_json_from(),
+                         {'type': 'shard_redirect', 'owner': 'b', 'base_url': 'http://b.test'})
+        self.assertEqual((await communicator.receive_output())['code'], 4307)
+
+        # On the owner the same URL signs the player in.
+        sharding._shard_map = None
+        with override_settings(SHARD_NODE_ID=None):
+            communicator = WebsocketCommunicator(application, path, headers=[(b'origin', b'http://testserver')])
+            self.assertTrue((await communicator.connect())[0])
+            await communicator.send_json_to({'type': 'play_card', 'card_num': 7})
+            self.assertEqual((await communicator.receive_json_from())['type'], 'game_state_update')
+            await communicator.disconnect()
+
+class RespChannelLayerTest(TestCase):
+    def setUp(self):
+        port, stop = resp_standin.start_in_thread()
+        self.addCleanup(stop)
+        self.layer = RespChannelLayer(url=f'redis://127.0.0.1:{port}/0', capacity=2, expiry=1, group_expiry=1)
+
+    async def test_messages_groups_capacity_and_expiry_against_the_standin(self):
+        layer = self.layer
+        first, second = await layer.new_channel(), await layer.new_channel()
+        await layer.send(first, {'type': 'hello'})
+        self.assertEqual(await layer.receive(first), {'type': 'hello'})
+
+        await layer.group_add('table', first)
+        await layer.group_add('table', second)
+        await layer.group_send('table', {'type': 'state', 'move': 1})
+        self.assertEqual([await layer.receive(channel) for channel in (first, second)], [{'type': 'state', 'move': 1}] * 2)
+        await layer.group_discard('table', second)
+        await layer.group_send('table', {'type': 'state', 'move': 2})
+        self.assertEqual(await layer.receive(first), {'type': 'state', 'move': 2})
+
+        # Racing sends to a channel nobody is reading: exactly its capacity gets in.
+        sent = await asyncio.gather(*(layer.send('worker', {'n': n}) for n in range(10)), return_exceptions=True)
+        self.assertEqual([isinstance(result, ChannelFull) for result in sent], [False] * 2 + [True] * 8)
+        self.assertEqual(await layer.receive('worker'), {'n': 0})
+
+        # The unread message and the group both age out.
+        await asyncio.sleep(1.1)
+        await layer.group_send('table', {'type': 'state', 'move': 3})
+        lengths = await layer._pipeline([('LLEN', layer._channel_key('worker')), ('LLEN', layer._channel_key(first)),
+                                         ('ZCARD', layer._group_key('table'))])
+        self.assertEqual(lengths, [0, 0, 0])
+        await layer.close()
+
+
+class GameActorTest(TransactionTestCase):
+    def test_concurrent_changes_are_applied_in_order_without_loss(self):
+        players = [{'player_num': n, 'name': f'P{n}', 'hand': []} for n in (1, 2, 3)]
+        game = Game.objects.create(room_code='ACT001', num_players=3, is_game_started=True,
+                                   players_data=json.dumps(players))
+
+        def ping(player_num):
+            actors.mutate(game.game_id, lambda live: live.update_player_ping_time(player_num, commit=False))
+
+        def pass_turn(_):
+            actors.mutate(game.game_id, lambda live: live.pass_turn(live.current_player, commit=False))
+
+        with override_settings(GAME_ACTORS=True):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(lambda i: (ping(i % 3 + 1), pass_turn(i)), range(30)))
+            snapshot = actors.snapshot(game.game_id)
+            actors.system().stop_all()
+
+        game.refresh_from_db()
+        self.assertEqual(game.current_player, 1)  # 30 passes around a 3-seat table
+        self.assertTrue(all(p.get('last_ping_time') for p in json.loads(game.players_data)))
+        self.assertEqual(snapshot.players_data, game.players_data)
+
+
+    def test_inline_change_is_applied_again_instead_of_losing_a_concurrent_write(self):
+        players = [{'player_num': n, 'name': f'P{n}', 'hand': []} for n in (1, 2)]
+        game = Game.objects.create(room_code='ACT002', num_players=2, is_game_started=True,
+                                   players_data=json.dumps(players))
+        attempts = []
+
+        def ping(live):
+            attempts.append(live.current_player)
+            if len(attempts) == 1:
+                # Another process passes between this load and its save.
+                other = Game.objects.get(pk=game.pk)
+                other.pass_turn(other.current_player)
+            live.update_player_ping_time(1, commit=False)
+
+        with override_settings(GAME_ACTORS=False):
+            actors.mutate(game.game_id, ping)
+
+        game.refresh_from_db()
+        self.assertEqual(attempts, [1, 2])
+        self.assertEqual(game.current_player, 2)
+        self.assertTrue(json.loads(game.players_data)[0].get('last_ping_time'))
+
+
+class GroupCommitTest(TransactionTestCase):
+    def test_moves_share_commits_and_pings_are_written_lazily(self):
+        players = [{'player_num': n, 'name': f'P{n}', 'hand': []} for n in (1, 2)]
+        games = [Game.objects.create(room_code=f'GRP00{n}', num_players=2, is_game_started=True,
+                                     players_data=json.dumps(players)) for n in range(4)]
+
+        def pass_turn(game):
+            actors.mutate(game.game_id, lambda live: live.pass_turn(live.current_player, commit=False))
+
+        with override_settings(GAME_ACTORS=True, GAME_WRITE_BEHIND=True, WRITE_BEHIND_INTERVAL=0.05,
+                               WRITE_BEHIND_LAZY_INTERVAL=60):
+            # Load the games before any commit: on the shared in-memory test database a read racing
+            # a write fails with "table is locked" instead of waiting.
+            for game in games:
+                actors.mutate(game.game_id, lambda live: None)
+            commits = write_behind.COMMITS.value()
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(pass_turn, games * 2))
+            self.assertLess(write_behind.COMMITS.value() - commits, 8)
+            self.assertEqual([GameMove.objects.filter(game=game).count() for game in games], [2] * 4)
+
+            actors.mutate(games[0].game_id, lambda live: live.update_player_ping_time(1, commit=False),
+                          durable=False)
+            self.assertNotIn('last_ping_time', Game.objects.get(pk=games[0].pk).players_data)
+            write_behind.committer.flush()
+            self.assertIn('last_ping_time', Game.objects.get(pk=games[0].pk).players_data)
+            actors.system().stop_all()
+
+    def test_a_game_that_cannot_be_written_is_dropped_alone_and_reloaded(self):
+        players = [{'player_num': n, 'name': f'P{n}', 'hand': []} for n in (1, 2)]
+        good, bad = (Game.objects.create(room_code=code, num_players=2, is_game_started=True,
+                                         players_data=json.dumps(players)) for code in ('BAT001', 'BAT002'))
+        # The pass below is logged as seq 0, which this row already has.
+        GameMove.objects.create(game=bad, seq=0, kind=GameMove.PASS, player_num=1)
+        dropped = []
+
+        def on_write_failed(sender, game_id, **kwargs):
+            dropped.append(game_id)
+
+        write_behind.write_failed.connect(on_write_failed)
+        self.addCleanup(write_behind.write_failed.disconnect, on_write_failed)
+        with self.assertLogs('app', 'ERROR') as logged:
+            committer = write_behind.GroupCommitter()
+            with override_settings(WRITE_BEHIND_INTERVAL=0.1):
+                written = []
+                for game in (good, bad):
+                    game.pass_turn(1, commit=False)
+                    written.append(committer.mark(copy.copy(game), ['current_player', 'move_count'],
+                                                  game._take_pending_moves()))
+                written[0].result(timeout=5)
+                with self.assertRaises(IntegrityError):
+                    written[1].result(timeout=5)
+
+            self.assertEqual(Game.objects.get(pk=good.pk).current_player, 2)
+            self.assertEqual(GameMove.objects.filter(game=good).count(), 1)
+            self.assertEqual(Game.objects.get(pk=bad.pk).current_player, 1)
+            self.assertEqual(dropped, [bad.game_id])
+            self.assertIsNone(committer.latest(bad.game_id))
+
+            with override_settings(GAME_ACTORS=True, GAME_WRITE_BEHIND=True):
+                with self.assertRaises(IntegrityError):
+                    actors.mutate(bad.game_id, lambda live: live.pass_turn(live.current_player, commit=False))
+                self.assertEqual(actors.snapshot(bad.game_id).current_player, 1)
+                self.assertEqual(actors.snapshot(bad.game_id).move_count, 0)
+            actors.system().stop_all()
+        self.assertTrue(any('Dropping unwritten changes' in line for line in logged.output))
+
+
+class SnapshotTest(TestCase):
+    def test_snapshot_round_trips_and_skips_games_changed_since(self):
+        players = [{'player_num': n, 'name': f'P{n}', 'hand': [[7, '7H']]} for n in (1, 2)]
+        kept, changed = (Game.objects.create(room_code=code, num_players=2, is_game_started=True,
+                                             players_data=json.dumps(players), deal_seed=-5)
+                         for code in ('SNAP01', 'SNAP02'))
+        path = os.path.join(tempfile.mkdtemp(), 'games.snapshot')
+        snapshots.write(path, [kept, changed])
+        changed.pass_turn(1)
+
+        written_at, games = snapshots.read(path)
+        self.assertEqual(actors._field_values(games[0]), actors._field_values(kept))
+        self.assertEqual((games[1].game_id, games[1].current_player), (changed.game_id, 1))
+        self.assertEqual(games[0].last_updated, kept.last_updated)
+        self.assertEqual([g.room_code for g in snapshots.fresh_games(games, 60, written_at)], ['SNAP01'])
+        self.assertEqual(snapshots.fresh_games(games, 60, time.time() - 120), [])
+
+        with open(path, 'r+b') as fh:
+            fh.seek(40)
+            fh.write(b'\xff')
+        with self.assertRaises(snapshots.SnapshotError):
+            snapshots.read(path)
+
+    def test_startup_restores_games_and_exit_writes_the_last_snapshot(self):
+        players = [{'player_num': n, 'name': f'P{n}', 'hand': [[7, '7H']]} for n in (1, 2)]
+        game = Game.objects.create(room_code='SNAP03', num_players=2, is_game_started=True,
+                                   players_data=json.dumps(players))
+        path = os.path.join(tempfile.mkdtemp(), 'games.snapshot')
+        snapshots.write(path, [game])
+
+        with override_settings(GAME_ACTORS=True, GAME_SNAPSHOT_PATH=path, GAME_SNAPSHOT_INTERVAL=3600):
+            system = actors.system()
+            snapshots.start(system)
+            self.assertEqual(system.snapshot(game.game_id).players_data, game.players_data)
+            os.remove(path)
+            snapshots.shutdown(system)
+            system.stop_all()
+        self.assertIn(game.game_id, [g.game_id for g in snapshots.read(path)[1]])
+
+
+class ShardingTest(TestCase):
+    def test_tables_fail_over_only_once_the_owner_stops_heartbeating(self):
+        codes = [f'R{n:05d}' for n in range(300)]
+        ring = sharding.HashRing(['a', 'b', 'c'])
+        owners = {code: ring.owner(code) for code in codes}
+        self.assertEqual(set(owners.values()), {'a', 'b', 'c'})
+        smaller = sharding.HashRing(['a', 'c'])
+        self.assertTrue(all(smaller.owner(code) == owner for code, owner in owners.items() if owner != 'b'))
+        self.assertIsNone(sharding.HashRing([]).owner(codes[0]))
+
+        hop = sharding._sign_hop('a', codes[0])
+        self.assertTrue(sharding._verify_hop(hop, 'a'))
+        self.assertFalse(sharding._verify_hop(hop, 'b'))
+        self.assertFalse(sharding._verify_hop('b' + hop[1:], 'b'))
+
+        shards = sharding.ShardMap('a', 'http://127.0.0.1:9')
+        shards.heartbeat()
+        ShardNode.objects.create(node_id='b', base_url='http://127.0.0.1:1', heartbeat_at=timezone.now())
+        shards.refresh()
+        room_code = next(code for code in codes if shards.owner(code) == 'b')
+        middleware = sharding.ShardRoutingMiddleware(lambda request: None, shards=shards)
+
+        def route(**headers):
+            request = RequestFactory().get(f'/check_room_status/{room_code}/', headers=headers)
+            return middleware.process_view(request, None, (), {'room_code': room_code})
+
+        with self.assertLogs('app', 'WARNING'):
+            # b does not answer but is still heartbeating: it may hold the table, so a must not serve it.
+            self.assertEqual(route().status_code, 503)
+            self.assertEqual(shards.owner(room_code), 'b')
+            ShardNode.objects.filter(node_id='b').update(heartbeat_at=timezone.now() - timedelta(seconds=60))
+            self.assertIsNone(route())
+            self.assertEqual(shards.owner(room_code), 'a')
+
+        self.assertIsNone(route(**{sharding.FORWARD_HEADER: hop}))
+        shards._heartbeat_ok_at -= 60
+        self.assertEqual(route().status_code, 503)
+
+
+class PlayerTokenTest(TransactionTestCase):
+    def test_game_api_skips_the_session_table_with_a_token(self):
+        players = [{'player_num': 1, 'name': 'A', 'hand': [[7, '7H']]}, {'player_num': 2, 'name': 'B', 'hand': []}]
+        game = Game.objects.create(room_code='TOK001', num_players=2, is_game_started=True,
+                                   players_data=json.dumps(players))
+        headers = {'X-Player-Token': player_tokens.issue(game.game_id, 'A')}
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/get_game_state/{game.game_id}/', headers=headers)
+        self.assertEqual(response.json()['your_player_num'], 1)
+        self.assertFalse([q for q in queries.captured_queries if 'django_session' in q['sql']])
+
+        other_game = player_tokens.issue('00000000-0000-0000-0000-000000000000', 'A')
+        response = self.client.post(f'/player_ping/{game.game_id}/', data='{}', content_type='application/json',
+                                    headers={'X-Player-Token': other_game})
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_follows_the_player_when_a_removal_renumbers_the_seats(self):
+        now = timezone.now()
+        players = [{'player_num': n, 'name': name, 'hand': [[n, f'{n}H']], 'last_ping_time': now.isoformat()}
+                   for n, name in ((1, 'A'), (2, 'B'), (3, 'C'))]
+        game = Game.objects.create(room_code='TOK002', num_players=3, is_game_started=True, current_player=3,
+                                   players_data=json.dumps(players), disconnected_player=2,
+                                   reconnect_timer_start=now - timedelta(seconds=200))
+        headers = {'X-Player-Token': player_tokens.issue(game.game_id, 'C')}
+
+        state = self.client.get(f'/get_game_state/{game.game_id}/', headers=headers).json()
+        self.assertEqual([p['name'] for p in state['players']], ['A', 'C'])
+        self.assertEqual((state['your_player_num'], state['your_hand']), (2, [[3, '3H']]))
+        response = self.client.post(f'/player_ping/{game.game_id}/', data='{}', content_type='application/json',
+                                    headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post(f'/pass_turn/{game.game_id}/', headers=headers).status_code, 200)
+
+
+class ThrottleTest(TransactionTestCase):
+    @override_settings(REQUEST_THROTTLE_RATES={'player_ping': (0.5, 3), 'slow': (0.5, 1)})
+    def test_runaway_polling_is_coalesced_then_refused(self):
+        players = [{'player_num': 1, 'name': 'A', 'hand': []}, {'player_num': 2, 'name': 'B', 'hand': []}]
+        game = Game.objects.create(room_code='THR001', num_players=2, is_game_started=True,
+                                   players_data=json.dumps(players))
+        headers = {'X-Player-Token': player_tokens.issue(game.game_id, 'A')}
+        statuses = [self.client.post(f'/player_ping/{game.game_id}/', data='{}', content_type='application/json',
+                                     headers=headers) for _ in range(4)]
+        self.assertEqual([r.status_code for r in statuses], [200, 200, 200, 429])
+        self.assertEqual(statuses[-1]['Retry-After'], '2')
+
+        calls, release = [], threading.Event()
+
+        @throttle.throttled('slow', lambda request: ('game', 1))
+        def slow(request):
+            calls.append(1)
+            release.wait(5)
+            return JsonResponse({'calls': len(calls)})
+
+        request = RequestFactory().get('/slow/')
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(slow, request) for _ in range(3)]
+            time.sleep(0.2)
+            release.set()
+        self.assertEqual([json.loads(f.result().content) for f in futures], [{'calls': 1}] * 3)
+        self.assertEqual(slow(request).status_code, 429)
+
+
+class CadenceTest(TestCase):
+    def test_intervals_follow_the_turn_and_stretch_under_load(self):
+        players = [{'player_num': n, 'name': f'P{n}', 'hand': [[7, '7H']]} for n in (1, 2, 3, 4)]
+        game = Game.objects.create(room_code='CAD001', num_players=4, is_game_started=True, current_player=2,
+                                   players_data=json.dumps(players))
+        headers = {'X-Player-Token': player_tokens.issue(game.game_id, 'P2')}
+        state = self.client.get(f'/get_game_state/{game.game_id}/', headers=headers).json()
+        self.assertEqual((state['next_poll_ms'], state['next_ping_ms']), (1500, 1000))
+
+        polls = [cadence.next_intervals(game, seat)['next_poll_ms'] for seat in (3, 4, 1)]
+        self.assertEqual(polls[0], cadence.NEXT_TURN_POLL_MS)
+        self.assertEqual(polls, sorted(polls))
+        self.assertLess(polls[0], polls[-1])
+        with override_settings(CADENCE_LOAD_FACTOR=10):
+            shed = cadence.next_intervals(game, 1)
+        self.assertEqual(shed['next_poll_ms'], polls[-1] * 10)
+        self.assertEqual(shed['next_ping_ms'], cadence.MAX_PING_MS)
+
+
+class VirtualClockTest(TestCase):
+    def test_timeouts_follow_the_virtual_clock(self):
+        with clock.use(clock.VirtualClock()) as virtual:
+            players = [{'player_num': n, 'name': f'P{n}', 'hand': [[7, '7H']], 'last_ping_time': virtual.now().isoformat()}
+                       for n in (1, 2, 3)]
+            game = Game.objects.create(room_code='CLK001', num_players=3, is_game_started=True,
+                                       players_data=json.dumps(players))
+            virtual.advance(21)
+            for seat in (1, 3):
+                game.receive_ping(seat, commit=False)
+            self.assertTrue(game.lifecycle_check_due())
+            game.run_lifecycle_checks(commit=False)
+            self.assertEqual(game.disconnected_player, 2)
+
+            virtual.advance(119)
+            self.assertEqual(game.reconnect_time_left(), 1)
+            self.assertFalse(game.lifecycle_check_due())
+            virtual.advance(1)
+            game.run_lifecycle_checks(commit=False)
+            self.assertEqual([p['name'] for p in json.loads(game.players_data)], ['P1', 'P3'])
+
+        # Random table sizes, so removals renumber seats and 2-seat tables end the game.
+        report = simulator.TimeoutSimulator(tables=30, seed=3).run()
+        self.assertEqual(report['problems'], {})
+        self.assertEqual({name: row['ok'] for name, row in report['scenarios'].items()},
+                         dict.fromkeys(simulator.SCENARIOS, 6))
+        self.assertGreater(report['virtual_seconds'], ROOM_TTL_SECONDS)
+
+
+class StaticPagesTest(TestCase):
+    def test_pages_are_rendered_once_and_assets_are_external(self):
+        first, second = self.client.get('/').content.decode(), Client().get('/').content.decode()
+        tokens = [re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1) for page in (first, second)]
+        self.assertNotEqual(*tokens)
+        self.assertNotIn(pages.CSRF_PLACEHOLDER, first)
+        self.assertNotIn('<style>', first)
+
+        script = re.search(r'src="(/static/app/js/index[^"]*)"', first).group(1)
+        response = self.client.get(script)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age', response['Cache-Control'])
+
+        rules = self.client.get('/rules/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(rules['Content-Encoding'], 'gzip')
+        self.assertEqual(self.client.get('/rules/', headers={'If-None-Match': rules['ETag']}).status_code, 304)
+
+
+class ProfilingTest(TestCase):
+    def test_staff_header_profiles_a_view_into_rotated_folded_stacks(self):
+        directory = tempfile.mkdtemp()
+        staff = User.objects.create_user('ops', password='unused', is_staff=True)
+        with override_settings(PROFILE_SAMPLE_RATE=0, PROFILE_ON_HEADER=True, PROFILE_DIR=directory,
+                               PROFILE_MAX_BYTES=1):
+            profiled = profiling.PROFILED.value(endpoint='rules')
+            Client().get('/rules/', headers={'X-Profile': '1'})
+            self.assertEqual(profiling.PROFILED.value(endpoint='rules'), profiled)
+            client = Client()
+            client.force_login(staff)
+            client.get('/rules/', headers={'X-Profile': '1'})
+            self.assertEqual(profiling.PROFILED.value(endpoint='rules'), profiled + 1)
+
+            for _ in range(2):
+                target = profiling.sampler.start('unit', sys._getframe().f_code, 'unit')
+                profiling.sampler.sample()
+                profiling.sampler.stop(target)
+                profiling.sampler.flush()
+
+        with open(os.path.join(directory, 'unit.folded')) as fh:
+            stacks = dict(line.rsplit(' ', 1) for line in fh.read().splitlines())
+        self.assertTrue(all(stack.startswith('app.tests:ProfilingTest.test_staff_header') for stack in stacks))
+        self.assertIn('app.profiling:Sampler.sample', [stack.split(';')[-1] for stack in stacks])
+        self.assertTrue(os.path.exists(os.path.join(directory, 'unit.folded.1')))
+
+
+class OpsDashboardTest(TransactionTestCase):
+    def test_live_page_shows_turn_age_and_countdowns_without_loading_hands(self):
+        staff = User.objects.create_superuser('ops', password='unused')
+        client = Client()
+        client.force_login(staff)
+        with clock.use(clock.VirtualClock()) as virtual:
+            live = Game.objects.create(room_code='OPS001', num_players=2, is_game_started=True)
+            Game.objects.create(room_code='OPS002', num_players=2, is_game_started=True, game_over=True)
+            Game.objects.create(room_code='OPS003', num_players=3, is_game_started=True, disconnected_player=2,
+                                reconnect_timer_start=virtual.now())
+            actors.mutate(live.game_id, lambda game: setattr(game, 'current_player', 2))
+            virtual.advance(30)
+
+            with CaptureQueriesContext(connection) as queries:
+                page = client.get('/admin/app/game/live/')
+                changelist = client.get('/admin/app/game/?state=halted&q=ops003')
+
+        self.assertContains(page, '<td>30s</td>', html=True)
+        self.assertContains(page, '<td>90s</td>', html=True)
+        self.assertNotContains(page, 'OPS002')
+        self.assertContains(changelist, 'OPS003')
+        self.assertNotContains(changelist, 'OPS001')
+        self.assertFalse([q['sql'] for q in queries if 'players_data' in q['sql']])
+
+        rates = ops.TableRates(window=1.0)
+        rates.hit('OPS001', now=rates._started + 0.2)
+        rates.hit('OPS001', now=rates._started + 0.4)
+        self.assertEqual(rates.rate('OPS001', now=rates._started + 1.0), 2.0)
+        self.assertEqual(rates.rate('OPS001', now=rates._started + 3.0), 0.0)
+
+
+class DealingTest(TransactionTestCase):
+    def test_seeded_deal_is_reproducible_and_opened_by_the_seven_of_hearts(self):
+        for num_players in range(2, 9):
+            dealt = dealing.deal(num_players, seed=1234)
+            self.assertEqual(sorted(card for hand in dealt.hands.values() for card in hand), sorted(dealing.DECK))
+            self.assertIn((7, '7H'), dealt.hands[dealt.first_player])
+            self.assertEqual(dealing.deal_many(num_players, seeds=[99, 1234])[1], dealt)
+
+        players = [{'player_num': n, 'name': f'P{n}', 'hand': []} for n in (1, 2, 3)]
+        game = Game.objects.create(room_code='DEAL01', num_players=3, players_data=json.dumps(players), deal_seed=42)
+        session = self.client.session
+        session['player_name'], session['game_id'] = 'P1', str(game.game_id)
+        session.save()
+        self.client.post(f'/start_game/{game.game_id}/')
+        game.refresh_from_db()
+        dealt = dealing.deal(3, seed=42)
+        self.assertEqual(game.current_player, dealt.first_player)
+        self.assertEqual([p['hand'] for p in json.loads(game.players_data)],
+                         [[list(card) for card in dealt.hands[n]] for n in (1, 2, 3)])
+
+
+class ReplayTest(TestCase):
+    def test_any_move_is_rebuilt_from_the_nearest_checkpoint(self):
+        dealt = dealing.deal(4, seed=5)
+        players = [{'player_num': n, 'name': f'P{n}', 'hand': dealt.hands[n]} for n in range(1, 5)]
+        game = Game.objects.create(room_code='RPL001', num_players=4, players_data=json.dumps(players),
+                                   current_player=dealt.first_player, is_game_started=True,
+                                   desk_cards=json.dumps({'H': [], 'D': [], 'C': [], 'S': []}))
+        game.record_move(GameMove.DEAL)
+        game.save()
+        states = [game.replay_state()]
+        while not game.game_over:
+            moves = game.get_valid_moves_for_player(game.current_player)
+            if moves:
+                game.update_game_state_after_move(min(moves), game.current_player)
+            else:
+                game.pass_turn(game.current_player)
+            states.append(game.replay_state())
+
+        self.assertEqual(replay.last_seq(game.game_id), len(states) - 1)
+        for seq in range(len(states)):
+            self.assertEqual(json.loads(json.dumps(replay.state_at(game.game_id, seq))),
+                             json.loads(json.dumps(states[seq])))
+
+        response = self.client.get(f'/spectate/{game.game_id}/?delay=5')
+        self.assertEqual(response.json()['move'], len(states) - 6)
+        self.assertNotIn('hand', response.json()['state']['players'][0])
+        frames = b''.join(self.client.get(f'/replay/{game.game_id}/stream/').streaming_content).splitlines()
+        self.assertEqual(len(frames), len(states))
+        for url in ('/replay/not-a-game/', '/replay/not-a-game/stream/', '/spectate/not-a-game/'):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+        # Moves re-applied by a replay are not logged again.
+        rebuilt = Game.from_replay_state(states[0])
+        rebuilt.update_game_state_after_move(min(rebuilt.get_valid_moves_for_player(rebuilt.current_player)),
+                                             rebuilt.current_player, commit=False)
+        self.assertEqual((rebuilt.move_count, rebuilt._take_pending_moves()), (0, None))
+
+
+class LobbyTest(TransactionTestCase):
+    def test_public_rooms_are_listed_with_free_seats_and_an_etag(self):
+        self.client.post('/create_room/', {'player_name': 'Host', 'num_players': 3, 'is_public': 'on'})
+        self.client.post('/create_room/', {'player_name': 'Hidden', 'num_players': 3})
+        room_code = Game.objects.get(is_public=True).room_code
+        self.client_class().post('/join_room/', {'room_code': room_code, 'player_name': 'Guest'})
+
+        response = self.client.get('/lobby/', {'num_players': 3})
+        rooms = response.json()['rooms']
+        self.assertEqual([(r['room_code'], r['seats_taken']) for r in rooms], [(room_code, 2)])
+        self.assertEqual(self.client.get('/lobby/', {'free_seats': 2}).json()['rooms'], [])
+        self.assertEqual(self.client.get('/lobby/', {'num_players': 3},
+                                         headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+
+class MatchmakingTest(TestCase):
+    def test_a_tick_seats_full_tables_with_one_insert_each(self):
+        queue = matchmaking.Matchmaker()
+        tickets = [queue.enqueue('Sam', 3, start=False) for _ in range(7)]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(queue.tick(), 2)
+        # One INSERT for the games and one for their deal records.
+        self.assertEqual(len([q for q in queries.captured_queries if q['sql'].startswith('INSERT')]), 2)
+        self.assertEqual(queue.depth(3), 1)
+
+        game = Game.objects.get(game_id=tickets[0].seat[0])
+        self.assertEqual([p['name'] for p in json.loads(game.players_data)], ['Sam', 'Sam (2)', 'Sam (3)'])
+        self.assertTrue(game.is_game_started)
+
+
+class AutoPassTest(TestCase):
+    def test_seats_without_a_move_are_passed_in_the_same_change(self):
+        players = [{'player_num': 1, 'name': 'A', 'hand': [[7, '7H'], [1, 'AH']]},
+                   {'player_num': 2, 'name': 'B', 'hand': [[52, 'KS']]},
+                   {'player_num': 3, 'name': 'C', 'hand': [[6, '6H']]}]
+        game = Game.objects.create(room_code='AUTO01', num_players=3, players_data=json.dumps(players),
+                                   desk_cards=json.dumps({'H': [], 'D': [], 'C': [], 'S': []}),
+                                   is_game_started=True, auto_pass=True)
+
+        game.update_game_state_after_move(7, 1)
+        game.refresh_from_db()
+        self.assertEqual(game.current_player, 3)
+        self.assertEqual(json.loads(game.auto_passed), [2])
+        self.assertEqual(list(game.moves.order_by('seq').values_list('kind', flat=True)),
+                         [GameMove.PLAY, GameMove.AUTO_PASS])
+
+    def test_auto_passing_stops_after_a_lap_when_a_removal_took_the_needed_cards(self):
+        players = [{'player_num': 1, 'name': 'A', 'hand': [[9, '9H']]},
+                   {'player_num': 2, 'name': 'B', 'hand': [[8, '8H']]},
+                   {'player_num': 3, 'name': 'C', 'hand': [[10, 'TH']]}]
+        game = Game.objects.create(room_code='AUTO02', num_players=3, players_data=json.dumps(players),
+                                   desk_cards=json.dumps({'H': [[7, '7H']], 'D': [], 'C': [], 'S': []}),
+                                   is_game_started=True, auto_pass=True, current_player=2, disconnected_player=2,
+                                   reconnect_timer_start=timezone.now() - timedelta(seconds=200))
+
+        self.assertTrue(game.check_for_termination())  # B leaves with the 8H; nobody can move now
+        self.assertEqual((game.num_players, game.current_player), (2, 2))
+        game.pass_turn(2)
+        self.assertEqual(json.loads(game.auto_passed), [1])
+        self.assertEqual(game.current_player, 2)
+        self.assertFalse(game.game_over)
+
+
+class RematchTest(TransactionTestCase):
+    def test_rematch_redeals_in_place_with_the_next_seat_opening(self):
+        players = [{'player_num': 1, 'name': 'A', 'hand': []}, {'player_num': 2, 'name': 'B', 'hand': [[13, 'KH']]}]
+        game = Game.objects.create(room_code='RMT001', num_players=2, players_data=json.dumps(players),
+                                   is_game_started=True, game_over=True, winner_player_num=1,
+                                   game_scores=json.dumps([{'name': 'A', 'player_num': 1, 'score': 0},
+                                                           {'name': 'B', 'player_num': 2, 'score': 13}]))
+        headers = {'X-Player-Token': player_tokens.issue(game.game_id, 'B')}
+
+        for _ in range(2):  # both players press Rematch after round 1; only one deal happens
+            response = self.client.post(f'/rematch/{game.game_id}/', data=json.dumps({'round': 1}),
+                                        content_type='application/json', headers=headers)
+            self.assertEqual(response.json()['round_number'], 2)
+
+        game.refresh_from_db()
+        self.assertFalse(game.game_over)
+        self.assertEqual(game.current_player, 2)
+        self.assertIn([7, '7H'], json.loads(game.players_data)[1]['hand'])
+        self.assertEqual(json.loads(game.match_scores), {'A': 0, 'B': 13})
+        self.assertEqual(Game.objects.count(), 1)
+
+    def test_rematch_keeps_earlier_rounds_replayable_and_can_reset_the_scores(self):
+        players = [{'player_num': 1, 'name': 'A', 'hand': [[7, '7H']]}, {'player_num': 2, 'name': 'B', 'hand': [[13, 'KH']]}]
+        game = Game.objects.create(room_code='RMT002', num_players=2, players_data=json.dumps(players),
+                                   is_game_started=True, current_player=1, match_scores=json.dumps({'A': 5}),
+                                   desk_cards=json.dumps({'H': [], 'D': [], 'C': [], 'S': []}))
+        game.record_move(GameMove.DEAL)
+        game.save()
+        game.update_game_state_after_move(7, 1)
+        url, headers = f'/rematch/{game.game_id}/', {'X-Player-Token': player_tokens.issue(game.game_id, 'B')}
+
+        response = self.client.post(url, data='{"round":', content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 400)
+        for stranger in ({'X-Player-Token': player_tokens.issue(game.game_id, 'Z')}, {'X-Player-Token': 'forged'}, {}):
+            response = self.client.post(url, data=json.dumps({'round': 7}), content_type='application/json',
+                                        headers=stranger)
+            self.assertEqual(response.status_code, 403)
+            self.assertNotIn('round_number', response.json())
+        response = self.client.post(url, data=json.dumps({'round': 1, 'keep_scores': False}),
+                                    content_type='application/json', headers=headers)
+        self.assertEqual(response.json()['round_number'], 2)
+        game.refresh_from_db()
+        self.assertEqual(json.loads(game.match_scores), {})
+
+        # Round 2 is live, but every move of round 1 can still be replayed.
+        replayed = self.client.get(f'/replay/{game.game_id}/', {'move': 99}).json()
+        self.assertEqual((replayed['move'], replayed['last_move']), (1, 1))
+        self.assertEqual(replayed['state']['desk_cards']['H'], [[7, '7H']])
+        stream = self.client.get(f'/replay/{game.game_id}/stream/')
+        self.assertEqual(len(b''.join(stream.streaming_content).splitlines()), 2)
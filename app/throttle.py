@@ -0,0 +1,143 @@
+# badam_satti_app/throttle.py
+"""
+Per-player limits for the polling endpoints.
+
+A backgrounded or buggy tab can stack timers and call ``get_game_state``,
+``player_ping`` or ``check_room_status`` many times a second, and every call
+parses the whole game. ``throttled()`` puts two guards in front of such a
+view, keyed by (endpoint, game or room, player):
+
+* Coalescing: a request arriving while an identical one is still running
+  waits for it and answers with a copy of its response instead of running
+  the view again.
+* A token bucket (``REQUEST_THROTTLE_RATES``: requests per second and burst).
+  A request finding the bucket empty gets a small 429 with ``Retry-After``
+  without touching the game.
+
+Buckets live in this process, like the actors; with sharding a player's
+table, and so their bucket, stays on one node. ``REQUEST_THROTTLE=0`` turns
+both guards off.
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+from .metrics import registry
+
+# Requests that find an identical one running wait this long before giving up and running the view themselves.
+COALESCE_WAIT_SECONDS = 5.0
+SWEEP_EVERY = 10000
+
+
+class TokenBuckets:
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, key, rate, burst, now=None):
+        """(True, 0) if a token was taken for ``key``, else (False, seconds until the next one)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            self._takes += 1
+            if self._takes % SWEEP_EVERY == 0:
+                self._sweep(now)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return False, (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            return True, 0
+
+    def _sweep(self, now):
+        # A bucket that has refilled completely is the same as no bucket.
+        for key, (tokens, stamp) in list(self._buckets.items()):
+            rate, burst = _limits(key[0])
+            if tokens + (now - stamp) * rate >= burst:
+                del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class _Flight:
+    __slots__ = ('done', 'response')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+
+
+buckets = TokenBuckets()
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'REQUEST_THROTTLE', True)
+
+
+def _limits(endpoint):
+    return getattr(settings, 'REQUEST_THROTTLE_RATES', {}).get(endpoint, (None, None))
+
+
+def too_many_requests(retry_after):
+    response = JsonResponse({'status': 'error', 'message': 'Too many requests.'}, status=429)
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def _copy(response):
+    copied = HttpResponse(response.content, status=response.status_code, content_type=response['Content-Type'])
+    if response.has_header('ETag'):
+        copied['ETag'] = response['ETag']
+    return copied
+
+
+def throttled(endpoint, key):
+    """Coalesce and rate-limit a view per ``key(request, *args, **kwargs)``, e.g. (game_id, player_num)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate, burst = _limits(endpoint)
+            if not enabled() or rate is None:
+                return view(request, *args, **kwargs)
+
+            flight_key = (endpoint, request.method, request.get_full_path(), *key(request, *args, **kwargs))
+            with _flights_lock:
+                flight = _flights.get(flight_key)
+                leader = flight is None
+                if leader:
+                    allowed, retry_after = buckets.take((endpoint, *flight_key[3:]), rate, burst)
+                    if not allowed:
+                        THROTTLED.inc(endpoint=endpoint)
+                        return too_many_requests(retry_after)
+                    flight = _flights[flight_key] = _Flight()
+
+            if not leader:
+                if flight.done.wait(COALESCE_WAIT_SECONDS) and flight.response is not None:
+                    COALESCED.inc(endpoint=endpoint)
+                    return _copy(flight.response)
+                return view(request, *args, **kwargs)
+
+            try:
+                response = view(request, *args, **kwargs)
+                # Followers copy from a snapshot: middleware (gzip) rewrites the leader's response on its way out.
+                flight.response = _copy(response)
+                return response
+            finally:
+                with _flights_lock:
+                    del _flights[flight_key]
+                flight.done.set()
+        return wrapper
+    return decorator
+
+
+THROTTLED = registry.counter('badam_throttled_total', 'Polling requests refused with 429, by endpoint.')
+COALESCED = registry.counter('badam_coalesced_total', 'Polling requests answered from an identical one in flight.')
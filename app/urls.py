@@ -1,7 +1,8 @@
 # badam_satti_app/urls.py
 
-from django.urls import path
-from . import views
+from django.conf import settings
+from django.urls import path, re_path
+from . import assets, views
 
 urlpatterns = [
     path('', views.index, name='index'),
@@ -15,10 +16,19 @@ urlpatterns = [
     path('get_game_state/<str:game_id>/', views.get_game_state, name='get_game_state'),
     path('play_card/<str:game_id>/', views.play_card, name='play_card'),
     path('start_game/<str:game_id>/', views.start_game, name='start_game'),
+    path('rematch/<str:game_id>/', views.rematch, name='rematch'),
+    path('lobby/', views.lobby_rooms, name='lobby'),
+    path('play_now/', views.play_now, name='play_now'),
+    path('play_now/<str:ticket_id>/', views.play_now_status, name='play_now_status'),
     path('check_room_status/<str:room_code>/', views.check_room_status, name='check_room_status'),
     path('remove_player/<str:game_id>/', views.remove_player, name='remove_player'),
     path('reconnect_player/<str:game_id>/', views.reconnect_player, name='reconnect_player'),
     path('player_ping/<str:game_id>/', views.player_ping, name='player_ping'),
+    path('replay/<uuid:game_id>/', views.replay_move, name='replay_move'),
+    path('replay/<uuid:game_id>/stream/', views.replay_stream, name='replay_stream'),
+    path('spectate/<uuid:game_id>/', views.spectate, name='spectate'),
+    path('metrics/', views.metrics, name='metrics'),
+    re_path(r'^%s(?P<path>.+)$' % settings.STATIC_URL.lstrip('/'), assets.static_file, name='static_file'),
 
     # The old rejoin URLs have been removed as this functionality is now handled by the 'join_room' view.
 ]
\ No newline at end of file
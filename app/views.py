@@ -1,46 +1,37 @@
-import random
+import hashlib
 import json
-import uuid # For generating unique game IDs
+import logging
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse, StreamingHttpResponse
+from django.conf import settings
 from django.views.decorators.http import require_POST, require_GET
-from django.utils import timezone
-from datetime import timedelta
-import re
-
-from .models import Game # Your new Game model
-
-# --- Your original game logic functions ---
-CARDS_MAP = {
-    1:"AH", 2:"2H", 3:"3H", 4:"4H", 5:"5H", 6:"6H", 7:"7H", 8:"8H", 9:"9H", 10:"TH", 11:"JH", 12:"QH", 13:"KH",
-    14:"AD", 15:"2D", 16:"3D", 17: "4D", 18: "5D", 19: "6D", 20: "7D", 21: "8D", 22: "9D", 23: "TD", 24: "JD", 25: "QD", 26: "KD",
-    27: "AC", 28: "2C", 29: "3C", 30: "4C", 31: "5C", 32: "6C", 33: "7C", 34: "8C", 35: "9C", 36: "TC", 37: "JC", 38: "QC", 39: "KC",
-    40: "AS", 41: "2S", 42: "3S", 43: "4S", 44: "5S", 45: "6S", 46: "7S", 47: "8S", 48: "9S", 49: "TS", 50: "JS", 51: "QS", 52: "KS",
-}
-
-def create_shuffled_deck():
-    deck = [(num, card_str) for num, card_str in CARDS_MAP.items()]
-    random.shuffle(deck)
-    return deck
-
-def get_cards_distributed(shuffled_deck, num_players):
-    players_hands = {i: [] for i in range(1, num_players + 1)}
-    current_deck = list(shuffled_deck)
-    while current_deck:
-        for player_num in range(1, num_players + 1):
-            if not current_deck:
-                break
-            card = current_deck.pop(0)
-            players_hands[player_num].append(card)
-    return players_hands
+
+from .log import log_game
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, json_dumps, json_loads, registry, scrape_allowed
+from . import actors, cadence, clock, dealing, lobby, matchmaking, player_tokens, replay
+from .pages import render_page
+from .throttle import throttled
+from .models import ROOM_TTL_SECONDS, Game, GameMove # Your new Game model
+from .room_codes import create_game, release_room_code
+
+logger = logging.getLogger(__name__)
+
+
+def _player_key(request, game_id):
+    return str(game_id), player_tokens.player_name_from_request(request, game_id)
+
+
+def _room_player_key(request, room_code):
+    return room_code, request.session.get('player_name')
+
 
 # --- Django Views ---
 def index(request):
-    return render(request, 'index.html')
+    return render_page(request, 'index.html')
 
 def rules(request):
-    return render(request, 'rules.html')
+    return render_page(request, 'rules.html')
 
 def create_room(request):
     if request.method == 'POST':
@@ -51,24 +42,25 @@ def create_room(request):
             return HttpResponseBadRequest("Player name and number of players are required.")
 
         num_players = int(num_players)
+        is_public = request.POST.get('is_public') == 'on'
+        auto_pass = request.POST.get('auto_pass') == 'on'
 
-        while True:
-            room_code = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=6))
-            if not Game.objects.filter(room_code=room_code).exists():
-                break
-
-        players_data = json.dumps([
-            {"player_num": 1, "name": player_name, "hand": [], "last_ping_time": timezone.now().isoformat()}
+        players_data = json_dumps([
+            {"player_num": 1, "name": player_name, "hand": [], "last_ping_time": clock.now().isoformat()}
         ])
 
-        game = Game.objects.create(
-            room_code=room_code,
+        # The allocator relies on the unique index instead of probing for a free code.
+        game = create_game(
             num_players=num_players,
             players_data=players_data,
             current_player=1,
             is_game_started=False,
-            game_over=False
+            game_over=False,
+            is_public=is_public,
+            auto_pass=auto_pass,
         )
+        room_code = game.room_code
+        lobby.publish(lobby.entry(game))
 
         request.session['player_name'] = player_name
         request.session['room_code'] = room_code
@@ -94,72 +86,67 @@ def join_room(request):
         except Game.DoesNotExist:
             return render(request, 'join-room.html', {'error': f'No game found with room code "{room_code}".'})
 
-        if not game.is_game_started and (timezone.now() - game.created_at).total_seconds() > 300:
+        if game.room_expired():
             return render(request, 'join-room.html', {'error': 'This game invitation has expired.'})
 
-        players_data = json.loads(game.players_data)
-
-        existing_player_data = next((p for p in players_data if p['name'].lower() == player_name.lower()), None)
-
-        if existing_player_data:
-            player_num = existing_player_data['player_num']
-
-            request.session['player_name'] = existing_player_data['name']
-            request.session['room_code'] = room_code
-            request.session['player_num'] = player_num
-            request.session['game_id'] = str(game.game_id)
+        # Decide and apply in one step so two joins cannot both take the last seat.
+        def join(game):
+            players_data = json_loads(game.players_data)
+            existing_player_data = next((p for p in players_data if p['name'].lower() == player_name.lower()), None)
 
-            if game.disconnected_player == player_num:
-                game.disconnected_player = None
-                game.reconnect_timer_start = None
-                game.save()
-                print(f"DEBUG: Player {player_name} (Player {player_num}) successfully rejoined game {game.game_id} via room code.")
+            if existing_player_data:
+                player_num = existing_player_data['player_num']
+                if game.disconnected_player == player_num:
+                    game.disconnected_player = None
+                    game.reconnect_timer_start = None
+                    log_game(logger, logging.DEBUG, "Player %s (Player %s) successfully rejoined via room code.",
+                             player_name, player_num, game=game, player_num=player_num)
+                return None, player_num, existing_player_data['name'], game.is_game_started, None
 
             if game.is_game_started:
-                return redirect('play_game', game_id=str(game.game_id))
-            else:
-                return redirect('waiting_room', room_code=room_code)
-
-        else:
-            if game.is_game_started:
-                return render(request, 'join-room.html', {'error': 'This game has already started. You cannot join as a new player.'})
+                return 'This game has already started. You cannot join as a new player.', None, None, True, None
 
             if len(players_data) >= game.num_players:
-                return render(request, 'join-room.html', {'error': 'This room is already full.'})
+                return 'This room is already full.', None, None, False, None
 
             new_player_num = len(players_data) + 1
             players_data.append({
                 "player_num": new_player_num,
                 "name": player_name,
                 "hand": [],
-                "last_ping_time": timezone.now().isoformat()
+                "last_ping_time": clock.now().isoformat()
             })
-            game.players_data = json.dumps(players_data)
-            game.save()
-
-            request.session['player_name'] = player_name
-            request.session['room_code'] = room_code
-            request.session['player_num'] = new_player_num
-            request.session['game_id'] = str(game.game_id)
-
-            print(f"DEBUG: {player_name} joined room {room_code} as Player {new_player_num}.")
+            game.players_data = json_dumps(players_data)
+            game.seats_taken = len(players_data)
+            log_game(logger, logging.DEBUG, "%s joined room as Player %s.", player_name, new_player_num,
+                     game=game, player_num=new_player_num)
+            return None, new_player_num, player_name, False, lobby.entry(game)
+
+        error, player_num, joined_name, is_game_started, lobby_room = actors.mutate(game.game_id, join)
+        if error:
+            return render(request, 'join-room.html', {'error': error})
+        lobby.publish(lobby_room)
+
+        request.session['player_name'] = joined_name
+        request.session['room_code'] = room_code
+        request.session['player_num'] = player_num
+        request.session['game_id'] = str(game.game_id)
 
-            return redirect('waiting_room', room_code=room_code)
+        if is_game_started:
+            return redirect('play_game', game_id=str(game.game_id))
+        return redirect('waiting_room', room_code=room_code)
 
-    return render(request, 'join-room.html')
+    return render_page(request, 'join-room.html')
 
 def wait_room(request, room_code):
     try:
         game = get_object_or_404(Game, room_code=room_code)
 
         player_name = request.session.get('player_name')
-        player_num = request.session.get('player_num')
         session_game_id = request.session.get('game_id')
+        player_num = player_tokens.seat_of(game, player_name)
 
-        players_data = json.loads(game.players_data)
-        player_exists_in_game = any(p['name'] == player_name for p in players_data)
-
-        if not player_name or not player_num or str(game.game_id) != session_game_id or not player_exists_in_game:
+        if not player_num or str(game.game_id) != session_game_id:
              if 'player_name' in request.session: del request.session['player_name']
              if 'room_code' in request.session: del request.session['room_code']
              if 'player_num' in request.session: del request.session['player_num']
@@ -176,26 +163,27 @@ def wait_room(request, room_code):
             'room_share_url': room_share_url,
             'room_game_id': str(game.game_id)
         })
-    except Exception as e:
-        print(f"Error in waiting room view: {e}")
+    except Exception:
+        log_game(logger, logging.ERROR, "Error in waiting room view", room_code=room_code, exc_info=True)
         return redirect('index')
 
 @require_GET
+@throttled('check_room_status', _room_player_key)
 def check_room_status(request, room_code):
     try:
         game = Game.objects.get(room_code=room_code)
 
-        if not game.is_game_started:
-            time_elapsed = (timezone.now() - game.created_at).total_seconds()
-            if time_elapsed > 300: # 5 minutes
-                game.delete()
-                return JsonResponse({
-                    'status': 'expired',
-                    'message': 'Room expired because not all players joined within 5 minutes.',
-                    'redirect_url': '/index/'
-                })
-
-        players_data = json.loads(game.players_data)
+        if game.room_expired():
+            actors.delete_game(game.game_id)
+            release_room_code(room_code)
+            lobby.publish(lobby.entry(game))
+            return JsonResponse({
+                'status': 'expired',
+                'message': 'Room expired because not all players joined within 5 minutes.',
+                'redirect_url': '/index/'
+            })
+
+        players_data = json_loads(game.players_data)
         current_players = [{'name': p['name'], 'player_num': p['player_num']} for p in players_data]
 
         player_name = request.session.get('player_name')
@@ -210,7 +198,7 @@ def check_room_status(request, room_code):
                 'redirect_url': f'/play_game/{game.game_id}/'
             })
 
-        time_left = 300 - (timezone.now() - game.created_at).total_seconds()
+        time_left = ROOM_TTL_SECONDS - (clock.now() - game.created_at).total_seconds()
 
         return JsonResponse({
             'status': 'waiting',
@@ -226,7 +214,8 @@ def check_room_status(request, room_code):
             'message': 'Room not found. It may have expired or never existed.',
             'redirect_url': '/index/'
         }, status=404)
-    except Exception as e:
+    except Exception:
+        log_game(logger, logging.ERROR, "Unhandled error in check_room_status", room_code=room_code, exc_info=True)
         return JsonResponse({'status': 'error', 'message': 'An unexpected error occurred.'}, status=500)
 
 @require_GET
@@ -235,27 +224,34 @@ def game_view(request, game_id):
         game = get_object_or_404(Game, game_id=game_id)
 
         player_name = request.session.get('player_name')
-        player_num = request.session.get('player_num')
         session_game_id = request.session.get('game_id')
 
-        players_data = json.loads(game.players_data)
-        player_exists_in_game = any(p['name'] == player_name for p in players_data)
-
-        if not player_name or not player_num or str(game.game_id) != session_game_id or not player_exists_in_game:
+        if str(game.game_id) != session_game_id or not player_tokens.seat_of(game, player_name):
             return redirect('index')
 
-        return render(request, 'BadamSatti.html', {'game_id': game_id})
-    except Exception as e:
+        return render(request, 'BadamSatti.html', {
+            'game_id': game_id,
+            'player_token': player_tokens.issue(game.game_id, player_name),
+        })
+    except Exception:
+        log_game(logger, logging.ERROR, "Unhandled error in game_view", game_id=game_id, exc_info=True)
         return redirect('index')
 
 @require_GET
+@throttled('get_game_state', _player_key)
 def get_game_state(request, game_id):
     try:
-        game = Game.objects.get(game_id=game_id)
+        game = actors.snapshot(game_id)
 
-        player_num = request.session.get('player_num')
+        # Timeouts are only applied (through the game's actor) when one is due;
+        # otherwise a poll is a pure read of the snapshot.
+        if game.lifecycle_check_due(ping_timeout_seconds=20):
+            actors.mutate(game_id, lambda live: live.run_lifecycle_checks(ping_timeout_seconds=20, commit=False))
+            game = actors.snapshot(game_id)
 
-        players_data_list = json.loads(game.players_data)
+        # Looked up after the checks, which renumber the seats when they remove someone.
+        player_num = player_tokens.player_num_from_request(request, game)
+        players_data_list = json_loads(game.players_data)
 
         current_player_data = next((p for p in players_data_list if p['player_num'] == player_num), None)
 
@@ -264,11 +260,6 @@ def get_game_state(request, game_id):
 
         player_hand = current_player_data.get('hand', [])
 
-        game.check_for_termination()
-
-        if game.disconnected_player is None and game.is_game_started and not game.game_over:
-            game.check_for_player_inactivity(ping_timeout_seconds=20)
-
         valid_moves = game.get_valid_moves_for_player(player_num)
 
         players_info = []
@@ -294,7 +285,7 @@ def get_game_state(request, game_id):
             'num_players': game.num_players,
             'players': players_info,
             'current_player_turn': game.current_player,
-            'desk_cards': json.loads(game.desk_cards),
+            'desk_cards': json_loads(game.desk_cards),
             'your_hand': player_hand,
             'your_player_num': player_num,
             'valid_moves': valid_moves,
@@ -304,144 +295,192 @@ def get_game_state(request, game_id):
             'message': game_message,
             'disconnected_player': game.disconnected_player,
             'terminated_due_to_disconnect': game.terminated_due_to_disconnect,
+            'auto_pass': game.auto_pass,
+            'auto_passed': json_loads(game.auto_passed),
+            'move_count': game.move_count,
+            'round_number': game.round_number,
+            'match_scores': json_loads(game.match_scores),
+            **cadence.next_intervals(game, player_num),
         }
         
         if game.game_over:
             try:
-                response_data['scores'] = json.loads(game.game_scores)
+                response_data['scores'] = json_loads(game.game_scores)
             except (json.JSONDecodeError, TypeError):
                 response_data['scores'] = []
 
-        if game.disconnected_player is not None and game.reconnect_timer_start:
-            time_since_disconnect = timezone.now() - game.reconnect_timer_start
-            time_left_seconds = 120 - time_since_disconnect.total_seconds()
-            response_data['reconnect_time_left'] = max(0, int(time_left_seconds))
-        else:
-            response_data['reconnect_time_left'] = 0
+        response_data['reconnect_time_left'] = game.reconnect_time_left()
 
         return JsonResponse(response_data)
     except Game.DoesNotExist:
         return JsonResponse({'status': 'error', 'message': 'Game not found.'}, status=404)
-    except Exception as e:
+    except Exception:
+        log_game(logger, logging.ERROR, "Unhandled error in get_game_state", game_id=game_id, exc_info=True)
         return JsonResponse({'status': 'error', 'message': 'An unexpected error occurred.'}, status=500)
 
 @require_POST
 def play_card(request, game_id):
     try:
-        game = Game.objects.get(game_id=game_id)
+        player_name = player_tokens.player_name_from_request(request, game_id)
+        data = json_loads(request.body)
+        card_num_to_play = data.get('card_num')
 
-        if game.disconnected_player is not None or game.terminated_due_to_disconnect:
-            return JsonResponse({'status': 'error', 'message': 'Game is currently paused or terminated.'}, status=400)
+        def play(game):
+            player_num = player_tokens.seat_of(game, player_name)
+            if game.disconnected_player is not None or game.terminated_due_to_disconnect:
+                return 400, {'status': 'error', 'message': 'Game is currently paused or terminated.'}
 
-        player_num = request.session.get('player_num')
-        if not player_num or game.current_player != player_num:
-            return JsonResponse({'status': 'error', 'message': 'It is not your turn.'}, status=403)
+            if not player_num or game.current_player != player_num:
+                return 403, {'status': 'error', 'message': 'It is not your turn.'}
 
-        data = json.loads(request.body)
-        card_num_to_play = data.get('card_num')
+            if not card_num_to_play:
+                return 400, {'status': 'error', 'message': 'Card not specified.'}
 
-        if not card_num_to_play:
-            return JsonResponse({'status': 'error', 'message': 'Card not specified.'}, status=400)
-
-        valid_moves = game.get_valid_moves_for_player(player_num)
-        if card_num_to_play not in valid_moves:
-            return JsonResponse({'status': 'error', 'message': 'Invalid move.'}, status=400)
+            valid_moves = game.get_valid_moves_for_player(player_num)
+            if card_num_to_play not in valid_moves:
+                return 400, {'status': 'error', 'message': 'Invalid move.'}
 
-        game.update_game_state_after_move(card_num_to_play, player_num)
+            game.update_game_state_after_move(card_num_to_play, player_num, commit=False)
 
-        game.refresh_from_db()
+            if game.game_over:
+                winner_data = game.get_player_data(player_num)
+                winner_name = winner_data['name'] if winner_data else f"Player {player_num}"
+                return 200, {'status': 'success', 'game_over': True, 'message': f'{winner_name} has won the game!'}
 
-        if game.game_over:
-            winner_data = game.get_player_data(player_num)
-            winner_name = winner_data['name'] if winner_data else f"Player {player_num}"
-            return JsonResponse({'status': 'success', 'game_over': True, 'message': f'{winner_name} has won the game!'})
+            return 200, {'status': 'success', 'game_over': False}
 
-        return JsonResponse({'status': 'success', 'game_over': False})
+        status, payload = actors.mutate(game_id, play)
+        return JsonResponse(payload, status=status)
     except Game.DoesNotExist:
         return JsonResponse({'status': 'error', 'message': 'Game not found.'}, status=404)
-    except Exception as e:
+    except Exception:
+        log_game(logger, logging.ERROR, "Unhandled error in play_card", game_id=game_id, exc_info=True)
         return JsonResponse({'status': 'error', 'message': 'An unexpected error occurred.'}, status=500)
 
 @require_POST
 def pass_turn(request, game_id):
     try:
-        game = Game.objects.get(game_id=game_id)
-
-        if game.disconnected_player is not None or game.terminated_due_to_disconnect:
-            return JsonResponse({'status': 'error', 'message': 'Game is currently paused.'}, status=400)
+        player_name = player_tokens.player_name_from_request(request, game_id)
 
-        player_num = request.session.get('player_num')
+        def pass_(game):
+            player_num = player_tokens.seat_of(game, player_name)
+            if game.disconnected_player is not None or game.terminated_due_to_disconnect:
+                return 400, {'status': 'error', 'message': 'Game is currently paused.'}
 
-        if not player_num or game.current_player != player_num:
-            return JsonResponse({'status': 'error', 'message': 'It is not your turn.'}, status=403)
+            if not player_num or game.current_player != player_num:
+                return 403, {'status': 'error', 'message': 'It is not your turn.'}
 
-        success, message = game.pass_turn(player_num)
+            success, message = game.pass_turn(player_num, commit=False)
+            if success:
+                return 200, {'status': 'success', 'message': message}
+            return 400, {'status': 'error', 'message': message}
 
-        if success:
-            return JsonResponse({'status': 'success', 'message': message})
-        else:
-            return JsonResponse({'status': 'error', 'message': message}, status=400)
+        status, payload = actors.mutate(game_id, pass_)
+        return JsonResponse(payload, status=status)
     except Game.DoesNotExist:
         return JsonResponse({'status': 'error', 'message': 'Game not found.'}, status=404)
-    except Exception as e:
+    except Exception:
+        log_game(logger, logging.ERROR, "Unhandled error in pass_turn", game_id=game_id, exc_info=True)
         return JsonResponse({'status': 'error', 'message': 'An unexpected error occurred.'}, status=500)
 
+def _deal_into(game, players_data, dealt):
+    now = clock.now().isoformat()
+    for p_data in players_data:
+        p_data['hand'] = dealt.hands[p_data['player_num']]
+        p_data['last_ping_time'] = now
+
+    game.players_data = json_dumps(players_data)
+    game.deal_seed = dealt.seed
+    game.current_player = dealt.first_player
+    game.is_game_started = True
+    game.desk_cards = json_dumps({ "H": [], "D": [], "C": [], "S": [] })
+    game.record_move(GameMove.DEAL)
+
 @require_POST
 def start_game(request, game_id):
     try:
-        game = get_object_or_404(Game, game_id=game_id)
-        player_num = request.session.get('player_num')
+        player_name = player_tokens.player_name_from_request(request, game_id)
 
-        if player_num != 1:
-            return JsonResponse({'status': 'error', 'message': 'Only the host can start the game.'}, status=403)
-
-        players_data = json.loads(game.players_data)
-        if len(players_data) < game.num_players:
-            return JsonResponse({'status': 'error', 'message': 'Not all players have joined yet.'}, status=400)
-
-        if game.is_game_started:
-            return JsonResponse({'status': 'error', 'message': 'The game has already started.'}, status=400)
+        def start(game):
+            if player_tokens.seat_of(game, player_name) != 1:
+                return 403, {'status': 'error', 'message': 'Only the host can start the game.'}, None
 
-        shuffled_deck = create_shuffled_deck()
-        players_hands = get_cards_distributed(shuffled_deck, game.num_players)
+            players_data = json_loads(game.players_data)
+            if len(players_data) < game.num_players:
+                return 400, {'status': 'error', 'message': 'Not all players have joined yet.'}, None
 
-        first_player_num = None
-        card_7h_num = 7 # The card number for 7 of Hearts
-
-        for p_data in players_data:
-            p_num = p_data['player_num']
-            if p_num in players_hands:
-                p_data['hand'] = players_hands[p_num]
-            p_data['last_ping_time'] = timezone.now().isoformat()
-            if any(card[0] == card_7h_num for card in p_data['hand']):
-                first_player_num = p_num
-
-        if first_player_num is None:
-             # Fallback: if 7H isn't found (should never happen), assign to player 1
-            first_player_num = 1
+            if game.is_game_started:
+                return 400, {'status': 'error', 'message': 'The game has already started.'}, None
 
-        game.players_data = json.dumps(players_data)
-        game.current_player = first_player_num
-        game.is_game_started = True
-        game.desk_cards = json.dumps({ "H": [], "D": [], "C": [], "S": [] })
-        game.save()
+            _deal_into(game, players_data, dealing.deal(game.num_players, game.deal_seed))
+            return 200, {'status': 'success', 'redirect_url': f'/play_game/{game.game_id}/'}, lobby.entry(game)
 
-        return JsonResponse({'status': 'success', 'redirect_url': f'/play_game/{game.game_id}/'})
+        status, payload, lobby_room = actors.mutate(game_id, start)
+        lobby.publish(lobby_room)
+        return JsonResponse(payload, status=status)
     except Exception as e:
+        log_game(logger, logging.ERROR, "Unhandled error in start_game", game_id=game_id, exc_info=True)
         return JsonResponse({'status': 'error', 'message': f'An unexpected error occurred: {str(e)}'}, status=500)
 
 @require_POST
-def remove_player(request, game_id):
+def rematch(request, game_id):
+    """
+    Re-deal a finished game in place: same row, seats, names, sessions and
+    sockets. The opening seat moves one place round the table each round. The
+    round's scores are added to the match totals, or with ``keep_scores``
+    false the totals start again from nothing. ``round`` is the round the
+    caller saw finish, so when several players press Rematch only the first
+    one deals. The move log carries on from the old rounds, which stay
+    replayable (see _replayable_seq).
+    """
     try:
-        game = Game.objects.get(game_id=game_id)
+        player_name = player_tokens.player_name_from_request(request, game_id)
+        data = json_loads(request.body or b'{}')
+        seen_round = data.get('round')
+        keep_scores = data.get('keep_scores', True)
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'The body must be a JSON object.'}, status=400)
+
+    def rematch_(game):
+        # Seat first: someone not at the table learns nothing, not even the round number.
+        if not player_tokens.seat_of(game, player_name):
+            return 403, {'status': 'error', 'message': 'You are not seated at this table.'}
+        if seen_round is not None and seen_round != game.round_number:
+            return 200, {'status': 'success', 'round_number': game.round_number}
+        if not game.game_over or game.terminated_due_to_disconnect:
+            return 400, {'status': 'error', 'message': 'Only a finished game can be played again.'}
+
+        totals = {}
+        if keep_scores:
+            totals = json_loads(game.match_scores)
+            for row in json_loads(game.game_scores):
+                totals[row['name']] = totals.get(row['name'], 0) + row['score']
+
+        opener = game.round_number % game.num_players + 1
+        _deal_into(game, json_loads(game.players_data), dealing.deal(game.num_players, first_player=opener))
+        game.round_number += 1
+        game.match_scores = json_dumps(totals)
+        game.game_over = False
+        game.winner_player_num = None
+        game.game_scores = '{}'
+        game.auto_passed = '[]'
+        game.disconnected_player = None
+        game.reconnect_timer_start = None
+        return 200, {'status': 'success', 'round_number': game.round_number}
+
+    try:
+        status, payload = actors.mutate(game_id, rematch_)
     except Game.DoesNotExist:
         return JsonResponse({'status': 'error', 'message': 'Game not found.'}, status=404)
+    return JsonResponse(payload, status=status)
 
-    requesting_player_num = request.session.get('player_num')
-    if requesting_player_num != 1:
+@require_POST
+def remove_player(request, game_id):
+    player_name = player_tokens.player_name_from_request(request, game_id)
+    if not player_name:
         return JsonResponse({'status': 'error', 'message': 'Only the host can remove players.'}, status=403)
 
-    data = json.loads(request.body)
+    data = json_loads(request.body)
     player_to_remove_num = data.get('player_num_to_remove')
 
     if not player_to_remove_num:
@@ -452,71 +491,197 @@ def remove_player(request, game_id):
     if player_to_remove_num == 1:
         return JsonResponse({'status': 'error', 'message': 'You cannot remove yourself.'}, status=400)
 
-    players_data = json.loads(game.players_data)
-    new_players_data = [p for p in players_data if p['player_num'] != player_to_remove_num]
+    def remove(game):
+        if player_tokens.seat_of(game, player_name) != 1:
+            return 403, {'status': 'error', 'message': 'Only the host can remove players.'}, None
 
-    if len(new_players_data) == len(players_data):
-        return JsonResponse({'status': 'error', 'message': 'Player not found in the room.'}, status=404)
+        players_data = json_loads(game.players_data)
+        new_players_data = [p for p in players_data if p['player_num'] != player_to_remove_num]
 
-    # Re-number the remaining players to keep the sequence
-    for i, player in enumerate(new_players_data):
-        player['player_num'] = i + 1
+        if len(new_players_data) == len(players_data):
+            return 404, {'status': 'error', 'message': 'Player not found in the room.'}, None
 
-    game.players_data = json.dumps(new_players_data)
-    game.save()
+        # Re-number the remaining players to keep the sequence
+        for i, player in enumerate(new_players_data):
+            player['player_num'] = i + 1
 
-    return JsonResponse({'status': 'success', 'message': 'Player removed successfully.'})
+        game.players_data = json_dumps(new_players_data)
+        game.seats_taken = len(new_players_data)
+        return 200, {'status': 'success', 'message': 'Player removed successfully.'}, lobby.entry(game)
+
+    try:
+        status, payload, lobby_room = actors.mutate(game_id, remove)
+    except Game.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Game not found.'}, status=404)
+    lobby.publish(lobby_room)
+    return JsonResponse(payload, status=status)
 
 @require_POST
 def reconnect_player(request, game_id):
-    player_name = request.session.get('player_name')
-    player_num = request.session.get('player_num')
+    player_name = player_tokens.player_name_from_request(request, game_id)
 
-    if not player_name or not player_num:
+    if not player_name:
         return JsonResponse({'status': 'error', 'message': 'Session expired. Please rejoin.'}, status=400)
 
+    def reconnect(game):
+        player_num = player_tokens.seat_of(game, player_name)
+        if not player_num:
+            return False, None
+        return game.handle_player_reconnect(player_num, commit=False)
+
     try:
-        game = Game.objects.get(game_id=game_id)
+        reconnected, _ = actors.mutate(game_id, reconnect)
 
-        if game.disconnected_player == player_num:
-            game.disconnected_player = None
-            game.reconnect_timer_start = None
-            game.save()
+        if reconnected:
             return JsonResponse({'status': 'success', 'message': 'Reconnected successfully!'})
         else:
             return JsonResponse({'status': 'error', 'message': 'You are not the disconnected player.'}, status=400)
     except Game.DoesNotExist:
         return JsonResponse({'status': 'error', 'message': 'Game not found.'}, status=404)
     except Exception as e:
+        log_game(logger, logging.ERROR, "Unhandled error in reconnect_player", game_id=game_id, exc_info=True)
         return JsonResponse({'status': 'error', 'message': f'An error occurred: {str(e)}'}, status=500)
 
 
 @require_POST
+@throttled('player_ping', _player_key)
 def player_ping(request, game_id):
-    player_num = request.session.get('player_num')
-    player_name = request.session.get('player_name')
+    player_name = player_tokens.player_name_from_request(request, game_id)
 
-    if not player_num or not player_name:
+    if not player_name:
         return JsonResponse({'status': 'error', 'message': 'Session expired.'}, status=401)
 
     try:
-        game = Game.objects.get(game_id=game_id)
+        def ping(game):
+            player_num = player_tokens.seat_of(game, player_name)
+            if not player_num or not game.receive_ping(player_num, commit=False):
+                # This can happen if the player was removed due to timeout
+                return 403, {'status': 'error', 'message': 'You are no longer in this game.'}
+            return 200, {'status': 'success', 'message': 'Ping received.', **cadence.next_intervals(game, player_num)}
+
+        status, payload = actors.mutate(game_id, ping, durable=False)
+        return JsonResponse(payload, status=status)
+    except Game.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Game not found.'}, status=404)
+    except Exception as e:
+        log_game(logger, logging.ERROR, "Unhandled error in player_ping", game_id=game_id, exc_info=True)
+        return JsonResponse({'status': 'error', 'message': f'An error occurred: {str(e)}'}, status=500)
+
+
+@require_GET
+def lobby_rooms(request):
+    try:
+        num_players = int(request.GET['num_players']) if request.GET.get('num_players') else None
+        min_free_seats = max(int(request.GET.get('free_seats', 1)), 1)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'num_players and free_seats must be numbers.'},
+                            status=400)
+
+    body = json_dumps({'status': 'success', 'rooms': lobby.open_rooms(num_players, min_free_seats)})
+    etag = '"%s"' % hashlib.md5(body.encode()).hexdigest()
+    if request.headers.get('If-None-Match', '').removeprefix('W/') == etag:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+# --- Quick match ---
+@require_POST
+def play_now(request):
+    player_name = request.POST.get('player_name', '').strip()
+    if not player_name:
+        return JsonResponse({'status': 'error', 'message': 'Player name is required.'}, status=400)
+    try:
+        ticket = matchmaking.matchmaker().enqueue(player_name, int(request.POST.get('num_players', '')))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Tables seat 2 to 8 players.'}, status=400)
 
-        players_data = json.loads(game.players_data)
-        player_in_game = any(p['player_num'] == player_num for p in players_data)
+    request.session['matchmaking_ticket'] = ticket.ticket_id
+    return JsonResponse({'status': 'queued', 'ticket': ticket.ticket_id,
+                         'poll_url': f'/play_now/{ticket.ticket_id}/'})
 
-        if not player_in_game:
-            # This can happen if the player was removed due to timeout
-            return JsonResponse({'status': 'error', 'message': 'You are no longer in this game.'}, status=403)
+@require_GET
+def play_now_status(request, ticket_id):
+    queue = matchmaking.matchmaker()
+    ticket = queue.poll(ticket_id)
+    if ticket is None or request.session.get('matchmaking_ticket') != ticket_id:
+        return JsonResponse({'status': 'expired', 'message': 'Your place in the queue has expired.'}, status=404)
+    if ticket.seat is None:
+        return JsonResponse({'status': 'waiting', 'queued': queue.depth(ticket.num_players)})
+
+    game_id, room_code, player_num, player_name = ticket.seat
+    request.session['player_name'] = player_name
+    request.session['room_code'] = room_code
+    request.session['player_num'] = player_num
+    request.session['game_id'] = game_id
+    del request.session['matchmaking_ticket']
+    queue.done(ticket_id)
+    return JsonResponse({'status': 'matched', 'redirect_url': f'/play_game/{game_id}/'})
+
+
+# --- Replays ---
+def _replayable_seq(game_id):
+    """
+    (last move that may be replayed, error response). Full hands are only
+    shown once nobody can use them: the whole log once the game is over, and
+    while a rematch is being played every move before its deal. See spectate
+    for live games.
+    """
+    game_over = Game.objects.filter(game_id=game_id).values_list('game_over', flat=True).first()
+    if game_over is None:
+        return None, JsonResponse({'status': 'error', 'message': 'Game not found.'}, status=404)
+    last = replay.last_finished_seq(game_id, game_over)
+    if last is None:
+        return None, JsonResponse({'status': 'error', 'message': 'Replays are available once the game is over.'},
+                                  status=403)
+    return last, None
 
-        if game.disconnected_player == player_num:
-            game.disconnected_player = None
-            game.reconnect_timer_start = None
+@require_GET
+def replay_move(request, game_id):
+    try:
+        last, error = _replayable_seq(game_id)
+        if error:
+            return error
+        seq = min(int(request.GET.get('move', last)), last)
+        if seq < 0:
+            return JsonResponse({'status': 'error', 'message': 'move must be 0 or more.'}, status=400)
+        return JsonResponse({'status': 'success', 'move': seq, 'last_move': last,
+                             'state': replay.state_at(game_id, seq)})
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'move must be a number.'}, status=400)
+    except replay.NoMoves:
+        return JsonResponse({'status': 'error', 'message': 'No moves were recorded for this game.'}, status=404)
 
-        game.update_player_ping_time(player_num)
+@require_GET
+def replay_stream(request, game_id):
+    try:
+        last, error = _replayable_seq(game_id)
+    except replay.NoMoves:
+        return JsonResponse({'status': 'error', 'message': 'No moves were recorded for this game.'}, status=404)
+    if error:
+        return error
+    return StreamingHttpResponse(replay.frames(game_id, last), content_type='application/x-ndjson')
 
-        return JsonResponse({'status': 'success', 'message': 'Ping received.'})
-    except Game.DoesNotExist:
-        return JsonResponse({'status': 'error', 'message': 'Game not found.'}, status=404)
-    except Exception as e:
-        return JsonResponse({'status': 'error', 'message': f'An error occurred: {str(e)}'}, status=500)
\ No newline at end of file
+@require_GET
+def spectate(request, game_id):
+    """A live game as it stood ``delay`` moves ago, from the move log only."""
+    try:
+        delay = max(int(request.GET.get('delay', settings.REPLAY_SPECTATE_DELAY)), settings.REPLAY_SPECTATE_DELAY)
+        last = replay.last_seq(game_id)
+        seq = max(last - delay, 0)
+        return JsonResponse({'status': 'success', 'move': seq, 'delay': last - seq,
+                             'state': replay.public_view(replay.state_at(game_id, seq))})
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'delay must be a number.'}, status=400)
+    except replay.NoMoves:
+        return JsonResponse({'status': 'error', 'message': 'This game has not started.'}, status=404)
+
+
+@require_GET
+def metrics(request):
+    if not scrape_allowed(request):
+        return JsonResponse({'status': 'error', 'message': 'Metrics are for staff or a metrics token.'}, status=403)
+    return HttpResponse(registry.render(), content_type=METRICS_CONTENT_TYPE)
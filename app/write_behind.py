@@ -0,0 +1,260 @@
+# badam_satti_app/write_behind.py
+"""
+Group commit for the game actors' writes.
+
+Without it every actor batch is its own UPDATE and its own SQLite commit,
+so a few hundred busy tables mean a few hundred fsync-bound commits a second.
+With ``GAME_WRITE_BEHIND`` on (and ``GAME_ACTORS``) an actor instead hands
+its changed game to ``committer.mark()``. Marked games wait in a dirty map --
+one entry per game holding its latest copy, the union of the columns changed
+since the last commit and the move-log rows to insert -- and one flusher
+thread writes the whole map in one transaction: a ``bulk_update`` per set of
+changed columns plus one ``bulk_create`` of moves.
+
+Durability is per call. A durable change (the default: moves, joins,
+timeouts) is acknowledged only after the commit that contains it; the map is
+flushed ``WRITE_BEHIND_INTERVAL`` seconds after the first one arrives (0: as
+soon as the previous commit is done, so whatever arrives during a commit goes
+into the next one). A lazy change (pings) is acknowledged as soon as it is
+marked and is written with the next commit, or ``WRITE_BEHIND_LAZY_INTERVAL``
+seconds later at the latest.
+
+When a commit fails, its games are written again one at a time, each in its
+own savepoint, so one bad game (say a duplicate move ``seq``) cannot hold
+back the rest. A game that still fails is retried with the next commit while
+its durable callers keep waiting. After ``MAX_ATTEMPTS`` failures it is given
+up: its unwritten changes are dropped, its callers get the error, and
+``write_failed`` is sent so its actor reloads the game from the database.
+``latest()`` lets an actor that restarts on a game pick up its unwritten copy
+instead of the older row.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+
+from .db_writer import run_write
+from .log import log_game
+from .metrics import COUNT_BUCKETS, registry, sampled_work
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+# Sent with ``game_id`` when a game's unwritten changes are dropped after MAX_ATTEMPTS failed commits.
+write_failed = Signal()
+
+
+def enabled():
+    return getattr(settings, 'GAME_ACTORS', False) and getattr(settings, 'GAME_WRITE_BEHIND', False)
+
+
+class _Entry:
+    __slots__ = ('game', 'fields', 'moves', 'waiters', 'attempts')
+
+    def __init__(self, game, fields, moves):
+        self.game = game
+        self.fields = set(fields)
+        self.moves = list(moves)
+        self.waiters = []
+        self.attempts = 0
+
+    def merge_newer(self, newer):
+        self.game = newer.game
+        self.fields |= newer.fields
+        self.moves.extend(newer.moves)
+        self.waiters.extend(newer.waiters)
+
+    def resolve(self, exc=None):
+        for future in self.waiters:
+            if exc is None:
+                future.set_result(None)
+            else:
+                future.set_exception(exc)
+
+
+class GroupCommitter:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._dirty = {}
+        self._dirty_since = None
+        self._waiting_since = None
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            thread = threading.Thread(target=self._run, name='game-group-commit', daemon=True)
+            thread.start()
+            self._thread = thread
+            atexit.register(self.flush)
+
+    def mark(self, game, fields, moves=(), durable=True):
+        """
+        Queue ``fields`` of ``game`` (a copy nobody changes any more) and its
+        ``moves`` for the next commit. Returns a Future that completes when
+        they are on disk, or fails if they are given up -- already completed
+        for a lazy change.
+        """
+        future = Future()
+        if not durable:
+            future.set_result(None)
+        with self._cond:
+            self._ensure_started()
+            entry = _Entry(game, fields, moves)
+            if durable:
+                entry.waiters.append(future)
+                if self._waiting_since is None:
+                    self._waiting_since = time.monotonic()
+            queued = self._dirty.get(game.game_id)
+            if queued is None:
+                self._dirty[game.game_id] = entry
+            else:
+                queued.merge_newer(entry)
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            self._cond.notify()
+        return future
+
+    def latest(self, game_id):
+        """The copy of the game waiting to be written, or None."""
+        with self._cond:
+            entry = self._dirty.get(game_id)
+            return entry.game if entry is not None else None
+
+    def discard(self, game_id):
+        """Forget unwritten changes to a game that is being deleted, once a commit in progress is done."""
+        with self._cond:
+            entry = self._dirty.pop(game_id, None)
+        if entry is not None:
+            entry.resolve()
+        with self._flush_lock:
+            pass
+
+    def _run(self):
+        while True:
+            interval = getattr(settings, 'WRITE_BEHIND_INTERVAL', 0)
+            lazy_interval = getattr(settings, 'WRITE_BEHIND_LAZY_INTERVAL', 1.0)
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._waiting_since is not None:
+                        delay = self._waiting_since + interval - now
+                    elif self._dirty_since is not None:
+                        delay = self._dirty_since + lazy_interval - now
+                    else:
+                        delay = None
+                    if delay is not None and delay <= 0:
+                        break
+                    self._cond.wait(delay)
+            try:
+                self.flush()
+            except Exception:
+                log_game(logger, logging.ERROR, "Group commit failed.", exc_info=True)
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write everything marked so far, now. Games that fail are queued again (see _requeue)."""
+        with self._flush_lock:
+            with self._cond:
+                dirty, self._dirty = self._dirty, {}
+                self._dirty_since = self._waiting_since = None
+            if not dirty:
+                return
+
+            started = time.perf_counter()
+            entries = list(dirty.values())
+            failed = {}
+            try:
+                with sampled_work('game_actor'):
+                    run_write(_commit, entries)
+            except Exception:
+                FLUSH_ERRORS.inc()
+                log_game(logger, logging.ERROR, "Group commit of %d games failed; writing them one at a time.",
+                         len(entries), exc_info=True)
+                try:
+                    failed = run_write(_commit_each, entries)
+                except Exception as exc:
+                    failed = {entry.game.game_id: exc for entry in entries}
+
+            if len(failed) < len(entries):
+                COMMITS.inc()
+                COMMIT_GAMES.observe(len(entries) - len(failed))
+                COMMIT_SECONDS.observe(time.perf_counter() - started)
+            for entry in entries:
+                if entry.game.game_id not in failed:
+                    entry.resolve()
+            if failed:
+                self._requeue(dirty, failed)
+
+    def _requeue(self, dirty, failed):
+        dropped = []
+        with self._cond:
+            for game_id, exc in failed.items():
+                entry = dirty[game_id]
+                entry.attempts += 1
+                newer = self._dirty.pop(game_id, None)
+                if newer is not None:
+                    entry.merge_newer(newer)
+                if entry.attempts >= MAX_ATTEMPTS:
+                    dropped.append((entry, exc))
+                    continue
+                self._dirty[game_id] = entry
+                if self._dirty_since is None:
+                    self._dirty_since = time.monotonic()
+                if entry.waiters and self._waiting_since is None:
+                    self._waiting_since = time.monotonic()
+            if self._dirty:
+                self._cond.notify()
+        for entry, exc in dropped:
+            DROPPED.inc()
+            log_game(logger, logging.ERROR, "Dropping unwritten changes after %d failed commits; reloading the game.",
+                     entry.attempts, game=entry.game, exc_info=exc)
+            write_failed.send(sender=self.__class__, game_id=entry.game.game_id)
+            entry.resolve(exc)
+
+
+def _commit(entries):
+    from .models import Game, GameMove
+    groups = defaultdict(list)
+    for entry in entries:
+        groups[tuple(sorted(entry.fields))].append(entry.game)
+    with transaction.atomic():
+        for fields, games in groups.items():
+            Game.objects.bulk_update(games, list(fields) + ['last_updated'])
+        moves = [move for entry in entries for move in entry.moves]
+        if moves:
+            GameMove.objects.bulk_create(moves)
+
+
+def _commit_each(entries):
+    """_commit() each entry in its own savepoint; returns {game_id: error} for those that failed."""
+    failed = {}
+    with transaction.atomic():
+        for entry in entries:
+            try:
+                _commit([entry])
+            except Exception as exc:
+                failed[entry.game.game_id] = exc
+    return failed
+
+
+committer = GroupCommitter()
+
+
+COMMITS = registry.counter('badam_group_commits_total', 'Transactions written by the game group commit.')
+COMMIT_GAMES = registry.histogram('badam_group_commit_games', 'Games written per group commit.', COUNT_BUCKETS)
+COMMIT_SECONDS = registry.histogram('badam_group_commit_seconds', 'Time to write one group commit.')
+FLUSH_ERRORS = registry.counter('badam_group_commit_errors_total',
+                                'Group commits that failed and were written again one game at a time.')
+DROPPED = registry.counter('badam_group_commit_dropped_total',
+                           'Games whose unwritten changes were dropped after MAX_ATTEMPTS failed commits.')
+DIRTY_GAMES = registry.gauge('badam_group_commit_dirty_games', 'Games changed but not yet written.',
+                             lambda: len(committer._dirty))
@@ -41,6 +41,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.metrics.MetricsMiddleware',
+    'app.profiling.ProfilingMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
+    'app.sharding.ShardRoutingMiddleware',
+    'app.ops.TableRateMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +57,28 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'project.urls'
 
+# Fraction of requests (and GameConsumer handler calls) recorded for /metrics/.
+# 0 removes the metrics middleware altogether; 1 times every call.
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '0.1'))
+# /metrics/ is served to staff users and, when this is set, to scrapers
+# sending "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# Write statements slower than this (seconds) are counted as waiting on the SQLite lock.
+METRICS_LOCK_WAIT_THRESHOLD = 0.005
+
+# Stack-sample PROFILE_SAMPLE_RATE of app view requests and GameConsumer
+# handler calls (with PROFILE_ON_HEADER, also any staff request sending
+# "X-Profile: 1") into collapsed-stack files per endpoint under PROFILE_DIR,
+# rotated at PROFILE_MAX_BYTES (app/profiling.py). Rate 0 and the header off
+# remove the hooks altogether.
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_ON_HEADER = os.environ.get('PROFILE_ON_HEADER', '0') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_INTERVAL = 0.005  # seconds between samples
+PROFILE_MAX_ACTIVE = 8  # calls sampled at once; more are skipped
+PROFILE_MAX_BYTES = 5 * 1024 * 1024
+PROFILE_BACKUP_COUNT = 3
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -76,6 +103,7 @@ CSRF_TRUSTED_ORIGINS = [
 ]
 
 WSGI_APPLICATION = 'project.wsgi.application'
+ASGI_APPLICATION = 'project.asgi.application'
 
 
 # Database
@@ -88,6 +116,33 @@ DATABASES = {
     }
 }
 
+# DATABASE_PROFILE=production tunes SQLite for many small concurrent writes:
+# WAL so readers never block the writer, synchronous=NORMAL (durable at each
+# WAL checkpoint instead of every commit), a 20 s busy timeout, BEGIN IMMEDIATE
+# so a transaction takes the write lock up front instead of failing to upgrade,
+# memory-mapped reads and persistent connections. Game writes from a process
+# are additionally funnelled through one writer thread (app/db_writer.py).
+# WAL needs a local filesystem; keep the default profile on network mounts.
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'default')
+
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+    })
+
+SQLITE_SERIALIZED_WRITES = DATABASE_PROFILE == 'production'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -120,12 +175,157 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Game actors
+# GAME_ACTORS=1 sends every change to a game through one in-memory owner per
+# game (app/actors.py). Only turn it on when each table is served by a single
+# process: one server process, or the sharding below. Off, each change is
+# loaded, applied and saved with a compare-and-swap on last_updated, which is
+# safe with any number of processes.
+
+GAME_ACTORS = os.environ.get('GAME_ACTORS', '0') == '1'
+GAME_ACTOR_QUEUE_SIZE = 64
+GAME_ACTOR_SUBMIT_TIMEOUT = 2.0  # seconds a caller waits for room in a full queue
+GAME_ACTOR_IDLE_SECONDS = 300
+
+# With actors on, GAME_SNAPSHOT_PATH keeps their games in one binary file,
+# rewritten every GAME_SNAPSHOT_INTERVAL seconds and at exit, so a restart
+# resumes them without loading rows (app/snapshots.py). A file older than
+# GAME_SNAPSHOT_MAX_AGE seconds is ignored.
+GAME_SNAPSHOT_PATH = os.environ.get('GAME_SNAPSHOT_PATH')
+GAME_SNAPSHOT_INTERVAL = 30
+GAME_SNAPSHOT_MAX_AGE = 3600
+
+# With actors on, GAME_WRITE_BEHIND (on by default whenever actors are)
+# commits the games they change together, one transaction for all of them
+# (app/write_behind.py). A move waits for the
+# next commit, which starts WRITE_BEHIND_INTERVAL seconds after it arrives
+# (0: once the previous commit is done); a ping does not wait and is written
+# within WRITE_BEHIND_LAZY_INTERVAL seconds.
+GAME_WRITE_BEHIND = os.environ.get('GAME_WRITE_BEHIND', '1' if GAME_ACTORS else '0') == '1'
+WRITE_BEHIND_INTERVAL = 0
+WRITE_BEHIND_LAZY_INTERVAL = 1.0
+
+
+# Replays
+# Every REPLAY_CHECKPOINT_INTERVAL-th logged move also stores the whole table,
+# which bounds how many moves a replay seek applies. Spectators of a live game
+# see it at least REPLAY_SPECTATE_DELAY moves behind.
+
+REPLAY_CHECKPOINT_INTERVAL = 16
+REPLAY_SPECTATE_DELAY = 3
+
+
+# Quick match
+# Queued players are cut into tables every MATCHMAKING_TICK_SECONDS; a ticket
+# whose page stops polling for MATCHMAKING_TICKET_TTL seconds is dropped.
+
+MATCHMAKING_TICK_SECONDS = 0.1
+MATCHMAKING_TICKET_TTL = 30
+
+
+# Request throttling
+# Per player and endpoint: (requests per second, burst). The game page polls
+# state every 2.5 s and pings every second, so only runaway clients reach
+# these; they get a 429 with Retry-After (app/throttle.py).
+
+REQUEST_THROTTLE = os.environ.get('REQUEST_THROTTLE', '1') == '1'
+REQUEST_THROTTLE_RATES = {
+    'get_game_state': (4, 10),
+    'player_ping': (3, 6),
+    'check_room_status': (2, 6),
+}
+
+
+# Client cadence
+# Game pages poll and ping at the intervals the server recommends
+# (app/cadence.py). Above CADENCE_TARGET_RPS polls and pings a second the
+# intervals stretch proportionally, up to CADENCE_MAX_BACKOFF times;
+# CADENCE_LOAD_FACTOR stretches them by hand.
+
+CADENCE_TARGET_RPS = 500
+CADENCE_MAX_BACKOFF = 4.0
+CADENCE_LOAD_FACTOR = float(os.environ.get('CADENCE_LOAD_FACTOR', '1.0'))
+
+
+# Ops dashboard
+# /admin/app/game/live/ lists at most OPS_LIVE_LIMIT live games, stalest turn
+# first, with each table's requests per second over the last OPS_RATE_WINDOW
+# seconds. OPS_TABLE_RATES=0 stops counting them (app/ops.py).
+
+OPS_LIVE_LIMIT = 200
+OPS_RATE_WINDOW = 10.0
+OPS_TABLE_RATES = os.environ.get('OPS_TABLE_RATES', '1') == '1'
+
+
+# Sharding
+# Set SHARD_NODE_ID (and SHARD_BASE_URL, how peers reach this process) on each
+# of several processes sharing the database to pin every table to one of them.
+# Unset, the routing middleware is removed and everything is served locally.
+
+SHARD_NODE_ID = os.environ.get('SHARD_NODE_ID')
+SHARD_BASE_URL = os.environ.get('SHARD_BASE_URL', 'http://127.0.0.1:8000')
+SHARD_ROUTING = os.environ.get('SHARD_ROUTING', 'proxy')  # or 'redirect'
+SHARD_HEARTBEAT_INTERVAL = 5
+SHARD_HEARTBEAT_TIMEOUT = 15
+
+
+# Channel layer
+# In-process by default, which is enough for a single server process. Set
+# CHANNEL_LAYER_URL (redis://host:port/db) to share socket groups between
+# processes through Redis, or locally through `python manage.py resp_standin`.
+
+CHANNEL_LAYER_URL = os.environ.get('CHANNEL_LAYER_URL')
+if CHANNEL_LAYER_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'app.channel_layers.RespChannelLayer',
+            'CONFIG': {'url': CHANNEL_LAYER_URL, 'prefix': 'badam'},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'app.channel_layers.BatchingInMemoryChannelLayer',
+        },
+    }
+
+
+# Logging
+# Game logs are structured (game_id / room_code / player_num) and written by a
+# background thread so request handlers never block on the stream.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'game_queue': {
+            'class': 'app.log.QueueWriterHandler',
+        },
+    },
+    'loggers': {
+        'app': {
+            'handlers': ['game_queue'],
+            'level': os.environ.get('APP_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic writes content-hashed copies plus .gz (and, with the brotli
+# package installed, .br) variants, which /static/ serves with year-long cache
+# headers (app/assets.py). HTML and JSON responses are gzipped on the fly.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'app.assets.CompressedManifestStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
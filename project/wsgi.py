@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_wsgi_application()
+
+from app import snapshots  # noqa: E402
+
+# Game actors resume from their last snapshot before the first request (GAME_SNAPSHOT_PATH).
+snapshots.startup()